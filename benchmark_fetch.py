@@ -0,0 +1,89 @@
+import argparse as agp
+from getpass import getpass
+import time
+
+from myTools import MSSQL_DBConnector as mssql
+import myTools.ContentObfuscation as ce
+
+
+
+####### BENCHMARK OF THE RESULT SET DECODING PATHS
+
+
+def processBenchmarkArguments() -> dict:
+    '''Takes the database connection and benchmark arguments from the command line interface and returns them as a dictionary'''
+
+    argParser:agp.ArgumentParser = agp.ArgumentParser(add_help=True, \
+        description="Compares the rows/sec of DBConnector.ExecuteQuery_withRS (pd.read_sql) and ExecuteQuery_withRSFast on the same query")
+
+    argParser.add_argument("-n", "--DSN", dest="dsn", action='store', default= None, help="Sets the SQL Server DSN descriptor file", type=str)
+    argParser.add_argument("-s", "--server", dest="dbserver", type= str, required= True, help="Database Server : dbserver")
+    argParser.add_argument("-d", "--database", dest="dbname", type= str, required= True, help="Database name : dbname")
+    argParser.add_argument("-u", "--username", dest="dbusername", type= str, default='sa', help="Database Authentication Username : dbusername")
+
+    groupAuthenticationMechanism = argParser.add_mutually_exclusive_group()
+    groupAuthenticationMechanism.add_argument("-p", "--password", dest="dbuserpassword", type= str, action='store', help="Database Authentication Password : dbuserpassword")
+    groupAuthenticationMechanism.add_argument("-t", "--trustedmode", dest="trustedmode", type= bool, action='store', help="Set True to use Windows Authentication ")
+
+    argParser.add_argument("-q", "--query", dest="query", type= str, default="SELECT * FROM vw_AllSurveyData", help="Query whose result set is fetched (default: the whole view)")
+    argParser.add_argument("--repeat", dest="repeat", type= int, default=3, help="Number of timed runs of each path, the best one is kept (default 3)")
+    argParser.add_argument("--batchsize", dest="batchsize", type= int, default=50000, help="Rows per fetchmany batch of the fast path (default 50000)")
+
+    argParsingResults = argParser.parse_args()
+
+    if not argParsingResults.dbuserpassword and not argParsingResults.trustedmode:
+        argParsingResults.dbuserpassword = getpass()
+
+    benchmarkArguments:dict = vars(argParsingResults)
+    benchmarkArguments["dbuserpassword"] = ce.ContentObfuscation().obfuscate(argParsingResults.dbuserpassword) \
+        if argParsingResults.dbuserpassword else ''
+
+    return benchmarkArguments
+
+
+def timeFetchPath(fetchPath, query:str, repeat:int) -> tuple:
+    '''Runs the fetch path repeat times and returns its best time in seconds along with the last fetched dataframe'''
+
+    bestTime:float = None
+    resultDF = None
+
+    for run in range(repeat):
+        startTime:float = time.perf_counter()
+        resultDF = fetchPath(query)
+        elapsedTime:float = time.perf_counter() - startTime
+        bestTime = elapsedTime if bestTime is None else min(bestTime, elapsedTime)
+
+    return bestTime, resultDF
+
+
+def main():
+
+    benchmarkArguments:dict = processBenchmarkArguments()
+
+    connector:mssql.MSSQL_DBConnector = mssql.MSSQL_DBConnector(DSN = benchmarkArguments["dsn"], dbserver = benchmarkArguments["dbserver"], \
+                dbname = benchmarkArguments["dbname"], dbusername = benchmarkArguments["dbusername"], \
+                dbpassword = benchmarkArguments["dbuserpassword"], trustedmode = benchmarkArguments["trustedmode"])
+    connector.Open()
+
+    try:
+        #one untimed run first, so that both paths are timed against a warm server cache
+        connector.ExecuteQuery_withRS(benchmarkArguments["query"])
+
+        readSQLTime, readSQLDF = timeFetchPath(connector.ExecuteQuery_withRS, benchmarkArguments["query"], benchmarkArguments["repeat"])
+        fastTime, fastDF = timeFetchPath(lambda query: connector.ExecuteQuery_withRSFast(query, benchmarkArguments["batchsize"]), \
+                                         benchmarkArguments["query"], benchmarkArguments["repeat"])
+    finally:
+        connector.Close()
+
+    rowCount:int = len(readSQLDF)
+
+    print("rows fetched         : " + str(rowCount) + " x " + str(len(readSQLDF.columns)) + " columns")
+    print("pd.read_sql path     : " + '{:.3f}s'.format(readSQLTime) + ", " + '{:,.0f}'.format(rowCount / readSQLTime) + " rows/sec")
+    print("fast fetch path      : " + '{:.3f}s'.format(fastTime) + ", " + '{:,.0f}'.format(rowCount / fastTime) + " rows/sec")
+    print("speedup              : " + '{:.2f}x'.format(readSQLTime / fastTime))
+    print("identical dataframes : " + str(readSQLDF.equals(fastDF) and readSQLDF.dtypes.equals(fastDF.dtypes)))
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+import argparse as agp
+import random
+import time
+
+import refresh_survey_answers as rsa
+
+
+
+####### BENCHMARK OF THE VIEW QUERY BUILDER
+
+
+def buildAllSurveyDataQuery_quadratic(questionsInSurveys:dict, queryStrategy:str = 'coalesce') -> str:
+    '''The previous builder, kept for comparison: the survey ID was substituted in the whole accumulated column list after each question'''
+
+    queryTemplates:dict = rsa.getSurveyDataQueryTemplates(queryStrategy)
+    strFinalQuery: str = ''
+
+    for survey_position, (survey_ID, questionsInSurvey) in enumerate(questionsInSurveys.items()):
+
+        strColumnsQueryPart:str = ''
+
+        for i, (question_ID, is_question_in_survey) in enumerate(questionsInSurvey):
+
+            if is_question_in_survey:
+                strColumnsQueryPart += queryTemplates["answercolumn"].replace('<QUESTION_ID>', str(question_ID))
+                strColumnsQueryPart = strColumnsQueryPart.replace('<SURVEY_ID>', str(survey_ID))
+            else:
+                strColumnsQueryPart += queryTemplates["nullcolumn"].replace('<QUESTION_ID>', str(question_ID))
+
+            if i < len(questionsInSurvey) - 1 :
+                strColumnsQueryPart += ' , '
+
+        strQueryOuterUnionQuery = queryTemplates["outerunionquery"].replace('<SURVEY_ID>', str(survey_ID))
+        strFinalQuery += strQueryOuterUnionQuery.replace('<DYNAMIC_QUESTION_ANSWERS>', strColumnsQueryPart)
+
+        if survey_position < len(questionsInSurveys) - 1 :
+            strFinalQuery += queryTemplates["unionoperator"]
+
+    return strFinalQuery
+
+
+def generateQuestionsInSurveys(surveyCount:int, questionCount:int, questionsPerSurvey:int, seed:int) -> dict:
+    '''Returns the ordered (QuestionId, InSurvey) lists of synthetic surveys, each one holding questionsPerSurvey of the questions'''
+    randomGenerator:random.Random = random.Random(seed)
+    questionsInSurveys:dict = {}
+    for survey_ID in range(1, surveyCount + 1):
+        surveyQuestionIds:set = set(randomGenerator.sample(range(1, questionCount + 1), min(questionsPerSurvey, questionCount)))
+        questionsInSurveys[survey_ID] = [(question_ID, question_ID in surveyQuestionIds) for question_ID in range(1, questionCount + 1)]
+    return questionsInSurveys
+
+
+def timeBuilder(builder, repeat:int) -> tuple:
+    '''Runs the builder repeat times and returns its best time along with what it built'''
+    bestTime:float = None
+    for run in range(repeat):
+        startTime:float = time.perf_counter()
+        builtQuery = builder()
+        bestTime = min(bestTime or float('inf'), time.perf_counter() - startTime)
+    return bestTime, builtQuery
+
+
+def processBenchmarkArguments() -> dict:
+    '''Takes the benchmark arguments from the command line interface and returns them as a dictionary'''
+
+    argParser:agp.ArgumentParser = agp.ArgumentParser(add_help=True, \
+        description="Measures the generation of the view query of refresh_survey_answers.py on synthetic structures of growing width, " \
+                    + "against the previous quadratic builder, and the column group views a wide structure is split into")
+
+    argParser.add_argument("--questions", dest="questioncounts", type= int, nargs='+', default=[1000, 2500, 5000, 10000, 20000], \
+                            help="Numbers of questions of the benchmarked structures (default 1000 2500 5000 10000 20000)")
+    argParser.add_argument("--surveys", dest="surveycount", type= int, default=5, help="Number of surveys (default 5)")
+    argParser.add_argument("--questionspersurvey", dest="questionspersurvey", type= int, default=200, help="Number of questions in each survey (default 200)")
+    argParser.add_argument("--querystrategy", dest="querystrategy", type= str, choices=["coalesce", "aggregate"], default="coalesce", help="Query strategy (default coalesce)")
+    argParser.add_argument("--maxviewcolumns", dest="maxviewcolumns", type= int, default=1000, help="Answer columns per column group view (default 1000)")
+    argParser.add_argument("--legacymaxquestions", dest="legacymaxquestions", type= int, default=10000, \
+                            help="Widest structure the previous builder is run on, its time growing with the square of the width (default 10000)")
+    argParser.add_argument("--repeat", dest="repeat", type= int, default=3, help="Number of timed runs of each builder, the best one is kept (default 3)")
+    argParser.add_argument("--seed", dest="seed", type= int, default=0, help="Seed of the random generator (default 0)")
+
+    return vars(argParser.parse_args())
+
+
+def main():
+
+    benchmarkArguments:dict = processBenchmarkArguments()
+    queryStrategy:str = benchmarkArguments["querystrategy"]
+
+    print('{:>9} {:>12} {:>12} {:>14} {:>12} {:>6} {:>14}'.format("questions", "sql length", "builder", "us/question", "previous", "views", "split builder"))
+
+    for questionCount in benchmarkArguments["questioncounts"]:
+
+        questionsInSurveys:dict = generateQuestionsInSurveys(benchmarkArguments["surveycount"], questionCount, \
+            benchmarkArguments["questionspersurvey"], benchmarkArguments["seed"])
+
+        builderTime, strFinalQuery = timeBuilder(lambda: rsa.buildAllSurveyDataQuery(questionsInSurveys, queryStrategy), benchmarkArguments["repeat"])
+
+        strPreviousTime:str = 'skipped'
+        if questionCount <= benchmarkArguments["legacymaxquestions"]:
+            previousTime, strPreviousQuery = timeBuilder(lambda: buildAllSurveyDataQuery_quadratic(questionsInSurveys, queryStrategy), 1)
+            if strPreviousQuery != strFinalQuery:
+                raise Exception('The builders generated different queries for ' + str(questionCount) + ' questions')
+            strPreviousTime = '{:.3f}s'.format(previousTime)
+
+        splitTime, viewQueries = timeBuilder(lambda: rsa.buildViewQueries(questionsInSurveys, queryStrategy, 'vw_AllSurveyData', \
+            benchmarkArguments["maxviewcolumns"]), benchmarkArguments["repeat"])
+
+        print('{:>9} {:>12} {:>12} {:>14} {:>12} {:>6} {:>14}'.format(questionCount, len(strFinalQuery), '{:.3f}s'.format(builderTime), \
+            '{:.2f}'.format(builderTime * 1e6 / questionCount), strPreviousTime, len(viewQueries), '{:.3f}s'.format(splitTime)))
+
+
+
+if __name__ == '__main__':
+    main()
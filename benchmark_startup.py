@@ -0,0 +1,95 @@
+import argparse as agp
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+
+####### BENCHMARK OF THE STARTUP OF refresh_survey_answers.py
+
+
+#packages whose import dominates the startup, reported when a scenario ends up importing them
+heavyModules: tuple = ("pandas", "numpy", "pyodbc", "cryptography", "pyarrow")
+
+#run in a fresh interpreter by each timed run: the scenario, then the heavy packages it imported as the last output line
+strScenarioScript: str = """
+import json, sys, time
+startTime = time.perf_counter()
+scriptArguments, heavyModules = json.loads(sys.argv[1]), json.loads(sys.argv[2])
+sys.argv = ['refresh_survey_answers.py'] + scriptArguments
+import refresh_survey_answers
+if scriptArguments:
+    try:
+        refresh_survey_answers.main()
+    except SystemExit:
+        pass
+print(json.dumps({"seconds": time.perf_counter() - startTime, "imported": [name for name in heavyModules if name in sys.modules]}))
+"""
+
+
+def processBenchmarkArguments() -> dict:
+    '''Takes the benchmark arguments from the command line interface and returns them as a dictionary'''
+
+    argParser:agp.ArgumentParser = agp.ArgumentParser(add_help=True, \
+        description="Measures the startup of refresh_survey_answers.py in fresh interpreters: its import, the --help output " \
+                    + "and, when arguments are given after --, a full run with them (e.g. a --skipunchanged run finding nothing changed)")
+
+    argParser.add_argument("--repeat", dest="repeat", type= int, default=5, help="Number of timed runs of each scenario, the best one is kept (default 5)")
+    argParser.add_argument("runarguments", nargs=agp.REMAINDER, help="-- followed by the refresh_survey_answers.py arguments of the run scenario")
+
+    benchmarkArguments:dict = vars(argParser.parse_args())
+    benchmarkArguments["runarguments"] = [argument for argument in benchmarkArguments["runarguments"] if argument != '--']
+
+    return benchmarkArguments
+
+
+def timeScenario(scriptArguments:list, repeat:int) -> dict:
+    '''Runs the scenario repeat times, each in a fresh interpreter, and returns its best process and in-process times
+    along with the heavy packages it imported'''
+
+    bestProcessTime:float = None
+    bestScenarioTime:float = None
+    scenarioResult:dict = None
+
+    for run in range(repeat):
+        startTime:float = time.perf_counter()
+        completedProcess = subprocess.run([sys.executable, '-c', strScenarioScript, json.dumps(scriptArguments), json.dumps(heavyModules)], \
+            cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+        processTime:float = time.perf_counter() - startTime
+
+        scenarioResult = json.loads(completedProcess.stdout.strip().splitlines()[-1])
+        bestProcessTime = processTime if bestProcessTime is None else min(bestProcessTime, processTime)
+        bestScenarioTime = scenarioResult["seconds"] if bestScenarioTime is None else min(bestScenarioTime, scenarioResult["seconds"])
+
+    return {"process": bestProcessTime, "scenario": bestScenarioTime, "imported": scenarioResult["imported"]}
+
+
+def main():
+
+    benchmarkArguments:dict = processBenchmarkArguments()
+
+    scenarios:list = [("import", []), ("--help", ["--help"])]
+    if benchmarkArguments["runarguments"]:
+        scenarios.append(("run", benchmarkArguments["runarguments"]))
+
+    #the bare interpreter startup, paid by every scenario on top of its own time
+    interpreterTime:float = None
+    for run in range(benchmarkArguments["repeat"]):
+        startTime:float = time.perf_counter()
+        subprocess.run([sys.executable, '-c', 'pass'], check=True)
+        interpreterTime = min(interpreterTime or float('inf'), time.perf_counter() - startTime)
+
+    print("interpreter startup  : " + '{:.3f}s'.format(interpreterTime))
+
+    for scenarioName, scriptArguments in scenarios:
+        scenarioTimes:dict = timeScenario(scriptArguments, benchmarkArguments["repeat"])
+        print('{:<21}'.format(scenarioName) + ": " + '{:.3f}s'.format(scenarioTimes["scenario"]) \
+              + " (" + '{:.3f}s'.format(scenarioTimes["process"]) + " whole process), heavy packages imported: " \
+              + (", ".join(scenarioTimes["imported"]) if scenarioTimes["imported"] else "none"))
+
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import argparse as agp
+import time
+
+from myTools import SyntheticSurveyData as ssd
+
+
+
+####### GENERATION OF LOCAL SQLITE SURVEY DATABASES
+
+
+def processGeneratorArguments() -> dict:
+    '''Takes the generation arguments from the command line interface and returns them as a dictionary'''
+
+    argParser:agp.ArgumentParser = agp.ArgumentParser(add_help=True, \
+        description="Creates a SQLite survey database to run refresh_survey_answers.py against with --dbengine sqlite")
+
+    argParser.add_argument("-o", "--output", dest="databasefilepath", type= str, required= True, help="SQLite database file to create (replaced if it exists)")
+    argParser.add_argument("--fromresults", dest="resultsfilepath", type= str, default=None, \
+                            help="Rebuild the database behind an exported results CSV file (e.g. extracted-vw_AllSurveyData.csv) instead of generating random data")
+
+    argParser.add_argument("--surveys", dest="surveycount", type= int, default=3, help="Number of surveys (default 3)")
+    argParser.add_argument("--questions", dest="questioncount", type= int, default=4, help="Number of questions (default 4)")
+    argParser.add_argument("--questionspersurvey", dest="questionspersurvey", type= int, default=2, help="Number of questions in each survey (default 2)")
+    argParser.add_argument("--users", dest="usercount", type= int, default=5000, help="Number of users (default 5000)")
+    argParser.add_argument("--responserate", dest="responserate", type= float, default=0.34, help="Probability that a user takes part in a survey (default 0.34)")
+    argParser.add_argument("--answerrate", dest="answerrate", type= float, default=0.6, help="Probability that a participant answers a question of the survey (default 0.6)")
+    argParser.add_argument("--seed", dest="seed", type= int, default=0, help="Seed of the random generator (default 0)")
+
+    return vars(argParser.parse_args())
+
+
+def main():
+
+    generatorArguments:dict = processGeneratorArguments()
+    startTime:float = time.perf_counter()
+
+    if generatorArguments["resultsfilepath"] is not None:
+        answerCount:int = ssd.createSurveyDatabaseFromResults(generatorArguments["databasefilepath"], generatorArguments["resultsfilepath"])
+    else:
+        answerCount:int = ssd.generateSurveyDatabase(generatorArguments["databasefilepath"], \
+            surveyCount = generatorArguments["surveycount"], questionCount = generatorArguments["questioncount"], \
+            questionsPerSurvey = generatorArguments["questionspersurvey"], userCount = generatorArguments["usercount"], \
+            responseRate = generatorArguments["responserate"], answerRate = generatorArguments["answerrate"], seed = generatorArguments["seed"])
+
+    print("INFO - " + str(answerCount) + " answers written in " + generatorArguments["databasefilepath"] \
+          + " in " + '{:.2f}s'.format(time.perf_counter() - startTime))
+
+
+
+if __name__ == '__main__':
+    main()
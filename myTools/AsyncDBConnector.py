@@ -0,0 +1,338 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures as cf
+import sys
+import threading
+import time
+from typing import AsyncIterator, Callable
+
+from myTools import DBConnector as dbc
+import myTools.ModuleInstaller as mi
+
+pd = mi.deferImport("pandas")
+pyodbc = mi.deferImport("pyodbc")
+
+
+
+class AsyncDBConnector:
+    """This class wraps a DBConnector to expose its database work as coroutines for asyncio applications.
+    The blocking pyodbc calls run on a dedicated thread pool, at most maxConcurrency of them at the same time,
+    each on its own pooled connection (the wrapped DBConnector gets a pool of maxConcurrency connections if it has none).
+    Every call accepts a timeout in seconds; on timeout or cancellation the running statement is cancelled on the server
+    with pyodbc Cursor.cancel and its connection is discarded, asyncio.TimeoutError or asyncio.CancelledError being raised as usual.
+    Without a pool, the connection is the own connection of the wrapped DBConnector: it is closed and reopened once the abandoned call
+    is over, the next calls waiting for it, so that none of them runs on a connection left in the middle of a cancelled statement.
+    The queries are recorded in the run metrics attached to the wrapped DBConnector like its own, those timed out or cancelled as failed"""
+
+    def __init__(self: object, connector: dbc.DBConnector, maxConcurrency: int = 4):
+
+        if maxConcurrency < 1:
+            raise Exception('maxConcurrency must be at least 1')
+
+        self._m_connector: dbc.DBConnector = connector
+        self._m_maxConcurrency: int = int(maxConcurrency)
+        self._m_executor: cf.ThreadPoolExecutor = cf.ThreadPoolExecutor(max_workers=self._m_maxConcurrency, \
+                                                                          thread_name_prefix='AsyncDBConnector')
+        #created lazily, so that it belongs to the running event loop
+        self._m_semaphore: asyncio.Semaphore = None
+        #reopening of the DBConnector own connection after an abandoned call, when it has no pool
+        self._m_conduitReset: cf.Future = None
+
+
+
+    #series of properties to have "getters" wherever appropriate
+
+    @property
+    def connector(self: object) -> dbc.DBConnector:
+        return self._m_connector
+
+    @property
+    def maxConcurrency(self: object) -> int:
+        return self._m_maxConcurrency
+
+    @property
+    def IsConnected(self: object) -> bool:
+        return self._m_connector.IsConnected
+
+
+
+    def _getSemaphore(self: object) -> asyncio.Semaphore:
+        if self._m_semaphore is None:
+            self._m_semaphore = asyncio.Semaphore(self._m_maxConcurrency)
+        return self._m_semaphore
+
+
+    @staticmethod
+    def _ignoreOutcome(future: asyncio.Future) -> None:
+        '''Retrieves the outcome of an abandoned executor call, so that asyncio does not report it as never retrieved'''
+        if not future.cancelled():
+            future.exception()
+
+
+    async def _runInExecutor(self: object, work: Callable, timeout: float = None, cursorHolder: dict = None):
+        '''Runs a blocking call on the executor and awaits it at most timeout seconds.
+        On timeout or cancellation, the statement running on the cursor found in cursorHolder (if any) is cancelled
+        and the call is abandoned: it goes on in its thread until pyodbc gives control back, its future being left
+        in cursorHolder under "abandoned"'''
+
+        workFuture:cf.Future = self._m_executor.submit(work)
+        future:asyncio.Future = asyncio.wrap_future(workFuture)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            #not started yet: it never will, started: the server is asked to stop the statement
+            future.cancel()
+            cursor:pyodbc.Cursor = None if cursorHolder is None else cursorHolder.get("cursor")
+            if cursor is not None:
+                try:
+                    cursor.cancel()
+                except Exception as excp:
+                    pass
+                cursorHolder["abandoned"] = workFuture
+            future.add_done_callback(AsyncDBConnector._ignoreOutcome)
+            raise
+
+
+    def _resetConduitAfter(self: object, abandonedFuture: cf.Future) -> None:
+        '''Closes and reopens the own connection of the wrapped DBConnector once the abandoned call is over, unless it has a pool
+        (a pooled connection given back after a failure is discarded by the pool)'''
+
+        if self._m_connector.IsPooled:
+            return
+
+        previousReset:cf.Future = self._m_conduitReset
+
+        def reopenConnector() -> None:
+            cf.wait([abandonedFuture] if previousReset is None else [abandonedFuture, previousReset])
+            if self._m_connector.IsConnected:
+                self._m_connector.Close()
+                self._m_connector.Open()
+
+        self._m_conduitReset = self._m_executor.submit(reopenConnector)
+
+
+    async def _awaitConduitReset(self: object) -> None:
+        '''Waits for the reopening of the own connection of the wrapped DBConnector, if one is pending, and raises its error if it failed'''
+
+        conduitReset:cf.Future = self._m_conduitReset
+        if conduitReset is None:
+            return
+        try:
+            await asyncio.wrap_future(conduitReset)
+        finally:
+            if self._m_conduitReset is conduitReset:
+                self._m_conduitReset = None
+
+
+    async def _runOnCursor(self: object, work: Callable[[pyodbc.Cursor], object], timeout: float = None):
+        '''Runs work(cursor) on the executor with a cursor of its own pooled session, within the concurrency bound'''
+
+        cursorHolder:dict = {}
+
+        def runOnSessionCursor():
+            with self._m_connector.Cursor() as cursor:
+                cursorHolder["cursor"] = cursor
+                return work(cursor)
+
+        async with self._getSemaphore():
+            await self._awaitConduitReset()
+            try:
+                return await self._runInExecutor(runOnSessionCursor, timeout, cursorHolder)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                if "abandoned" in cursorHolder:
+                    self._resetConduitAfter(cursorHolder["abandoned"])
+                raise
+
+
+    async def _runQueryOnCursor(self: object, method: str, query: str, work: Callable[[pyodbc.Cursor, str], tuple], timeout: float = None):
+        '''Runs work(cursor, translatedQuery) as _runOnCursor does and records the query in the run metrics of the wrapped DBConnector.
+        work returns its result along with the rows and columns of the result set to record'''
+
+        AsyncDBConnector._checkQuery(query)
+
+        startTime:float = time.perf_counter()
+        translatedQuery:str = query
+
+        try:
+            translatedQuery = self._m_connector._translateQuery(query)
+            result, rows, columns = await self._runOnCursor(lambda cursor: work(cursor, translatedQuery), timeout)
+        except BaseException:
+            self._m_connector._recordQuery(method, translatedQuery, startTime, isFailed=True)
+            raise
+
+        self._m_connector._recordQuery(method, translatedQuery, startTime, rows, columns)
+        return result
+
+
+    @staticmethod
+    def _rowsToDataFrame(cursor: pyodbc.Cursor, rows: list) -> pd.DataFrame:
+        '''Builds the dataframe of fetched rows the way pd.read_sql does'''
+        columnNames:list = [columnDescription[0] for columnDescription in cursor.description]
+        return pd.DataFrame.from_records([tuple(row) for row in rows], columns=columnNames, coerce_float=True)
+
+
+    @staticmethod
+    def _checkQuery(query: str) -> None:
+        if query is None:
+            raise Exception('SQL query object is None')
+        if type(query) is not str:
+            raise Exception('SQL query couldn''t be casted as a string')
+        if not query:
+            raise Exception('Empty SQL query to be executed')
+
+
+
+    async def Open(self: object, timeout: float = None) -> None:
+        '''Opens the wrapped DBConnector, with a pool of maxConcurrency connections unless one is already configured.
+        A connection still being established when the timeout expires is closed as soon as it is open'''
+
+        if not self._m_connector.IsPooled and self._m_maxConcurrency > 1 and not self._m_connector.IsConnected:
+            self._m_connector.ConfigurePool(minSize=1, maxSize=self._m_maxConcurrency)
+
+        openingState:dict = {"isAbandoned": False, "isOpen": False}
+        openingLock:threading.Lock = threading.Lock()
+
+        def openConnector() -> None:
+            self._m_connector.Open()
+            with openingLock:
+                openingState["isOpen"] = True
+                if openingState["isAbandoned"]:
+                    self._m_connector.Close()
+
+        try:
+            await self._runInExecutor(openConnector, timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            with openingLock:
+                openingState["isAbandoned"] = True
+                #opened right when the timeout expired, the opening thread will not close it any more
+                if openingState["isOpen"]:
+                    self._m_executor.submit(self._m_connector.Close)
+            raise
+
+
+    async def Close(self: object) -> None:
+        '''Closes the wrapped DBConnector and its pool, then stops the executor once the abandoned calls are over'''
+        try:
+            await self._awaitConduitReset()
+        except Exception as excp:
+            #the connection is being closed anyway
+            pass
+        if self._m_connector.IsConnected:
+            await self._runInExecutor(self._m_connector.Close)
+        self._m_executor.shutdown(wait=False)
+
+
+    async def __aenter__(self: object) -> 'AsyncDBConnector':
+        await self.Open()
+        return self
+
+
+    async def __aexit__(self: object, excType, excValue, excTraceback) -> None:
+        await self.Close()
+
+
+
+    async def ExecuteQuery_withRS(self: object, query: str, timeout: float = None) -> pd.DataFrame:
+        '''Executes a Data Query Language statement and returns its result set as a pandas dataframe'''
+
+        def fetchDataFrame(cursor: pyodbc.Cursor, translatedQuery: str) -> tuple:
+            cursor.execute(translatedQuery)
+            df:pd.DataFrame = AsyncDBConnector._rowsToDataFrame(cursor, cursor.fetchall())
+            return df, len(df), len(df.columns)
+
+        return await self._runQueryOnCursor('ExecuteQuery_withRS', query, fetchDataFrame, timeout)
+
+
+    async def ExecuteQuery_withRow(self: object, query: str, timeout: float = None) -> tuple:
+        '''Executes a Data Query Language statement and returns the first row of its result set as a tuple, None if there is none'''
+
+        def fetchRow(cursor: pyodbc.Cursor, translatedQuery: str) -> tuple:
+            cursor.execute(translatedQuery)
+            row = cursor.fetchone()
+            return None if row is None else tuple(row), 0 if row is None else 1, len(cursor.description)
+
+        return await self._runQueryOnCursor('ExecuteQuery_withRow', query, fetchRow, timeout)
+
+
+    async def ExecuteQuery_view(self: object, query: str, timeout: float = None) -> None:
+        '''Executes a Data Definition Language statement (e.g. CREATE OR ALTER VIEW) and commits it'''
+
+        def executeAndCommit(cursor: pyodbc.Cursor, translatedQuery: str) -> tuple:
+            self._m_connector._executeStatements(cursor, translatedQuery)
+            cursor.connection.commit()
+            return None, None, None
+
+        await self._runQueryOnCursor('ExecuteQuery_view', query, executeAndCommit, timeout)
+
+
+    async def ExecuteQuery_withRSChunks(self: object, query: str, chunkSize: int, timeout: float = None) -> AsyncIterator[pd.DataFrame]:
+        '''Executes a Data Query Language statement and yields its result set as successive dataframes of at most chunkSize rows.
+        The timeout applies to each fetch. The session and its concurrency slot are held until the iteration ends,
+        so consumers breaking out early should close the iterator (e.g. with contextlib.aclosing). As for DBConnector, the time
+        spent by the consumer between two chunks is recorded with the query'''
+
+        AsyncDBConnector._checkQuery(query)
+        if chunkSize is None or int(chunkSize) <= 0:
+            raise Exception('Chunk size must be a strictly positive integer')
+
+        async with self._getSemaphore():
+
+            #the steps of one stream run one after the other, even when an abandoned fetch is still running in its thread
+            streamLock:threading.Lock = threading.Lock()
+
+            def inStream(work: Callable, *arguments) -> Callable:
+                def runLocked():
+                    with streamLock:
+                        return work(*arguments)
+                return runLocked
+
+            startTime:float = time.perf_counter()
+            translatedQuery:str = query
+            fetchedRows:int = 0
+            fetchedColumns:int = None
+            excInfo:tuple = (None, None, None)
+
+            try:
+                await self._awaitConduitReset()
+                translatedQuery = self._m_connector._translateQuery(query)
+                session = self._m_connector.Cursor()
+                cursorHolder:dict = {"cursor": await self._runInExecutor(inStream(session.__enter__), timeout)}
+            except BaseException:
+                self._m_connector._recordQuery('ExecuteQuery_withRSChunks', translatedQuery, startTime, isFailed=True)
+                raise
+
+            cursor:pyodbc.Cursor = cursorHolder["cursor"]
+
+            try:
+                cursor.arraysize = int(chunkSize)
+                await self._runInExecutor(inStream(cursor.execute, translatedQuery), timeout, cursorHolder)
+
+                while True:
+                    rows:list = await self._runInExecutor(inStream(cursor.fetchmany, int(chunkSize)), timeout, cursorHolder)
+                    if not rows:
+                        break
+                    chunkDF:pd.DataFrame = AsyncDBConnector._rowsToDataFrame(cursor, rows)
+                    fetchedRows += len(chunkDF)
+                    fetchedColumns = len(chunkDF.columns)
+                    yield chunkDF
+
+            except BaseException:
+                excInfo = sys.exc_info()
+                raise
+
+            finally:
+                #the consumer stopping before the end of the result set is not a failure of the query
+                self._m_connector._recordQuery('ExecuteQuery_withRSChunks', translatedQuery, startTime, fetchedRows, fetchedColumns, \
+                                               isFailed=excInfo[1] is not None and not isinstance(excInfo[1], GeneratorExit))
+
+                #an interrupted session is given back as failed, so that its connection is rolled back and discarded,
+                #without waiting for it since the consumer is being cancelled or is closing the iterator
+                exitSession:cf.Future = self._m_executor.submit(inStream(session.__exit__, *excInfo))
+                #the own connection of a DBConnector without a pool is reopened once the session is over
+                if "abandoned" in cursorHolder:
+                    self._resetConduitAfter(exitSession)
+                if not isinstance(excInfo[1], (asyncio.CancelledError, GeneratorExit)):
+                    await asyncio.wrap_future(exitSession)
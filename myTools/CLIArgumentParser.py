@@ -1,6 +1,7 @@
 import argparse as agp
 from getpass import getpass
 
+from myTools import ColumnarExport as cx
 import myTools.ContentObfuscation as ce
 
 
@@ -15,11 +16,16 @@ def processCLIArguments()-> dict:
     try:
         argParser:agp.ArgumentParser = agp.ArgumentParser(add_help=True)
 
+        #sqlite runs the whole pipeline against a local database file (see generate_survey_database.py), -d then being the file path
+        argParser.add_argument("--dbengine", dest="dbengine", type= str, choices=["mssql", "sqlite"], default="mssql", \
+                                help="Database engine : mssql (default, SQL Server through ODBC) or sqlite (local database file given by -d, no server nor authentication)")
+
         argParser.add_argument("-n", "--DSN", dest="dsn", \
                                 action='store', default= None, help="Sets the SQL Server DSN descriptor file - Take precedence over all access parameters", type=str)
 
-        argParser.add_argument("-s", "--server", dest="dbserver", type= str, required= True, help="Database Server : dbserver")
-        argParser.add_argument("-d", "--database", dest="dbname", type= str, required= True, help="Database name : dbname")
+        #server, database, view and file paths are required, unless they are given per target by a batch job config file
+        argParser.add_argument("-s", "--server", dest="dbserver", type= str, default=None, help="Database Server : dbserver")
+        argParser.add_argument("-d", "--database", dest="dbname", type= str, default=None, help="Database name : dbname")
 
         #user is put by default to 'sa'
         argParser.add_argument("-u", "--username", dest="dbusername", type= str, default='sa', help="Database Authentication Username : dbusername")
@@ -29,15 +35,123 @@ def processCLIArguments()-> dict:
         groupAuthenticationMechanism.add_argument("-p", "--password", dest="dbuserpassword", type= str, action='store', help="Database Authentication Password : dbuserpassword")
         groupAuthenticationMechanism.add_argument("-t", "--trustedmode", dest="trustedmode", type= bool, action='store', help="Set True to use Windows Authentication ")
 
-        argParser.add_argument("-v", "--viewname", dest="viewname", type= str, required= True, help="Database View Name to refresh when there's change in Survey Structure table")
-        argParser.add_argument("-f", "--persistencfilepath", dest="persistencefilepath", type= str, required= True, help="Persistence File Path to save the last checked Survey Structure table")
-        argParser.add_argument("-r", "--resultsfilepath", dest="resultsfilepath", type= str, required= True, help="Results File Path to save the Survey results in the view")
+        argParser.add_argument("-v", "--viewname", dest="viewname", type= str, default=None, help="Database View Name to refresh when there's change in Survey Structure table")
+        argParser.add_argument("-f", "--persistencfilepath", dest="persistencefilepath", type= str, default=None, help="Persistence File Path to save the last checked Survey Structure table")
+        argParser.add_argument("-r", "--resultsfilepath", dest="resultsfilepath", type= str, default=None, help="Results File Path to save the Survey results in the view")
+
+        #bulk mode reads Survey, Question and SurveyStructure once each instead of issuing one structure query per survey
+        argParser.add_argument("--structurefetch", dest="structurefetch", type= str, choices=["bulk", "persurvey"], default="bulk", \
+                                help="Survey structure extraction mode used when generating the view query : bulk (default) or persurvey")
+
+        #aggregate reads Answer once per survey with MAX(CASE ...) columns instead of one correlated subquery per question
+        argParser.add_argument("--querystrategy", dest="querystrategy", type= str, choices=["coalesce", "aggregate"], default="coalesce", \
+                                help="Shape of the generated view query : coalesce (default, correlated subqueries) or aggregate (conditional aggregation)")
+
+        #the client engine streams the raw answers and pivots them locally instead of reading the whole view at once
+        argParser.add_argument("--engine", dest="engine", type= str, choices=["view", "streamedview", "parallelview", "client", "parallelclient"], default="view", \
+                                help="Results extraction engine : view (default, SELECT * FROM the view), streamedview (view read and written in batches), " \
+                                     + "parallelview (view read as concurrent (SurveyId, UserId) range partitions), client (streamed client-side pivot) " \
+                                     + "or parallelclient (client-side pivot of (SurveyId, UserId) range partitions in worker processes)")
+        argParser.add_argument("--parallelism", dest="parallelism", type= int, default=4, \
+                                help="Number of range partitions, and of connections reading them concurrently, of the parallelview engine, " \
+                                     + "or number of worker processes of the parallelclient engine (default 4)")
+        #the fast fetch path decodes the fetched batches straight into typed NumPy columns instead of going through pd.read_sql
+        argParser.add_argument("--fastfetch", dest="fastfetch", action='store_true', \
+                                help="With the view, parallelview and parallelclient engines, decode the result set with the fast typed fetch path, --chunksize rows per batch")
+        argParser.add_argument("--chunksize", dest="chunksize", type= int, default=100000, help="Number of rows fetched per chunk (or batch) by the streaming modes, bounds their peak memory")
+
+        #fingerprint mode compares a server-side hash of SurveyStructure instead of pulling and pickling the whole table
+        argParser.add_argument("--changedetection", dest="changedetection", type= str, choices=["dataframe", "fingerprint", "queue"], default="dataframe", \
+                                help="Survey Structure change detection : dataframe (default, pickled table comparison), fingerprint (server-side hash) " \
+                                    + "or queue (events appended by the dbo.trg_enqueueSurveyViewRefresh trigger)")
+
+        #the queue mode refreshes the view once per burst of structure changes, when no change has been queued for DEBOUNCE seconds
+        argParser.add_argument("--debounce", dest="debounce", type= float, default=5.0, metavar="DEBOUNCE", \
+                                help="With --changedetection queue, quiet time in seconds ending a burst of structure changes before the view is refreshed (default 5)")
+
+        #fragmented layout creates one view per survey so that a structure change only alters the views of the affected surveys
+        argParser.add_argument("--viewlayout", dest="viewlayout", type= str, choices=["single", "fragmented"], default="single", \
+                                help="Layout of the refreshed view : single (default, one union view) or fragmented (one view per survey glued by the view)")
+
+        #very wide surveys are split into column group views, joined by the view as long as SQL Server allows it
+        argParser.add_argument("--maxviewcolumns", dest="maxviewcolumns", type= int, default=1000, \
+                                help="With the single layout, number of answer columns above which the view is split into column group views of that many columns (default 1000)")
+
+        #columnar formats keep integer answer codes with NULLs instead of float text and are written one row group per chunk
+        #the npz format keeps the provided answers only, as a sparse matrix whose size follows the number of answers instead of users x questions
+        argParser.add_argument("--format", dest="format", type= str, choices=["csv", "parquet", "feather", "npz"], default="csv", \
+                                help="Results file format : csv (default), parquet, feather or npz (sparse user x question answers matrix, pivoted from the raw answers whatever the engine)")
+        argParser.add_argument("--compression", dest="compression", type= str, default="zstd", \
+                                help="Compression codec of the parquet (none, snappy, gzip, brotli, lz4, zstd) or feather (none, lz4, zstd) results file (default zstd), none to write the npz file uncompressed")
+        argParser.add_argument("--partitionbysurvey", dest="partitionbysurvey", action='store_true', \
+                                help="With parquet or feather, write the results path as a directory holding one file per SurveyId")
+
+        #the local results store serves survey or user slices by index lookups, without reading the results file nor querying the view
+        argParser.add_argument("--resultsstore", dest="resultsstorefilepath", type= str, default=None, metavar="STOREFILE", \
+                                help="Also keep the pivoted results in a local SQLite store indexed by SurveyId and UserId, updated in place on each refresh")
+
+        #watch mode keeps running and checks for changes every INTERVAL seconds instead of running once
+        argParser.add_argument("--watch", dest="watch", type= float, default=None, metavar="INTERVAL", \
+                                help="Keep one connection open and refresh / export whenever the structure or the answers change, checking every INTERVAL seconds")
+        argParser.add_argument("--watchtimeout", dest="watchtimeout", type= float, default=None, metavar="SECONDS", \
+                                help="In watch mode, cancel on the server the answers check running for more than SECONDS and retry after a reconnection")
+
+        #incremental mode needs change tracking on the Answer table, it falls back to a full export whenever it cannot be used
+        argParser.add_argument("--incremental", dest="incremental", action='store_true', \
+                                help="Only re-pivot the users whose answers changed since the watermark saved next to the persistence file")
+
+        #the materialized table holds the pivot computed once per change, the view-based engines then read it instead of re-running the pivot
+        argParser.add_argument("--materializedtable", dest="materializedtable", type= str, default=None, metavar="TABLENAME", \
+                                help="Persist the view into this indexed table, rebuilt on structure changes and merged on answer changes, and export from it")
+
+        #the unchanged check only runs server-side checksums, a run finding nothing to do ends without importing pandas
+        argParser.add_argument("--skipunchanged", dest="skipunchanged", action='store_true', \
+                                help="End the run without refreshing nor exporting when neither the Survey Structure nor the answers changed since the last export")
+
+        #per-phase wall times, rows, columns, bytes written and generated SQL length, and the wall time of every query of the run
+        argParser.add_argument("--runreport", dest="runreportfilepath", type= str, default=None, metavar="REPORTFILE", \
+                                help="Save a JSON report of the run timings and metrics, per phase and per query, in this file (rewritten by each watch cycle)")
+        argParser.add_argument("--prometheustextfile", dest="prometheusfilepath", type= str, default=None, metavar="PROMFILE", \
+                                help="Save the run metrics in this Prometheus textfile, e.g. in the node exporter textfile collector directory")
+
+        #batch mode refreshes every target listed in a JSON job config file concurrently, each with its own view, persistence file and results path
+        argParser.add_argument("--jobs", dest="jobsfilepath", type= str, default=None, metavar="JOBSFILE", \
+                                help="JSON job config file listing the target databases to refresh concurrently, see the README for its layout")
+        argParser.add_argument("--workers", dest="workers", type= int, default=4, help="Maximum number of batch targets refreshed at the same time (default 4)")
+        argParser.add_argument("--jobexecutor", dest="jobexecutor", type= str, choices=["thread", "process"], default="thread", \
+                                help="Pool running the batch targets : thread (default) or process")
 
 
         argParsingResults = argParser.parse_args()
 
+        if argParsingResults.jobsfilepath is None:
+            missingArguments:list = [argumentName for argumentName, argumentValue in \
+                                     (("-s/--server", argParsingResults.dbserver if argParsingResults.dbengine == "mssql" else ''), \
+                                      ("-d/--database", argParsingResults.dbname), \
+                                      ("-v/--viewname", argParsingResults.viewname), ("-f/--persistencfilepath", argParsingResults.persistencefilepath), \
+                                      ("-r/--resultsfilepath", argParsingResults.resultsfilepath)) if argumentValue is None]
+            if missingArguments:
+                argParser.error("the following arguments are required: " + ", ".join(missingArguments))
+        elif argParsingResults.watch is not None:
+            argParser.error("--watch cannot be combined with --jobs")
+
+        if argParsingResults.watchtimeout is not None and (argParsingResults.watch is None or argParsingResults.watchtimeout <= 0):
+            argParser.error("--watchtimeout needs --watch and must be strictly positive")
+        if argParsingResults.workers < 1:
+            argParser.error("--workers must be at least 1")
+        if argParsingResults.parallelism < 1:
+            argParser.error("--parallelism must be at least 1")
+        if argParsingResults.format in cx.columnarCompressions and argParsingResults.compression not in cx.columnarCompressions[argParsingResults.format]:
+            argParser.error("--format " + argParsingResults.format + " supports the compressions: " + ", ".join(cx.columnarCompressions[argParsingResults.format]))
+        if argParsingResults.partitionbysurvey and argParsingResults.format == "npz":
+            argParser.error("--partitionbysurvey cannot be combined with --format npz")
+        if argParsingResults.maxviewcolumns < 1:
+            argParser.error("--maxviewcolumns must be at least 1")
+        if argParsingResults.debounce < 0:
+            argParser.error("--debounce cannot be negative")
+
         #the user is prompted for a password without echoing if neither trusted mode nor password are explicitely specified
-        if not argParsingResults.dbuserpassword and not argParsingResults.trustedmode:
+        if not argParsingResults.dbuserpassword and not argParsingResults.trustedmode and argParsingResults.dbengine == "mssql":
             argParsingResults.dbuserpassword = getpass()
 
         #password is obfuscated in memory
@@ -45,6 +159,7 @@ def processCLIArguments()-> dict:
             dbpassword = obfuscator.obfuscate(argParsingResults.dbuserpassword)
 
         retParametersDictionary = {
+                    "dbengine" : argParsingResults.dbengine,
                     "dsn" : argParsingResults.dsn,        
                     "dbserver" : argParsingResults.dbserver,
                     "dbname" : argParsingResults.dbname,
@@ -53,7 +168,31 @@ def processCLIArguments()-> dict:
                     "trustedmode" : argParsingResults.trustedmode,
                     "viewname" : argParsingResults.viewname,
                     "persistencefilepath": argParsingResults.persistencefilepath,
-                    "resultsfilepath" : argParsingResults.resultsfilepath
+                    "resultsfilepath" : argParsingResults.resultsfilepath,
+                    "structurefetch" : argParsingResults.structurefetch,
+                    "querystrategy" : argParsingResults.querystrategy,
+                    "engine" : argParsingResults.engine,
+                    "chunksize" : argParsingResults.chunksize,
+                    "parallelism" : argParsingResults.parallelism,
+                    "fastfetch" : argParsingResults.fastfetch,
+                    "incremental" : argParsingResults.incremental,
+                    "changedetection" : argParsingResults.changedetection,
+                    "debounce" : argParsingResults.debounce,
+                    "viewlayout" : argParsingResults.viewlayout,
+                    "maxviewcolumns" : argParsingResults.maxviewcolumns,
+                    "format" : argParsingResults.format,
+                    "compression" : argParsingResults.compression,
+                    "partitionbysurvey" : argParsingResults.partitionbysurvey,
+                    "resultsstorefilepath" : argParsingResults.resultsstorefilepath,
+                    "watch" : argParsingResults.watch,
+                    "watchtimeout" : argParsingResults.watchtimeout,
+                    "materializedtable" : argParsingResults.materializedtable,
+                    "skipunchanged" : argParsingResults.skipunchanged,
+                    "runreportfilepath" : argParsingResults.runreportfilepath,
+                    "prometheusfilepath" : argParsingResults.prometheusfilepath,
+                    "jobsfilepath" : argParsingResults.jobsfilepath,
+                    "workers" : argParsingResults.workers,
+                    "jobexecutor" : argParsingResults.jobexecutor
                 }
 
     except Exception as e:
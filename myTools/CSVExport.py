@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import csv
+import os
+import shutil
+
+import myTools.ModuleInstaller as mi
+
+pd = mi.deferImport("pandas")
+
+
+
+class CSVBatchWriter:
+    """Writes the successive batches of one result set to a CSV file, in the layout pd.read_sql(...).to_csv(...) gives for the whole
+    result set at once. pandas writes an integer column as integers when it holds no NULL in the whole result set and as floats otherwise,
+    so the type of a column cannot be decided batch by batch: integer columns are written as integers until they hold a NULL,
+    then as floats, and the values of a column written as integers before its first NULL are rewritten as floats when the writer
+    is closed, the rows following the last of these rewritten values being copied as they are.
+    Columns known to hold NULLs in the result set (nullColumnNames) are written as floats from the first batch, which spares the rewrite.
+    Each batch is expected to be indexed by the row numbers of its rows in the result set"""
+
+    def __init__(self: object, filePath: str, nullColumnNames: list = None):
+        self._m_filePath: str = filePath
+        self._m_file = open(filePath, 'w', newline='')
+        self._m_writtenRows: int = 0
+        self._m_isHeaderWritten: bool = False
+        self._m_floatColumnNames: set = set(nullColumnNames or [])
+        self._m_integerColumnNames: set = set()
+        #column position in the CSV rows -> row number from which a column written as integers before is written as floats
+        self._m_floatFromRows: dict = {}
+
+    def __enter__(self: object) -> CSVBatchWriter:
+        return self
+
+    def __exit__(self: object, excType, excValue, traceback) -> None:
+        self.Close(isRewriteNeeded=excType is None)
+
+    @property
+    def WrittenRows(self: object) -> int:
+        return self._m_writtenRows
+
+    def Write(self: object, batchDF: pd.DataFrame) -> None:
+        '''Appends a batch of rows, the header line being written with the first batch, even an empty one'''
+
+        castColumnNames:list = []
+
+        for position, columnName in enumerate(batchDF.columns):
+            columnKind:str = batchDF[columnName].dtype.kind
+
+            if columnKind in ('i', 'u'):
+                #an integer column which held a NULL in a previous batch is a float column in the whole result set
+                if columnName in self._m_floatColumnNames:
+                    castColumnNames.append(columnName)
+                elif len(batchDF) > 0:
+                    self._m_integerColumnNames.add(columnName)
+
+            elif columnName not in self._m_floatColumnNames and (columnKind == 'f' or (len(batchDF) > 0 and batchDF[columnName].isna().all())):
+                #integers holding NULLs come as floats (or as objects when only NULLs were fetched), the leading index column shifting positions
+                if columnName in self._m_integerColumnNames:
+                    self._m_floatFromRows[position + 1] = self._m_writtenRows
+                self._m_floatColumnNames.add(columnName)
+
+        if castColumnNames:
+            batchDF = batchDF.astype({columnName: 'float64' for columnName in castColumnNames})
+
+        batchDF.to_csv(self._m_file, header=not self._m_isHeaderWritten)
+        self._m_isHeaderWritten = True
+        self._m_writtenRows += len(batchDF)
+
+    def Close(self: object, isRewriteNeeded: bool = True) -> None:
+        '''Closes the CSV file, rewriting as floats the values of the columns written as integers before their first NULL'''
+
+        self._m_file.close()
+
+        if isRewriteNeeded and self._m_floatFromRows:
+            self._rewriteIntegersAsFloats()
+
+    def _rewriteIntegersAsFloats(self: object) -> None:
+        '''Rewrites the file through a temporary file swapped into place: the rows written before the last column turned float
+        are parsed, the integers of the columns which turned float after them being written as pandas writes float64 values
+        (the shortest repr, e.g. 2.0), and the following rows are copied unchanged'''
+
+        rewrittenRows:int = max(self._m_floatFromRows.values())
+        temporaryFilePath:str = self._m_filePath + '.rewrite'
+
+        with open(self._m_filePath, 'r', newline='') as sourceFile, open(temporaryFilePath, 'w', newline='') as targetFile:
+            csvReader = csv.reader(sourceFile)
+            csvWriter = csv.writer(targetFile, lineterminator=os.linesep)
+
+            csvWriter.writerow(next(csvReader))
+
+            for rowNumber in range(rewrittenRows):
+                csvRow:list = next(csvReader)
+                for position, floatFromRow in self._m_floatFromRows.items():
+                    if rowNumber < floatFromRow and csvRow[position] != '':
+                        csvRow[position] = repr(float(csvRow[position]))
+                csvWriter.writerow(csvRow)
+
+            #the reader consumed whole lines only, the rest of the file follows
+            shutil.copyfileobj(sourceFile, targetFile)
+
+        os.replace(temporaryFilePath, self._m_filePath)
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import os
+import shutil
+from typing import Iterable
+
+import myTools.ModuleInstaller as mi
+
+pd = mi.deferImport("pandas")
+pa = mi.deferImport("pyarrow")
+paipc = mi.deferImport("pyarrow.ipc")
+pq = mi.deferImport("pyarrow.parquet")
+
+
+
+#compression codecs accepted by each columnar format, none writing the file uncompressed
+columnarCompressions: dict = {"parquet": ("none", "snappy", "gzip", "brotli", "lz4", "zstd"), "feather": ("none", "lz4", "zstd")}
+
+
+def getResultsArrowSchema(columnNames: list) -> pa.Schema:
+    '''Returns the arrow schema of the pivoted results: int64 identifiers and nullable int32 answer columns,
+    NULL standing for a question outside of the survey and -1 for a missing answer'''
+    return pa.schema([(columnName, pa.int64() if columnName in ('UserId', 'SurveyId') else pa.int32()) for columnName in columnNames])
+
+
+def dataFrameToArrowTable(resultsDF: pd.DataFrame, schema: pa.Schema) -> pa.Table:
+    '''Converts a chunk of pivoted results, where answers are int64, or float64 with NaN for NULL, to an arrow table with the given schema'''
+    return pa.Table.from_pandas(resultsDF[schema.names], schema=schema, preserve_index=False)
+
+
+class _ColumnarFileWriter:
+    """Writes successive arrow tables to a single parquet or feather file, each table becoming a row group (or record batch)"""
+
+    def __init__(self: object, filePath: str, schema: pa.Schema, fileFormat: str, compression: str):
+        if fileFormat not in columnarCompressions:
+            raise Exception('Unknown columnar format: ' + str(fileFormat))
+        if compression not in columnarCompressions[fileFormat]:
+            raise Exception('The ' + fileFormat + ' format does not support the ' + str(compression) + ' compression, use one of: ' \
+                            + ', '.join(columnarCompressions[fileFormat]))
+        compression = None if compression == 'none' else compression
+
+        if fileFormat == 'parquet':
+            self._m_writer = pq.ParquetWriter(filePath, schema, compression=compression)
+        elif fileFormat == 'feather':
+            #feather V2 is the arrow IPC file format
+            self._m_sink = pa.OSFile(filePath, 'wb')
+            self._m_writer = paipc.new_file(self._m_sink, schema, options=paipc.IpcWriteOptions(compression=compression))
+        self._m_fileFormat: str = fileFormat
+
+    def write(self: object, table: pa.Table) -> None:
+        self._m_writer.write_table(table)
+
+    def close(self: object) -> None:
+        self._m_writer.close()
+        if self._m_fileFormat == 'feather':
+            self._m_sink.close()
+
+
+def _replacePath(temporaryPath: str, path: str) -> None:
+    '''Swaps the temporary file or directory into place, the previous file or directory at path being removed'''
+    if os.path.isdir(path):
+        previousPath:str = path + '.previous'
+        if os.path.isdir(previousPath):
+            shutil.rmtree(previousPath)
+        os.replace(path, previousPath)
+        os.replace(temporaryPath, path)
+        shutil.rmtree(previousPath)
+    else:
+        os.replace(temporaryPath, path)
+
+
+def _removePath(path: str) -> None:
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+def exportResultsToColumnar(resultsChunks: Iterable[pd.DataFrame], resultsPath: str, fileFormat: str, columnNames: list, \
+                            compression: str = 'zstd', partitionBySurvey: bool = False) -> int:
+    '''Writes the pivoted results, received as successive dataframe chunks, to a parquet or feather file chunk by chunk.
+    With partitionBySurvey, resultsPath is a directory receiving one file per SurveyId (SurveyId_<SURVEY_ID>.<format>),
+    each file keeping its SurveyId column, so that consumers can read only the surveys they need.
+    The file (or directory) is written next to resultsPath and swapped into place once complete, so that the files of surveys
+    without rows anymore disappear. The columns are laid out as in the first chunk; an empty result set still gives a file with
+    the schema of the columnNames (only the _common_metadata schema file for partitioned parquet, an empty directory for partitioned feather).
+    Returns the number of exported rows'''
+
+    temporaryPath:str = resultsPath + '.tmp'
+    _removePath(temporaryPath)
+
+    writers:dict = {}
+    schema:pa.Schema = None
+    exportedRows:int = 0
+
+    try:
+        try:
+            if partitionBySurvey:
+                os.makedirs(temporaryPath)
+
+            for resultsDF in resultsChunks:
+
+                if schema is None:
+                    schema = getResultsArrowSchema(list(resultsDF.columns))
+
+                if not partitionBySurvey:
+                    if None not in writers:
+                        writers[None] = _ColumnarFileWriter(temporaryPath, schema, fileFormat, compression)
+                    writers[None].write(dataFrameToArrowTable(resultsDF, schema))
+
+                else:
+                    for survey_ID, surveyResultsDF in resultsDF.groupby('SurveyId', sort=False):
+                        if survey_ID not in writers:
+                            writers[survey_ID] = _ColumnarFileWriter(os.path.join(temporaryPath, 'SurveyId_' + str(survey_ID) + '.' + fileFormat), \
+                                schema, fileFormat, compression)
+                        writers[survey_ID].write(dataFrameToArrowTable(surveyResultsDF, schema))
+
+                exportedRows += len(resultsDF)
+
+            if schema is None:
+                schema = getResultsArrowSchema(list(columnNames))
+                #the schema-only file of an empty result set
+                if not partitionBySurvey:
+                    writers[None] = _ColumnarFileWriter(temporaryPath, schema, fileFormat, compression)
+
+            if partitionBySurvey and fileFormat == 'parquet':
+                pq.write_metadata(schema, os.path.join(temporaryPath, '_common_metadata'))
+
+        finally:
+            for writer in writers.values():
+                writer.close()
+
+        _replacePath(temporaryPath, resultsPath)
+
+    except BaseException:
+        _removePath(temporaryPath)
+        raise
+
+    return exportedRows
@@ -1,12 +1,10 @@
+from __future__ import annotations
+
 import base64
 
 import myTools.ModuleInstaller as mi
 
-try:
-    import cryptography.fernet as f
-except:
-    mi.installModule("cryptography")
-    import cryptography.fernet as f
+f = mi.deferImport("cryptography.fernet")
 
 
 class ContentObfuscation:
@@ -17,7 +15,14 @@ class ContentObfuscation:
     __fernetK:bytes = b'M0tSMzdyZ083eEhkOXF3MGtydkd1Vlo0UUJwYVhlRzdlRWptQW1QbmlDbz0='
 
     def __init__(self: object):
-        self._cipher_suite = f.Fernet(base64.b64decode(ContentObfuscation.__fernetK))
+        #created on first use, runs without any password to obfuscate never import cryptography
+        self._m_cipherSuite = None
+
+    @property
+    def _cipher_suite(self: object):
+        if self._m_cipherSuite is None:
+            self._m_cipherSuite = f.Fernet(base64.b64decode(ContentObfuscation.__fernetK))
+        return self._m_cipherSuite
 
     def obfuscate(self: object, clearText: str)-> str:
         return (self._cipher_suite.encrypt(clearText.encode())).decode()
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+from collections import deque
+from contextlib import contextmanager
+import threading
+import time
+from typing import Callable, Iterator
+
+import myTools.ModuleInstaller as mi
+
+pyodbc = mi.deferImport("pyodbc")
+
+
+
+class DBConnectionPool:
+    """This class keeps a bounded set of DBAPI connections created by the given factory, so that concurrent work can
+    share connections without reconnecting each time. Connections idle for longer than idleTimeout are evicted down to minSize,
+    and connections idle for longer than healthCheckInterval are checked with healthCheckQuery before being handed out.
+    Sessions and cursors are exposed as context managers, so that connections are always given back and cursors always closed"""
+
+    def __init__(self: object, connectionFactory: Callable[[], pyodbc.Connection], minSize: int = 1, maxSize: int = 4, \
+                 idleTimeout: float = 300.0, healthCheckInterval: float = 30.0, healthCheckQuery: str = 'SELECT 1'):
+
+        if minSize < 0 or maxSize < 1 or minSize > maxSize:
+            raise Exception('Inconsistent pool sizes, expected 0 <= minSize <= maxSize and maxSize >= 1')
+
+        self._m_connectionFactory: Callable[[], pyodbc.Connection] = connectionFactory
+        self._m_minSize: int = int(minSize)
+        self._m_maxSize: int = int(maxSize)
+        self._m_idleTimeout: float = float(idleTimeout)
+        self._m_healthCheckInterval: float = float(healthCheckInterval)
+        self._m_healthCheckQuery: str = str(healthCheckQuery)
+
+        #idle connections with the time they were given back, most recently used on the right
+        self._m_idleConnections: deque = deque()
+        self._m_size: int = 0
+        self._m_isClosed: bool = False
+        self._m_condition: threading.Condition = threading.Condition()
+
+        for i in range(self._m_minSize):
+            self._m_idleConnections.append((self._m_connectionFactory(), time.monotonic()))
+            self._m_size += 1
+
+
+
+    #series of properties to have "getters" wherever appropriate
+
+    @property
+    def size(self: object) -> int:
+        '''Number of connections currently owned by the pool, idle or in use'''
+        return self._m_size
+
+    @property
+    def idleCount(self: object) -> int:
+        return len(self._m_idleConnections)
+
+    @property
+    def maxSize(self: object) -> int:
+        return self._m_maxSize
+
+    @property
+    def isClosed(self: object) -> bool:
+        return self._m_isClosed
+
+
+
+    def _isHealthy(self: object, connection: pyodbc.Connection) -> bool:
+        '''Runs the health check query on the connection and returns whether it succeeded'''
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            cursor.execute(self._m_healthCheckQuery)
+            cursor.fetchall()
+            return True
+        except Exception as excp:
+            return False
+        finally:
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Exception as excp:
+                    pass
+
+
+    def _discard(self: object, connection: pyodbc.Connection) -> None:
+        '''Closes a connection leaving the pool, ignoring errors from an already broken connection'''
+        try:
+            connection.close()
+        except Exception as excp:
+            pass
+
+
+    def evictIdle(self: object) -> int:
+        '''Closes the connections idle for longer than the idle timeout, keeping at least minSize connections. Returns the number evicted'''
+        evictedConnections:list = []
+        with self._m_condition:
+            now:float = time.monotonic()
+            #oldest idle connections are on the left
+            while self._m_idleConnections and self._m_size > self._m_minSize \
+                    and now - self._m_idleConnections[0][1] > self._m_idleTimeout:
+                evictedConnections.append(self._m_idleConnections.popleft()[0])
+                self._m_size -= 1
+            self._m_condition.notify_all()
+        for connection in evictedConnections:
+            self._discard(connection)
+        return len(evictedConnections)
+
+
+    def acquire(self: object, timeout: float = None) -> pyodbc.Connection:
+        '''Hands out a healthy connection, reusing an idle one or creating a new one below maxSize,
+        otherwise waits for a connection to be released, at most timeout seconds if given'''
+
+        self.evictIdle()
+        deadline:float = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+
+            connection:pyodbc.Connection = None
+            idleSince:float = None
+            mustCreate:bool = False
+
+            with self._m_condition:
+                while True:
+                    if self._m_isClosed:
+                        raise Exception('Connection pool is closed')
+                    if self._m_idleConnections:
+                        connection, idleSince = self._m_idleConnections.pop()
+                        break
+                    if self._m_size < self._m_maxSize:
+                        #the slot is reserved now, the connection is created outside of the lock
+                        self._m_size += 1
+                        mustCreate = True
+                        break
+                    remaining:float = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        raise Exception('Timed out waiting for a pooled DB connection')
+                    self._m_condition.wait(remaining)
+
+            if mustCreate:
+                try:
+                    return self._m_connectionFactory()
+                except Exception as excp:
+                    with self._m_condition:
+                        self._m_size -= 1
+                        self._m_condition.notify()
+                    raise Exception('Couldn''t create a pooled DB connection').with_traceback(excp.__traceback__)
+
+            if time.monotonic() - idleSince <= self._m_healthCheckInterval or self._isHealthy(connection):
+                return connection
+
+            #broken idle connection, drop it and try again
+            self._discard(connection)
+            with self._m_condition:
+                self._m_size -= 1
+                self._m_condition.notify()
+
+
+    def release(self: object, connection: pyodbc.Connection, discard: bool = False) -> None:
+        '''Gives a connection back to the pool, or closes it when discard is set or the pool is closed'''
+        with self._m_condition:
+            if discard or self._m_isClosed:
+                self._m_size -= 1
+            else:
+                self._m_idleConnections.append((connection, time.monotonic()))
+                connection = None
+            self._m_condition.notify()
+        if connection is not None:
+            self._discard(connection)
+
+
+    @contextmanager
+    def connection(self: object, timeout: float = None) -> Iterator[pyodbc.Connection]:
+        '''Context-managed session: the connection is given back when leaving the block,
+        rolled back and discarded if the block raised, since its state is then unknown'''
+        connection:pyodbc.Connection = self.acquire(timeout)
+        try:
+            yield connection
+        except BaseException:
+            try:
+                connection.rollback()
+            except Exception as excp:
+                pass
+            self.release(connection, discard=True)
+            raise
+        else:
+            self.release(connection)
+
+
+    @contextmanager
+    def cursor(self: object, timeout: float = None) -> Iterator[pyodbc.Cursor]:
+        '''Context-managed cursor on a pooled connection, always closed when leaving the block'''
+        with self.connection(timeout) as connection:
+            cursor:pyodbc.Cursor = connection.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+
+    def close(self: object) -> None:
+        '''Closes the idle connections and makes the pool close the others as soon as they are released'''
+        with self._m_condition:
+            self._m_isClosed = True
+            idleConnections:list = [connection for connection, idleSince in self._m_idleConnections]
+            self._m_idleConnections.clear()
+            self._m_size -= len(idleConnections)
+            self._m_condition.notify_all()
+        for connection in idleConnections:
+            self._discard(connection)
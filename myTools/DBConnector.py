@@ -1,20 +1,21 @@
+from __future__ import annotations
+
 from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+import decimal
 import platform
+import time
+from typing import Iterator
 
 import myTools.ContentObfuscation as ce
+import myTools.CSVExport as csx
+import myTools.DBConnectionPool as dbp
 import myTools.ModuleInstaller as mi
+import myTools.RunMetrics as rm
 
-try:
-    import pandas as pd
-except:
-    mi.installModule("pandas")
-    import pandas as pd
-
-try:
-    import pyodbc
-except:
-    mi.installModule("pyodbc")
-    import pyodbc
+np = mi.deferImport("numpy")
+pd = mi.deferImport("pandas")
+pyodbc = mi.deferImport("pyodbc")
 
 
 
@@ -51,6 +52,9 @@ class DBConnector(ABC):
 
             self._m_isDBConnectionOpen: bool = False
             self._m_conduit:pyodbc.Connection = None
+            self._m_poolSettings:dict = None
+            self._m_pool:dbp.DBConnectionPool = None
+            self._m_metrics:rm.RunMetrics = rm.RunMetrics()
             self._m_dbDriver:str = 'undef'
 
             self._selectBestDBDriverAvailable()
@@ -136,43 +140,78 @@ class DBConnector(ABC):
     def IsConnected(self: object)-> bool:
         return self._m_isDBConnectionOpen
 
+    @property
+    def IsPooled(self: object)-> bool:
+        return self._m_poolSettings is not None
+
+    @property
+    def Metrics(self: object)-> rm.RunMetrics:
+        return self._m_metrics
+
 
    
 
 
+    def _createConduit(self: object)-> pyodbc.Connection:
+        '''Creates a new pyodbc connection with the DBConnector object connection properties depending on the identified OS'''
+        identifiedOS: str = platform.system()
+
+        if('windows' in identifiedOS.lower()):
+
+            if(self.dbDSN is not None and self.dbDSN != ''):
+                return pyodbc.connect('DSN=' + self.dbDSN + \
+                    ';UID=' + self.dbUserName + \
+                    ';PWD=' + self._obfuscator.deObfuscate(self._dbUserPassword) + ';')
+
+            elif(self.dbIsTrustedMode == False):
+                return pyodbc.connect('DRIVER=' + self.selectedDriver + ';SERVER=' + self.dbServer + \
+                    ';DATABASE=' + self.dbName + ';UID=' + self.dbUserName + \
+                    ';PWD=' + self._obfuscator.deObfuscate(self._dbUserPassword) + ';')
+            else:
+                return pyodbc.connect('DRIVER=' + self.selectedDriver + ';SERVER=' + self.dbServer + \
+                    ';DATABASE=' + self.dbName + ';Trusted_Connection=yes;')
+
+        elif(identifiedOS.lower() in ('linux', 'darwin')):
+            if(self.dbDSN is None or self.dbDSN == ''):
+                raise Exception("Missing DSN for Linux / MacOS, cannot create a DB connection")
+            return pyodbc.connect('DSN=' + self.dbDSN + \
+                    ';UID=' + self.dbUserName + \
+                    ';PWD=' + self._obfuscator.deObfuscate(self._dbUserPassword) + ';')
+
+        raise Exception('Unsupported OS, cannot create a DB connection: ' + identifiedOS)
+
+
+
+    def ConfigurePool(self: object, minSize: int = 1, maxSize: int = 4, idleTimeout: float = 300.0)-> None:
+        '''Makes Open create a pool of connections from which sessions, cursors and queries draw their connection,
+        so that concurrent work does not share a single pyodbc connection. Must be called before Open'''
+        if(self.IsConnected == True):
+            raise Exception('The connection pool must be configured before opening the DB connection')
+        self._m_poolSettings = {"minSize": int(minSize), "maxSize": int(maxSize), "idleTimeout": float(idleTimeout)}
+
+
+
+    def AttachMetrics(self: object, metrics: rm.RunMetrics)-> None:
+        '''Makes the queries executed from now on recorded in the given run metrics, e.g. a fresh one per refresh cycle'''
+        self._m_metrics = metrics
+
+
+    def _recordQuery(self: object, method: str, query: str, startTime: float, rows: int = None, columns: int = None, isFailed: bool = False)-> None:
+        '''Records a query executed by one of the ExecuteQuery methods in the attached run metrics'''
+        self._m_metrics.RecordQuery(method, query, time.perf_counter() - startTime, rows, columns, isFailed)
+
+
+
     def Open(self: object):
         '''Opens database connection with the DBConnector object connection properties depending on the identified OS'''
         if(self.IsConnected == False):
             if(self._dbConduit is None):
                 
                 try:
-                    identifiedOS: str = platform.system()
-
-                    if('windows' in identifiedOS.lower()):
-
-                        if(self.dbDSN is not None and dbDSN != ''):
-                                self._m_conduit = \
-                                    pyodbc.connect('DSN=' + self.dbDSN + \
-                                    ';UID=' + self.dbUserName + \
-                                    ';PWD=' + self._obfuscator.deObfuscate(self._dbUserPassword) + ';')
-
-                        if(self.dbIsTrustedMode == False and (self.dbDSN is None or dbDSN == '')):
-                            self._m_conduit = \
-                                pyodbc.connect('DRIVER=' + self.selectedDriver + ';SERVER=' + self.dbServer + \
-                                ';DATABASE=' + self.dbName + ';UID=' + self.dbUserName + \
-                                ';PWD=' + self._obfuscator.deObfuscate(self._dbUserPassword) + ';')
-                        else:
-                            self._m_conduit = \
-                                pyodbc.connect('DRIVER=' + self.selectedDriver + ';SERVER=' + self.dbServer + \
-                                ';DATABASE=' + self.dbName + ';Trusted_Connection=yes;')
-
-                    elif(('linux' or 'darwin') in identifiedOS.lower()):
-                        if(self.dbDSN is None or dbDSN == ''):
-                            raise Exception("Missing DSN for Linux / MacOS, cannot create a DB connection")
-                        self._m_conduit = \
-                                pyodbc.connect('DSN=' + self.dbDSN + \
-                                ';UID=' + self.dbUserName + \
-                                ';PWD=' + self._obfuscator.deObfuscate(self._dbUserPassword) + ';')
+                    self._m_conduit = self._createConduit()
+
+                    if(self._m_poolSettings is not None):
+                        self._m_pool = dbp.DBConnectionPool(self._createConduit, **self._m_poolSettings)
         
                     self._m_isDBConnectionOpen = True
                 
@@ -183,11 +222,41 @@ class DBConnector(ABC):
 
 
 
+    @contextmanager
+    def Session(self: object)-> Iterator[pyodbc.Connection]:
+        '''Context-managed connection: a pooled connection given back when leaving the block if a pool is configured,
+        the DBConnector object own connection otherwise'''
+        if(self.IsConnected == False):
+            raise Exception('DB connection is not open')
+        if(self._m_pool is not None):
+            with self._m_pool.connection() as conduit:
+                yield conduit
+        else:
+            yield self._dbConduit
+
+
+
+    @contextmanager
+    def Cursor(self: object)-> Iterator[pyodbc.Cursor]:
+        '''Context-managed cursor on a session connection, always closed when leaving the block'''
+        with self.Session() as conduit:
+            cursor:pyodbc.Cursor = conduit.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+
+
+
     def Close(self:object)-> None:
         '''Closes database connection and resets the DBConnector object conduit to None'''
         if(self.IsConnected == True):
             if(self._dbConduit is not None):
                 try:
+                    if(self._m_pool is not None):
+                        self._m_pool.close()
+                        self._m_pool = None
+
                     self._dbConduit.close()
 
                     self._m_isDBConnectionOpen = False
@@ -203,15 +272,32 @@ class DBConnector(ABC):
 
 
 
+    def _translateQuery(self: object, query: str)-> str:
+        '''Rewrites a query written in T-SQL, the dialect of this project, into the dialect of the connected RDBMS. Nothing to do for MSSQL'''
+        return query
+
+
+    def _executeStatements(self: object, cursor: pyodbc.Cursor, statements: str)-> None:
+        '''Executes a batch of Data Definition Language statements on the cursor'''
+        cursor.execute(statements)
+
+
+
     def ExecuteQuery_withRS(self: object, query: str)-> pd.DataFrame:
         '''Executes a Data Query Language statement on the database connection with the given query and returns the result set as a pandas dataframe'''
         if(query is not None and self.IsConnected == True):
             if (type(query) is str):
                 if(query):
+                    startTime:float = time.perf_counter()
+                    translatedQuery:str = query
                     try:
-                        df:pd.DataFrame = pd.read_sql(query, self._dbConduit)
+                        translatedQuery = self._translateQuery(query)
+                        with self.Session() as conduit:
+                            df:pd.DataFrame = pd.read_sql(translatedQuery, conduit)
+                        self._recordQuery('ExecuteQuery_withRS', translatedQuery, startTime, len(df), len(df.columns))
                         return df
                     except Exception as excp:
+                        self._recordQuery('ExecuteQuery_withRS', translatedQuery, startTime, isFailed=True)
                         raise Exception('Couldn''t execute SQL query').with_traceback(excp.__traceback__)
                 else:
                     raise Exception('Empty SQL query to be executed')
@@ -221,20 +307,336 @@ class DBConnector(ABC):
             raise ('SQL query object is None')
 
 
+    def ExecuteQuery_withRow(self: object, query: str)-> tuple:
+        '''Executes a Data Query Language statement on the database connection with the given query and returns the first row
+        of the result set as a tuple, None if there is none. Meant for the small checks (counts, checksums, versions) run before
+        anything else, it does not go through pandas, which is then not even imported'''
+        if(query is not None and self.IsConnected == True):
+            if (type(query) is str):
+                if(query):
+                    startTime:float = time.perf_counter()
+                    translatedQuery:str = query
+                    try:
+                        translatedQuery = self._translateQuery(query)
+                        with self.Cursor() as cursor:
+                            cursor.execute(translatedQuery)
+                            row = cursor.fetchone()
+                            columnCount:int = len(cursor.description)
+                        self._recordQuery('ExecuteQuery_withRow', translatedQuery, startTime, 0 if row is None else 1, columnCount)
+                        return None if row is None else tuple(row)
+                    except Exception as excp:
+                        self._recordQuery('ExecuteQuery_withRow', translatedQuery, startTime, isFailed=True)
+                        raise Exception('Couldn''t execute SQL query').with_traceback(excp.__traceback__)
+                else:
+                    raise Exception('Empty SQL query to be executed')
+            else:
+                raise Exception('SQL query couldn''t be casted as a string')
+        else:
+            raise Exception('SQL query object is None')
+
+
     def ExecuteQuery_view(self: object, query: str)-> None:
         '''Executes a Data Definition Language statement on the database connection with the given query and commits changes'''
         if(query is not None and self.IsConnected == True):
             if (type(query) is str):
                 if(query):
+                    startTime:float = time.perf_counter()
+                    translatedQuery:str = query
                     try:
-                        cursor = self._dbConduit.cursor()
-                        cursor.execute(query) 
-                        self._dbConduit.commit()
+                        translatedQuery = self._translateQuery(query)
+                        with self.Session() as conduit:
+                            with closing(conduit.cursor()) as cursor:
+                                self._executeStatements(cursor, translatedQuery)
+                            conduit.commit()
+                        self._recordQuery('ExecuteQuery_view', translatedQuery, startTime)
                     except Exception as excp:
+                        self._recordQuery('ExecuteQuery_view', translatedQuery, startTime, isFailed=True)
                         raise Exception('Couldn''t execute SQL query').with_traceback(excp.__traceback__)
                 else:
                     raise Exception('Empty SQL query to be executed')
             else:
                 raise Exception('SQL query couldn''t be casted as a string')
         else:
-            raise ('SQL query object is None')
\ No newline at end of file
+            raise ('SQL query object is None')
+
+
+
+    def ExecuteQuery_withRSChunks(self: object, query: str, chunkSize: int)-> Iterator[pd.DataFrame]:
+        '''Executes a Data Query Language statement on the database connection with the given query and yields the result set 
+        as successive pandas dataframes of at most chunkSize rows, so that only one chunk is held in memory at a time'''
+        if(query is not None and self.IsConnected == True):
+            if (type(query) is str):
+                if(query):
+                    if(chunkSize is None or int(chunkSize) <= 0):
+                        raise Exception('Chunk size must be a strictly positive integer')
+                    #the time spent by the consumer between two chunks is included, as it holds the result set open
+                    startTime:float = time.perf_counter()
+                    translatedQuery:str = query
+                    fetchedRows:int = 0
+                    fetchedColumns:int = None
+                    try:
+                        translatedQuery = self._translateQuery(query)
+                        with self.Session() as conduit:
+                            for df in pd.read_sql(translatedQuery, conduit, chunksize = int(chunkSize)):
+                                fetchedRows += len(df)
+                                fetchedColumns = len(df.columns)
+                                yield df
+                        self._recordQuery('ExecuteQuery_withRSChunks', translatedQuery, startTime, fetchedRows, fetchedColumns)
+                    except GeneratorExit:
+                        #the consumer stopped reading before the end of the result set
+                        self._recordQuery('ExecuteQuery_withRSChunks', translatedQuery, startTime, fetchedRows, fetchedColumns)
+                        raise
+                    except Exception as excp:
+                        self._recordQuery('ExecuteQuery_withRSChunks', translatedQuery, startTime, fetchedRows, fetchedColumns, isFailed=True)
+                        raise Exception('Couldn''t execute SQL query').with_traceback(excp.__traceback__)
+                else:
+                    raise Exception('Empty SQL query to be executed')
+            else:
+                raise Exception('SQL query couldn''t be casted as a string')
+        else:
+            raise Exception('SQL query object is None')
+
+
+
+    def _getFloatColumns(self: object, cursorDescription: tuple)-> list:
+        '''Returns the names of the result set columns that pd.read_sql hands back as floats whatever their values: float and decimal columns.
+        Whether an integer column is upcast to float64 depends on it holding a NULL in the whole result set, which the declared
+        nullability does not tell'''
+        return [columnDescription[0] for columnDescription in cursorDescription if columnDescription[1] in (float, decimal.Decimal)]
+
+
+    @staticmethod
+    def _getColumnKind(typeCode: type, columnValues: tuple)-> str:
+        '''Returns how a result set column is decoded by the fast fetch path: 'int', 'float', 'object',
+        or None while the type is unknown (no type code from the driver and only NULLs seen so far)'''
+        if typeCode is None:
+            typeCode = next((type(value) for value in columnValues if value is not None), None)
+            if typeCode is None:
+                return None
+        if typeCode is int:
+            return 'int'
+        if typeCode in (float, decimal.Decimal):
+            return 'float'
+        return 'object'
+
+
+    @staticmethod
+    def _getSmallestIntegerType(minValue: int, maxValue: int)-> np.dtype:
+        '''Returns the smallest signed integer type holding the values between minValue and maxValue'''
+        for integerType in (np.int8, np.int16, np.int32):
+            typeInfo = np.iinfo(integerType)
+            if minValue >= typeInfo.min and maxValue <= typeInfo.max:
+                return np.dtype(integerType)
+        return np.dtype(np.int64)
+
+
+    @staticmethod
+    def _decodeColumnBatch(columnKind: str, columnValues: tuple)-> tuple:
+        '''Decodes the values of one column of a fetched batch into a typed NumPy buffer and returns it with its validity mask
+        (False for NULL, None when the batch holds no NULL): an integer column into the smallest integer type holding its values
+        (e.g. int32 keys, int8 answer codes), a float or decimal column into float64 with NaN for NULL, another column into objects'''
+        if columnKind == 'int':
+            try:
+                #single C-level conversion pass, as long as the batch holds no NULL
+                columnBuffer:np.ndarray = np.array(columnValues, dtype=np.int64)
+                validityMask:np.ndarray = None
+            except TypeError:
+                validityMask:np.ndarray = np.fromiter((value is not None for value in columnValues), dtype=bool, count=len(columnValues))
+                columnBuffer:np.ndarray = np.array([0 if value is None else value for value in columnValues], dtype=np.int64)
+            if len(columnBuffer) == 0:
+                return columnBuffer, validityMask
+            return columnBuffer.astype(DBConnector._getSmallestIntegerType(columnBuffer.min(), columnBuffer.max()), copy=False), validityMask
+        if columnKind == 'float':
+            #NumPy turns None into NaN
+            return np.array(columnValues, dtype=np.float64), None
+        columnBuffer:np.ndarray = np.empty(len(columnValues), dtype=object)
+        columnBuffer[:] = list(columnValues)
+        return columnBuffer, None
+
+
+    @staticmethod
+    def _concatenateColumnBatches(columnKind: str, batches: list)-> tuple:
+        '''Concatenates the decoded batches of one column into its buffer and validity mask (None when the column holds no NULL),
+        integer batches being widened to the largest of their types.
+        Leading batches decoded before the type was known (no type code from the driver) only hold NULLs'''
+        if columnKind == 'int':
+            batches = [(np.zeros(len(values), dtype=np.int8), np.zeros(len(values), dtype=bool)) if values.dtype == object else (values, mask) \
+                       for values, mask in batches]
+            columnBuffer:np.ndarray = np.concatenate([values for values, mask in batches]) if len(batches) > 1 else batches[0][0]
+            if all(mask is None for values, mask in batches):
+                return columnBuffer, None
+            return columnBuffer, np.concatenate([np.ones(len(values), dtype=bool) if mask is None else mask for values, mask in batches])
+        if columnKind == 'float':
+            batches = [(values.astype(np.float64) if values.dtype == object else values, mask) for values, mask in batches]
+        return (np.concatenate([values for values, mask in batches]) if len(batches) > 1 else batches[0][0]), None
+
+
+    def _fetchColumnBuffers(self: object, cursor: pyodbc.Cursor, batchSize: int)-> tuple:
+        '''Fetches the result set of the executed cursor batchSize rows at a time and decodes each column straight into a typed NumPy buffer,
+        the kind of the column being chosen from its type code in the cursor description (from its first value when the driver gives none).
+        Returns the column names, the column kinds and the list of (buffer, validity mask) of the columns'''
+
+        columnNames:list = [columnDescription[0] for columnDescription in cursor.description]
+        columnTypeCodes:list = [columnDescription[1] for columnDescription in cursor.description]
+        columnKinds:list = [None] * len(columnNames)
+        columnBatches:list = [[] for columnName in columnNames]
+
+        rows = cursor.fetchmany(int(batchSize))
+        while rows:
+            #one transposition of the batch, then one conversion per column
+            for position, columnValues in enumerate(zip(*rows)):
+                if columnKinds[position] is None:
+                    columnKinds[position] = self._getColumnKind(columnTypeCodes[position], columnValues)
+                columnBatches[position].append(self._decodeColumnBatch(columnKinds[position], columnValues))
+            rows = cursor.fetchmany(int(batchSize))
+
+        if len(columnBatches) == 0 or len(columnBatches[0]) == 0:
+            return columnNames, columnKinds, None
+
+        return columnNames, columnKinds, [self._concatenateColumnBatches(columnKind, batches) for columnKind, batches in zip(columnKinds, columnBatches)]
+
+
+
+    def ExecuteQuery_withRSColumns(self: object, query: str, batchSize: int = 50000)-> dict:
+        '''Executes a Data Query Language statement and returns its result set as a dictionary of column name to (buffer, validity mask),
+        decoded as the fast fetch path does: integer columns in the smallest integer type holding their values (e.g. int32 keys and
+        int8/int16 answer codes) with a boolean validity mask, False for NULL, or None when the column holds no NULL.
+        Float and decimal columns are float64 with NaN for NULL, the other columns objects, both without mask'''
+        if(query is not None and self.IsConnected == True):
+            if (type(query) is str):
+                if(query):
+                    if(batchSize is None or int(batchSize) <= 0):
+                        raise Exception('Batch size must be a strictly positive integer')
+                    startTime:float = time.perf_counter()
+                    translatedQuery:str = query
+                    try:
+                        translatedQuery = self._translateQuery(query)
+                        with self.Cursor() as cursor:
+                            cursor.arraysize = int(batchSize)
+                            cursor.execute(translatedQuery)
+                            columnNames, columnKinds, columnBuffers = self._fetchColumnBuffers(cursor, batchSize)
+
+                        if columnBuffers is None:
+                            columnBuffers = [(np.empty(0, dtype=np.int8 if columnKind == 'int' else np.float64 if columnKind == 'float' else object), None) \
+                                             for columnKind in columnKinds]
+
+                        self._recordQuery('ExecuteQuery_withRSColumns', translatedQuery, startTime, \
+                                          len(columnBuffers[0][0]) if columnBuffers else 0, len(columnNames))
+                        return dict(zip(columnNames, columnBuffers))
+                    except Exception as excp:
+                        self._recordQuery('ExecuteQuery_withRSColumns', translatedQuery, startTime, isFailed=True)
+                        raise Exception('Couldn''t execute SQL query').with_traceback(excp.__traceback__)
+                else:
+                    raise Exception('Empty SQL query to be executed')
+            else:
+                raise Exception('SQL query couldn''t be casted as a string')
+        else:
+            raise Exception('SQL query object is None')
+
+
+
+    def ExecuteQuery_withRSFast(self: object, query: str, batchSize: int = 50000)-> pd.DataFrame:
+        '''Executes a Data Query Language statement and returns the same dataframe as ExecuteQuery_withRS, without going through pd.read_sql:
+        rows are fetched batchSize at a time and each column is decoded straight into a typed NumPy buffer chosen from the cursor description
+        (see ExecuteQuery_withRSColumns), so that no intermediate row tuples nor dtype inference over the whole result set are needed.
+        The compact integer buffers are only widened when the dataframe is built: to int64, or to float64 with NaN for NULL
+        if the column holds one, as pd.read_sql does. Columns of types other than integer, float and decimal are left to pandas inference'''
+        if(query is not None and self.IsConnected == True):
+            if (type(query) is str):
+                if(query):
+                    if(batchSize is None or int(batchSize) <= 0):
+                        raise Exception('Batch size must be a strictly positive integer')
+                    startTime:float = time.perf_counter()
+                    translatedQuery:str = query
+                    try:
+                        translatedQuery = self._translateQuery(query)
+                        with self.Cursor() as cursor:
+                            cursor.arraysize = int(batchSize)
+                            cursor.execute(translatedQuery)
+                            columnNames, columnKinds, columnBuffers = self._fetchColumnBuffers(cursor, batchSize)
+
+                        if columnBuffers is None:
+                            self._recordQuery('ExecuteQuery_withRSFast', translatedQuery, startTime, 0, len(columnNames))
+                            return pd.DataFrame(columns=columnNames)
+
+                        columns:dict = {}
+                        for columnName, columnKind, (columnBuffer, validityMask) in zip(columnNames, columnKinds, columnBuffers):
+                            if columnKind == 'int':
+                                #an integer column becomes float64 as a whole as soon as it holds a NULL
+                                columns[columnName] = columnBuffer.astype(np.int64) if validityMask is None \
+                                    else np.where(validityMask, columnBuffer, np.nan)
+                            else:
+                                columns[columnName] = columnBuffer
+
+                        resultDF:pd.DataFrame = pd.DataFrame(columns, copy=False)
+
+                        #other types (strings, dates, bits, unknown all-NULL columns) get the inference pd.read_sql would apply
+                        objectColumns:list = [columnName for columnName, columnKind in zip(columnNames, columnKinds) if columnKind in ('object', None)]
+                        if objectColumns:
+                            resultDF[objectColumns] = pd.DataFrame.from_records(resultDF[objectColumns].itertuples(index=False, name=None), \
+                                columns=objectColumns, coerce_float=True)
+
+                        self._recordQuery('ExecuteQuery_withRSFast', translatedQuery, startTime, len(resultDF), len(resultDF.columns))
+                        return resultDF
+                    except Exception as excp:
+                        self._recordQuery('ExecuteQuery_withRSFast', translatedQuery, startTime, isFailed=True)
+                        raise Exception('Couldn''t execute SQL query').with_traceback(excp.__traceback__)
+                else:
+                    raise Exception('Empty SQL query to be executed')
+            else:
+                raise Exception('SQL query couldn''t be casted as a string')
+        else:
+            raise Exception('SQL query object is None')
+
+
+
+    def ExportQuery_toCSV(self: object, query: str, filePath: str, batchSize: int, nullColumnNames: list = None)-> int:
+        '''Executes a Data Query Language statement on the database connection and writes the result set to a CSV file
+        batch by batch with cursor.fetchmany, in the same layout as pd.read_sql(...).to_csv(...) including the leading index column.
+        Integer columns are written as integers unless they hold a NULL anywhere in the result set, as pandas does (see CSVExport.CSVBatchWriter):
+        nullColumnNames, the columns known to hold NULLs, are written as floats from the first batch, the values of another integer column
+        written before its first NULL are rewritten once the result set is exported.
+        Peak memory is bounded by batchSize rows. Returns the number of exported rows'''
+        if(query is not None and self.IsConnected == True):
+            if (type(query) is str):
+                if(query):
+                    if(batchSize is None or int(batchSize) <= 0):
+                        raise Exception('Batch size must be a strictly positive integer')
+                    startTime:float = time.perf_counter()
+                    translatedQuery:str = query
+                    try:
+                        translatedQuery = self._translateQuery(query)
+                        with self.Cursor() as cursor:
+                            cursor.arraysize = int(batchSize)
+                            cursor.execute(translatedQuery)
+
+                            columnNames:list = [columnDescription[0] for columnDescription in cursor.description]
+                            floatColumns:list = self._getFloatColumns(cursor.description)
+
+                            with csx.CSVBatchWriter(filePath, nullColumnNames) as exportWriter:
+                                rows = cursor.fetchmany(int(batchSize))
+                                #the first batch is always written, even when empty, so that the header line is there
+                                while True:
+                                    batchDF:pd.DataFrame = pd.DataFrame.from_records([tuple(row) for row in rows], columns=columnNames)
+                                    for columnName in floatColumns:
+                                        batchDF[columnName] = batchDF[columnName].astype('float64')
+                                    batchDF.index = pd.RangeIndex(exportWriter.WrittenRows, exportWriter.WrittenRows + len(batchDF))
+                                    exportWriter.Write(batchDF)
+
+                                    rows = cursor.fetchmany(int(batchSize))
+                                    if not rows:
+                                        break
+
+                            exportedRows:int = exportWriter.WrittenRows
+
+                        self._recordQuery('ExportQuery_toCSV', translatedQuery, startTime, exportedRows, len(columnNames))
+                        return exportedRows
+                    except Exception as excp:
+                        self._recordQuery('ExportQuery_toCSV', translatedQuery, startTime, isFailed=True)
+                        raise Exception('Couldn''t export SQL query results').with_traceback(excp.__traceback__)
+                else:
+                    raise Exception('Empty SQL query to be executed')
+            else:
+                raise Exception('SQL query couldn''t be casted as a string')
+        else:
+            raise Exception('SQL query object is None')
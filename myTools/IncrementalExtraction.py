@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import os
+
+from myTools import CSVExport as csx
+from myTools import DBConnector as dbc
+from myTools import SurveyPivotEngine as spe
+from myTools import SurveyResultsMatrix as srm
+import myTools.ModuleInstaller as mi
+
+np = mi.deferImport("numpy")
+pd = mi.deferImport("pandas")
+
+
+
+#rows of the previous results file read at a time while merging the changed results into it
+_mergeChunkSize: int = 100000
+
+#incremental extraction relies on SQL Server change tracking being enabled on the Answer table, e.g.:
+#   ALTER DATABASE <DB_NAME> SET CHANGE_TRACKING = ON (CHANGE_RETENTION = 7 DAYS, AUTO_CLEANUP = ON)
+#   ALTER TABLE Answer ENABLE CHANGE_TRACKING
+
+strChangeTrackingVersionQuery: str = """
+			SELECT
+				CHANGE_TRACKING_CURRENT_VERSION() as CurrentVersion
+				, CHANGE_TRACKING_MIN_VALID_VERSION(OBJECT_ID('Answer')) as MinValidVersion
+	"""
+
+strChangedSurveyUsersQuery: str = """
+			SELECT DISTINCT
+				ct.UserId
+				, ct.SurveyId
+			FROM
+				CHANGETABLE(CHANGES Answer, <SINCE_VERSION>) as ct
+	"""
+
+strChangedAnswersQuery: str = """
+			SELECT
+				a.UserId
+				, a.SurveyId
+				, a.QuestionId
+				, a.Answer_Value
+			FROM
+				Answer as a
+			WHERE EXISTS
+			(
+				SELECT *
+				FROM CHANGETABLE(CHANGES Answer, <SINCE_VERSION>) as ct
+				WHERE ct.UserId = a.UserId AND ct.SurveyId = a.SurveyId
+			)
+			AND EXISTS
+			(
+				SELECT *
+				FROM [User] as u
+				WHERE u.UserId = a.UserId
+			)
+			ORDER BY a.SurveyId, a.UserId
+	"""
+
+
+def getChangeTrackingVersions(connector: dbc.DBConnector) -> tuple:
+    '''Returns the current change tracking version of the database and the minimum version still valid for the Answer table.
+    Both are None when change tracking is not enabled'''
+
+    currentVersion, minValidVersion = connector.ExecuteQuery_withRow(strChangeTrackingVersionQuery)
+
+    currentVersion = None if currentVersion is None else int(currentVersion)
+    minValidVersion = None if minValidVersion is None else int(minValidVersion)
+
+    return currentVersion, minValidVersion
+
+
+def isWatermarkUsable(watermarkVersion: int, currentVersion: int, minValidVersion: int) -> bool:
+    '''Checks whether the changes since the persisted watermark can still be read from the change tracking tables'''
+    if watermarkVersion is None or currentVersion is None or minValidVersion is None:
+        return False
+    return minValidVersion <= watermarkVersion <= currentVersion
+
+
+def _isSortedAfter(surveyIds: np.ndarray, userIds: np.ndarray, lastKey: tuple) -> bool:
+    '''Checks that the (SurveyId, UserId) keys of a chunk are in ascending order, from the last key of the previous chunk on'''
+    if lastKey is not None:
+        surveyIds = np.concatenate(([lastKey[0]], surveyIds))
+        userIds = np.concatenate(([lastKey[1]], userIds))
+    return bool(((surveyIds[1:] > surveyIds[:-1]) | ((surveyIds[1:] == surveyIds[:-1]) & (userIds[1:] >= userIds[:-1]))).all())
+
+
+def _mergeChunk(previousDF: pd.DataFrame, changedKeys: pd.MultiIndex, changedDF: pd.DataFrame, nullColumnNames: list) -> pd.DataFrame:
+    '''Returns the rows of a chunk of the previous results without the changed pairs, merged with the given re-pivoted rows in (SurveyId, UserId) order.
+    read_csv types each chunk on its own, so the columns holding no NULL in the merged chunk are taken back as integers'''
+
+    isChanged = pd.MultiIndex.from_frame(previousDF[['UserId', 'SurveyId']]).isin(changedKeys)
+
+    mergedDF:pd.DataFrame = pd.concat([previousDF[~isChanged]] + ([changedDF[previousDF.columns]] if len(changedDF) > 0 else []), ignore_index=True)
+    mergedDF = mergedDF.sort_values(['SurveyId', 'UserId'], kind='stable', ignore_index=True)
+
+    return mergedDF.astype({columnName: np.int64 for columnName in mergedDF.columns \
+        if mergedDF[columnName].dtype.kind == 'f' and columnName not in nullColumnNames and not mergedDF[columnName].isna().any()})
+
+
+def _mergeSortedResults(resultsFilePath: str, mergedFilePath: str, changedKeys: pd.MultiIndex, pivotedDF: pd.DataFrame, nullColumnNames: list) -> bool:
+    '''Merges the previous results file, read chunk by chunk, with the re-pivoted rows into the merged file, both in (SurveyId, UserId) order.
+    Returns False, the merged file being incomplete, as soon as the previous file turns out not to be in that order'''
+
+    with csx.CSVBatchWriter(mergedFilePath, nullColumnNames) as mergedWriter:
+        pendingDF:pd.DataFrame = pivotedDF
+        lastKey:tuple = None
+
+        for previousDF in pd.read_csv(resultsFilePath, index_col=0, chunksize=_mergeChunkSize):
+            if len(previousDF) == 0:
+                continue
+
+            surveyIds:np.ndarray = previousDF['SurveyId'].to_numpy(dtype=np.int64)
+            userIds:np.ndarray = previousDF['UserId'].to_numpy(dtype=np.int64)
+            if not _isSortedAfter(surveyIds, userIds, lastKey):
+                return False
+            lastKey = (int(surveyIds[-1]), int(userIds[-1]))
+
+            #the re-pivoted pairs up to the last key of the chunk are merged with it, the others wait for the next chunks
+            isDue = (pendingDF['SurveyId'] < lastKey[0]) | ((pendingDF['SurveyId'] == lastKey[0]) & (pendingDF['UserId'] <= lastKey[1]))
+            mergedDF:pd.DataFrame = _mergeChunk(previousDF, changedKeys, pendingDF[isDue], nullColumnNames)
+            mergedDF.index = pd.RangeIndex(mergedWriter.WrittenRows, mergedWriter.WrittenRows + len(mergedDF))
+            mergedWriter.Write(mergedDF)
+            pendingDF = pendingDF[~isDue]
+
+        #the re-pivoted pairs after the last previous row, the header line being written even when no row is left
+        mergedDF = _mergeChunk(pendingDF.iloc[:0], changedKeys, pendingDF, nullColumnNames)
+        mergedDF.index = pd.RangeIndex(mergedWriter.WrittenRows, mergedWriter.WrittenRows + len(mergedDF))
+        mergedWriter.Write(mergedDF)
+
+    return True
+
+
+def _mergeUnsortedResults(resultsFilePath: str, mergedFilePath: str, changedKeys: pd.MultiIndex, pivotedDF: pd.DataFrame, nullColumnNames: list) -> None:
+    '''Merges the previous results file, in another order than (SurveyId, UserId), with the re-pivoted rows into the merged file in that order.
+    The previous results are held whole, read chunk by chunk into a compact results matrix'''
+
+    previousResults:srm.SurveyResultsMatrix = srm.SurveyResultsMatrix.fromDataFrameChunks( \
+        pd.read_csv(resultsFilePath, index_col=0, chunksize=_mergeChunkSize))
+    changedResults:srm.SurveyResultsMatrix = srm.SurveyResultsMatrix.fromDataFrame( \
+        pivotedDF[['UserId', 'SurveyId'] + previousResults.getAnswerColumnNames()])
+
+    isChanged = pd.MultiIndex.from_arrays([previousResults.userIds, previousResults.surveyIds]).isin(changedKeys)
+    mergedResults:srm.SurveyResultsMatrix = srm.SurveyResultsMatrix.concatenate([previousResults.takeRows(~isChanged), changedResults])
+    mergedResults = mergedResults.takeRows(np.lexsort((mergedResults.userIds, mergedResults.surveyIds)))
+
+    mergedResults.toCSV(mergedFilePath, _mergeChunkSize, nullColumnNames)
+
+
+def mergeChangedResults(resultsFilePath: str, changedSurveyUsersDF: pd.DataFrame, pivotedDF: pd.DataFrame, nullColumnNames: list = None) -> None:
+    '''Replaces in the previously exported results file the rows of the changed (UserId, SurveyId) pairs with their re-pivoted version.
+    Pairs whose answers have all been deleted simply disappear from the results.
+    The previous file is read chunk by chunk and merged with the re-pivoted rows, in the (SurveyId, UserId) order of the pivot query,
+    into a temporary file swapped into place: memory stays bounded by the chunk size, the whole file is still copied.
+    A previous file in another order (e.g. exported from the view) is merged in memory once, as a compact results matrix, the merged file being in order.
+    nullColumnNames are the answer columns holding NULL in the merged results, written as floats as in a full export'''
+
+    nullColumnNames = list(nullColumnNames or [])
+    changedKeys:pd.MultiIndex = pd.MultiIndex.from_frame(changedSurveyUsersDF[['UserId', 'SurveyId']])
+    mergedFilePath:str = resultsFilePath + '.merge'
+
+    try:
+        if not _mergeSortedResults(resultsFilePath, mergedFilePath, changedKeys, pivotedDF, nullColumnNames):
+            _mergeUnsortedResults(resultsFilePath, mergedFilePath, changedKeys, pivotedDF, nullColumnNames)
+    except Exception:
+        if os.path.exists(mergedFilePath):
+            os.remove(mergedFilePath)
+        raise
+
+    os.replace(mergedFilePath, resultsFilePath)
+
+
+def getChangedResults(connector: dbc.DBConnector, membershipDF: pd.DataFrame, sinceVersion: int) -> tuple:
+    '''Returns the (UserId, SurveyId) pairs whose answers changed since the given change tracking version, along with their re-pivoted rows.
+    Pairs whose answers have all been deleted have no pivoted row'''
+
+    changedSurveyUsersDF:pd.DataFrame = connector.ExecuteQuery_withRS( \
+        strChangedSurveyUsersQuery.replace('<SINCE_VERSION>', str(int(sinceVersion))))
+
+    if len(changedSurveyUsersDF) == 0:
+        return changedSurveyUsersDF, None
+
+    changedAnswersDF:pd.DataFrame = connector.ExecuteQuery_withRS( \
+        strChangedAnswersQuery.replace('<SINCE_VERSION>', str(int(sinceVersion))))
+
+    return changedSurveyUsersDF, spe.pivotAnswerChunk(changedAnswersDF, membershipDF)
+
+
+def exportIncrementalResults(connector: dbc.DBConnector, membershipDF: pd.DataFrame, resultsFilePath: str, sinceVersion: int) -> int:
+    '''Re-pivots only the (UserId, SurveyId) pairs whose answers changed since the given change tracking version
+    and merges them into the previously exported results file. Returns the number of changed pairs'''
+
+    changedSurveyUsersDF, pivotedDF = getChangedResults(connector, membershipDF, sinceVersion)
+
+    if len(changedSurveyUsersDF) == 0:
+        return 0
+
+    mergeChangedResults(resultsFilePath, changedSurveyUsersDF, pivotedDF, spe.getNullAnswerColumnNames(connector, membershipDF))
+
+    return len(changedSurveyUsersDF)
@@ -1,13 +1,11 @@
+from __future__ import annotations
+
 import platform
 
 from myTools import DBConnector as db
 import myTools.ModuleInstaller as mi
 
-try:
-    import pyodbc
-except:
-    mi.installModule("pyodbc")
-    import pyodbc
+pyodbc = mi.deferImport("pyodbc")
 
 
 class MSSQL_DBConnector(db.DBConnector):
@@ -0,0 +1,105 @@
+from myTools import DBConnector as dbc
+
+
+
+#the pivot is materialized into <TABLE_NAME>, a real table clustered on (SurveyId, UserId): the (UserId, SurveyId) key of the view,
+#in the order the view results are exported in, so that reading the table back is an ordered index scan
+
+strTableExistsQuery: str = """
+			SELECT CASE WHEN OBJECT_ID('<TABLE_NAME>', 'U') IS NULL THEN 0 ELSE 1 END as TableExists
+	"""
+
+#the staging table is filled and indexed outside of the transaction, the swap itself only takes schema locks for an instant
+strRebuildTableQuery: str = """
+			SET XACT_ABORT ON;
+
+			IF OBJECT_ID('<STAGING_TABLE_NAME>', 'U') IS NOT NULL DROP TABLE <STAGING_TABLE_NAME>;
+
+			SELECT * INTO <STAGING_TABLE_NAME> FROM <VIEW_NAME>;
+
+			CREATE UNIQUE CLUSTERED INDEX IX_SurveyId_UserId ON <STAGING_TABLE_NAME> (SurveyId, UserId);
+
+			BEGIN TRANSACTION;
+				IF OBJECT_ID('<TABLE_NAME>', 'U') IS NOT NULL DROP TABLE <TABLE_NAME>;
+				EXEC sp_rename '<STAGING_TABLE_NAME>', '<UNQUALIFIED_TABLE_NAME>';
+			COMMIT TRANSACTION;
+	"""
+
+#the pairs whose answers changed are merged: re-pivoted rows are updated or inserted, rows of pairs left without answers deleted
+strMergeChangedPairsQuery: str = """
+			SET XACT_ABORT ON;
+
+			SELECT DISTINCT ct.UserId, ct.SurveyId
+			INTO #ChangedSurveyUsers
+			FROM CHANGETABLE(CHANGES Answer, <SINCE_VERSION>) as ct;
+
+			BEGIN TRANSACTION;
+
+				WITH ChangedTarget AS
+				(
+					SELECT t.*
+					FROM <TABLE_NAME> as t WITH (HOLDLOCK)
+					WHERE EXISTS (SELECT * FROM #ChangedSurveyUsers as c WHERE c.UserId = t.UserId AND c.SurveyId = t.SurveyId)
+				)
+				MERGE ChangedTarget as target
+				USING
+				(
+					SELECT v.*
+					FROM <VIEW_NAME> as v
+					WHERE EXISTS (SELECT * FROM #ChangedSurveyUsers as c WHERE c.UserId = v.UserId AND c.SurveyId = v.SurveyId)
+				) as source
+				ON target.UserId = source.UserId AND target.SurveyId = source.SurveyId
+				<WHEN_MATCHED_CLAUSE>
+				WHEN NOT MATCHED BY TARGET THEN
+					INSERT (<COLUMN_LIST>) VALUES (<SOURCE_COLUMN_LIST>)
+				WHEN NOT MATCHED BY SOURCE THEN
+					DELETE;
+
+			COMMIT TRANSACTION;
+
+			DROP TABLE #ChangedSurveyUsers;
+	"""
+
+
+def getStagingTableName(tableName: str) -> str:
+    return tableName + '_Staging'
+
+
+def doesTableExist(connector: dbc.DBConnector, tableName: str) -> bool:
+    '''Checks whether the materialized results table exists in the database'''
+    tableExists, = connector.ExecuteQuery_withRow(strTableExistsQuery.replace('<TABLE_NAME>', tableName))
+    return bool(tableExists)
+
+
+def rebuildMaterializedTable(connector: dbc.DBConnector, viewName: str, tableName: str) -> None:
+    '''Materializes the whole view into a staging table, indexes it and swaps it with the results table'''
+
+    #sp_rename takes the new name without its schema
+    unqualifiedTableName:str = tableName.split('.')[-1]
+
+    connector.ExecuteQuery_view(strRebuildTableQuery \
+        .replace('<STAGING_TABLE_NAME>', getStagingTableName(tableName)) \
+        .replace('<UNQUALIFIED_TABLE_NAME>', unqualifiedTableName) \
+        .replace('<TABLE_NAME>', tableName) \
+        .replace('<VIEW_NAME>', viewName))
+
+
+def mergeChangedPairs(connector: dbc.DBConnector, viewName: str, tableName: str, sinceVersion: int) -> None:
+    '''Re-pivots through the view only the (UserId, SurveyId) pairs whose answers changed since the given change tracking version
+    and merges them into the results table'''
+
+    #the columns of the table are the ones of the view, as long as the structure has not changed since the last rebuild
+    columnNames:list = list(connector.ExecuteQuery_withRS('SELECT TOP 0 * FROM ' + tableName).columns)
+    answerColumnNames:list = [columnName for columnName in columnNames if columnName not in ('UserId', 'SurveyId')]
+
+    #without any question, matched rows have nothing to update
+    whenMatchedClause:str = '' if not answerColumnNames else 'WHEN MATCHED THEN UPDATE SET ' \
+        + ', '.join(['target.' + columnName + ' = source.' + columnName for columnName in answerColumnNames])
+
+    connector.ExecuteQuery_view(strMergeChangedPairsQuery \
+        .replace('<SINCE_VERSION>', str(int(sinceVersion))) \
+        .replace('<WHEN_MATCHED_CLAUSE>', whenMatchedClause) \
+        .replace('<COLUMN_LIST>', ', '.join(columnNames)) \
+        .replace('<SOURCE_COLUMN_LIST>', ', '.join(['source.' + columnName for columnName in columnNames])) \
+        .replace('<TABLE_NAME>', tableName) \
+        .replace('<VIEW_NAME>', viewName))
@@ -1,7 +1,13 @@
+import importlib
+import importlib.util
 import subprocess
 import sys
 
 
+#packages needed by the project, installed by the explicit setup step: python -m myTools.ModuleInstaller
+requiredModules: tuple = ("pandas", "numpy", "pyodbc", "cryptography", "pyarrow")
+
+
 def __is_conda() -> bool:
     '''Checks whether the conda package manager is installed'''
     try:
@@ -30,3 +36,44 @@ def installModule(package: str):
         subprocess.check_call([sys.executable, "-m", package_manager, "install", package])
     except Exception as e:
         print("Unable to collect the package {} :".format(package), e)
+
+
+def installRequiredModules() -> None:
+    '''Installs the packages needed by the project which are not installed yet'''
+    for package in requiredModules:
+        if importlib.util.find_spec(package) is None:
+            installModule(package)
+        else:
+            print("Package {} already installed".format(package))
+
+
+
+class _DeferredModule:
+    """Stands for a module which is only imported on the first access to one of its attributes,
+    so that the modules of the project can be imported without paying for the heavy packages a run may not need"""
+
+    def __init__(self: object, moduleName: str):
+        self._m_moduleName: str = moduleName
+        self._m_module = None
+
+    def __getattr__(self: object, attributeName: str):
+        #only reached for the attributes of the deferred module, the own ones above being found first
+        if attributeName.startswith('_m_'):
+            raise AttributeError(attributeName)
+        if self._m_module is None:
+            try:
+                self._m_module = importlib.import_module(self._m_moduleName)
+            except ImportError as excp:
+                raise Exception("The package {} is not installed, install the dependencies with: python -m myTools.ModuleInstaller" \
+                                .format(self._m_moduleName.split('.')[0])).with_traceback(excp.__traceback__)
+        return getattr(self._m_module, attributeName)
+
+
+def deferImport(moduleName: str) -> _DeferredModule:
+    '''Returns a stand-in for the module, imported on first use. Packages are no longer installed on the fly, see installRequiredModules'''
+    return _DeferredModule(moduleName)
+
+
+
+if __name__ == '__main__':
+    installRequiredModules()
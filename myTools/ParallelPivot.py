@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import concurrent.futures as cf
+from collections import deque
+import time
+from typing import Callable, Iterator
+
+from myTools import CSVExport as csx
+from myTools import DBConnector as dbc
+from myTools import PartitionedFetch as pf
+from myTools import SurveyPivotEngine as spe
+import myTools.ModuleInstaller as mi
+
+pd = mi.deferImport("pandas")
+
+
+
+#raw answers of one (SurveyId, UserId) range partition, ordered so that all the rows of one pair are contiguous
+strRawAnswersPartitionQuery: str = """
+			SELECT
+				a.UserId
+				, a.SurveyId
+				, a.QuestionId
+				, a.Answer_Value
+			FROM
+				Answer as a
+			WHERE EXISTS
+			(
+				SELECT *
+				FROM [User] as u
+				WHERE u.UserId = a.UserId
+			)
+			AND <PARTITION_PREDICATE>
+			ORDER BY a.SurveyId, a.UserId
+	"""
+
+#partitions per worker process, so that the workers done with a short partition take the next one instead of waiting for the longest
+_partitionsPerWorker: int = 4
+
+
+def _pivotAnswerPartition(createConnector: Callable, connectorArguments: dict, membershipDF: pd.DataFrame, partitionQuery: str, \
+                          fastFetchBatchSize: int = None) -> tuple:
+    '''Runs in a worker process: fetches the raw answers of one partition on a connection of its own and pivots them.
+    Returns the pivoted partition along with the wall time and the row count of the fetch'''
+
+    connector:dbc.DBConnector = createConnector(connectorArguments)
+    connector.Open()
+
+    try:
+        startTime:float = time.perf_counter()
+        if fastFetchBatchSize is not None:
+            answersDF:pd.DataFrame = connector.ExecuteQuery_withRSFast(partitionQuery, fastFetchBatchSize)
+        else:
+            answersDF:pd.DataFrame = connector.ExecuteQuery_withRS(partitionQuery)
+        fetchTime:float = time.perf_counter() - startTime
+    finally:
+        connector.Close()
+
+    return spe.pivotAnswerChunk(answersDF, membershipDF), fetchTime, len(answersDF)
+
+
+def getAnswerPartitionQueries(connector: dbc.DBConnector, partitionCount: int) -> list:
+    '''Returns one raw answers query per (SurveyId, UserId) range partition of about the same number of pivoted rows, in (SurveyId, UserId) order.
+    Partitions never split the answers of one pair, so the pivoted partitions only need to be concatenated'''
+
+    bounds:list = [None] + pf.getPartitionBoundaries(connector, partitionCount) + [None]
+
+    return [strRawAnswersPartitionQuery.replace('<PARTITION_PREDICATE>', pf.getPartitionPredicate(lowerBound, upperBound)) \
+            for lowerBound, upperBound in zip(bounds[:-1], bounds[1:])]
+
+
+def iterPivotedPartitions(connector: dbc.DBConnector, createConnector: Callable, connectorArguments: dict, membershipDF: pd.DataFrame, \
+                          workers: int, fastFetchBatchSize: int = None) -> Iterator[pd.DataFrame]:
+    '''Pivots the answers on the client side in a pool of worker processes, each partition being fetched and pivoted by one of them
+    on its own connection, created by the picklable createConnector(connectorArguments). The pivoted partitions are yielded
+    in (SurveyId, UserId) order, indexed by their row number in the whole result, as the client engine yields its chunks.
+    At most twice as many partitions as workers are pivoted or waiting to be consumed at any time. The queries of the workers
+    are recorded in the metrics of the given connector, which computes the partition boundaries'''
+
+    partitionQueries:list = getAnswerPartitionQueries(connector, workers * _partitionsPerWorker)
+
+    rowOffset:int = 0
+    pendingFutures:deque = deque()
+
+    def takeOldestPartition() -> pd.DataFrame:
+        partitionQuery, future = pendingFutures.popleft()
+        pivotedDF, fetchTime, fetchedRows = future.result()
+        connector.Metrics.RecordQuery('ExecuteQuery_withRS (worker process)', partitionQuery, fetchTime, fetchedRows, 4)
+        return pivotedDF
+
+    with cf.ProcessPoolExecutor(max_workers=workers) as executor:
+        try:
+            for partitionQuery in partitionQueries:
+                pendingFutures.append((partitionQuery, executor.submit(_pivotAnswerPartition, createConnector, connectorArguments, \
+                    membershipDF, partitionQuery, fastFetchBatchSize)))
+
+                #the workers keep pivoting the next partitions while the oldest one is consumed
+                if len(pendingFutures) >= 2 * workers:
+                    pivotedDF:pd.DataFrame = takeOldestPartition()
+                    pivotedDF.index = pd.RangeIndex(rowOffset, rowOffset + len(pivotedDF))
+                    rowOffset += len(pivotedDF)
+                    if len(pivotedDF) > 0:
+                        yield pivotedDF
+
+            while pendingFutures:
+                pivotedDF:pd.DataFrame = takeOldestPartition()
+                pivotedDF.index = pd.RangeIndex(rowOffset, rowOffset + len(pivotedDF))
+                rowOffset += len(pivotedDF)
+                if len(pivotedDF) > 0:
+                    yield pivotedDF
+
+        finally:
+            #partitions not started yet are dropped when the consumer stops early or a partition failed
+            for partitionQuery, future in pendingFutures:
+                future.cancel()
+
+
+def exportPivotedPartitionsToCSV(connector: dbc.DBConnector, createConnector: Callable, connectorArguments: dict, membershipDF: pd.DataFrame, \
+                                 resultsFilePath: str, workers: int, fastFetchBatchSize: int = None) -> int:
+    '''Pivots the answers in a pool of worker processes and appends each pivoted partition to the results CSV file, in order,
+    in the same layout as the export of the view, the answer columns holding NULL in some row being written as floats in every partition.
+    Returns the number of exported rows'''
+
+    with csx.CSVBatchWriter(resultsFilePath, spe.getNullAnswerColumnNames(connector, membershipDF)) as resultsWriter:
+
+        for pivotedDF in iterPivotedPartitions(connector, createConnector, connectorArguments, membershipDF, workers, fastFetchBatchSize):
+            resultsWriter.Write(pivotedDF)
+
+        #an empty result set still gets its header line
+        if resultsWriter.WrittenRows == 0:
+            resultsWriter.Write(spe.pivotAnswerChunk(pd.DataFrame(columns=['UserId', 'SurveyId', 'QuestionId', 'Answer_Value']), membershipDF))
+
+        return resultsWriter.WrittenRows
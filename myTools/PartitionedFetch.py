@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import concurrent.futures as cf
+from collections import deque
+from typing import Iterator
+
+from myTools import DBConnector as dbc
+import myTools.ModuleInstaller as mi
+
+pd = mi.deferImport("pandas")
+
+
+
+#first (SurveyId, UserId) pair of each of the <PARTITION_COUNT> slices of equal size of the answered pairs, the first slice excepted.
+#every answered pair becomes one row of the view, so the slices of the view delimited by these boundaries have about the same size
+strPartitionBoundariesQuery: str = """
+			WITH AnsweredPairs AS
+			(
+				SELECT DISTINCT a.SurveyId, a.UserId
+				FROM Answer as a
+			)
+			, Slices AS
+			(
+				SELECT
+					p.SurveyId
+					, p.UserId
+					, NTILE(<PARTITION_COUNT>) OVER (ORDER BY p.SurveyId, p.UserId) as SliceNumber
+				FROM AnsweredPairs as p
+			)
+			, SliceStarts AS
+			(
+				SELECT
+					s.SurveyId
+					, s.UserId
+					, s.SliceNumber
+					, ROW_NUMBER() OVER (PARTITION BY s.SliceNumber ORDER BY s.SurveyId, s.UserId) as RowInSlice
+				FROM Slices as s
+			)
+			SELECT
+				ss.SurveyId
+				, ss.UserId
+			FROM SliceStarts as ss
+			WHERE ss.RowInSlice = 1 AND ss.SliceNumber > 1
+			ORDER BY ss.SurveyId, ss.UserId
+	"""
+
+strPartitionQuery: str = """
+			SELECT *
+			FROM <VIEW_NAME>
+			WHERE <PARTITION_PREDICATE>
+			ORDER BY SurveyId, UserId
+	"""
+
+
+def getPartitionBoundaries(connector: dbc.DBConnector, partitionCount: int) -> list:
+    '''Returns the (SurveyId, UserId) pairs starting the 2nd to last partitions of the view, in increasing order.
+    Partitions split the view on survey boundaries and, within a survey, on UserId ranges'''
+
+    if partitionCount <= 1:
+        return []
+
+    boundariesDF:pd.DataFrame = connector.ExecuteQuery_withRS( \
+        strPartitionBoundariesQuery.replace('<PARTITION_COUNT>', str(int(partitionCount))))
+
+    return [(int(survey_ID), int(user_ID)) for survey_ID, user_ID in zip(boundariesDF['SurveyId'], boundariesDF['UserId'])]
+
+
+def getPartitionPredicate(lowerBound: tuple, upperBound: tuple) -> str:
+    '''Returns the WHERE predicate selecting the rows whose (SurveyId, UserId) is in [lowerBound, upperBound),
+    a None bound leaving that side open'''
+
+    predicates:list = []
+
+    if lowerBound is not None:
+        predicates.append('(SurveyId > ' + str(lowerBound[0]) + ' OR (SurveyId = ' + str(lowerBound[0]) \
+                          + ' AND UserId >= ' + str(lowerBound[1]) + '))')
+    if upperBound is not None:
+        predicates.append('(SurveyId < ' + str(upperBound[0]) + ' OR (SurveyId = ' + str(upperBound[0]) \
+                          + ' AND UserId < ' + str(upperBound[1]) + '))')
+
+    return ' AND '.join(predicates) if predicates else '1 = 1'
+
+
+def getPartitionQueries(viewName: str, boundaries: list) -> list:
+    '''Returns one query per partition of the view delimited by the given boundaries, in (SurveyId, UserId) order'''
+
+    bounds:list = [None] + list(boundaries) + [None]
+
+    return [strPartitionQuery.replace('<VIEW_NAME>', viewName).replace('<PARTITION_PREDICATE>', getPartitionPredicate(lowerBound, upperBound)) \
+            for lowerBound, upperBound in zip(bounds[:-1], bounds[1:])]
+
+
+def joinColumnGroupPartitions(partitionDFs: list) -> pd.DataFrame:
+    '''Returns the partitions of the column group views of a view too wide to be read at once, joined side by side.
+    They are read in (SurveyId, UserId) order with the same predicate, so row i of each one belongs to the same (UserId, SurveyId) pair'''
+
+    firstPartitionDF:pd.DataFrame = partitionDFs[0]
+    for partitionDF in partitionDFs[1:]:
+        if not (len(partitionDF) == len(firstPartitionDF) \
+                and (partitionDF['UserId'].to_numpy() == firstPartitionDF['UserId'].to_numpy()).all() \
+                and (partitionDF['SurveyId'].to_numpy() == firstPartitionDF['SurveyId'].to_numpy()).all()):
+            raise Exception('Column group views returned different rows for the same partition, the answers changed while they were read')
+
+    return pd.concat([firstPartitionDF.reset_index(drop=True)] \
+        + [partitionDF.drop(columns=['UserId', 'SurveyId']).reset_index(drop=True) for partitionDF in partitionDFs[1:]], axis=1)
+
+
+def iterViewPartitions(connector: dbc.DBConnector, viewName: str, parallelism: int, fastFetchBatchSize: int = None, \
+                       columnGroupViewNames: list = None) -> Iterator[pd.DataFrame]:
+    '''Reads the view as parallelism range partitions fetched concurrently, each on its own pooled connection,
+    and yields them in (SurveyId, UserId) order, indexed by their row number in the whole result.
+    At most parallelism partitions are fetched or waiting to be consumed at any time.
+    Without a connection pool on the connector, the partitions are fetched one after the other.
+    Partitions are decoded by the fast fetch path in batches of fastFetchBatchSize rows when given.
+    When given, the column group views are read in place of the view, too wide to exist, each partition being joined from them'''
+
+    sourceViewNames:list = list(columnGroupViewNames) if columnGroupViewNames else [viewName]
+    boundaries:list = getPartitionBoundaries(connector, parallelism)
+    partitionQueries:list = list(zip(*[getPartitionQueries(sourceViewName, boundaries) for sourceViewName in sourceViewNames]))
+    workers:int = parallelism if connector.IsPooled else 1
+
+    def fetchQuery(partitionQuery: str) -> pd.DataFrame:
+        if fastFetchBatchSize is not None:
+            return connector.ExecuteQuery_withRSFast(partitionQuery, fastFetchBatchSize)
+        return connector.ExecuteQuery_withRS(partitionQuery)
+
+    def fetchPartition(sourcePartitionQueries: tuple) -> pd.DataFrame:
+        if len(sourcePartitionQueries) == 1:
+            return fetchQuery(sourcePartitionQueries[0])
+        return joinColumnGroupPartitions([fetchQuery(partitionQuery) for partitionQuery in sourcePartitionQueries])
+
+    rowOffset:int = 0
+    pendingFutures:deque = deque()
+
+    with cf.ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for sourcePartitionQueries in partitionQueries:
+                pendingFutures.append(executor.submit(fetchPartition, sourcePartitionQueries))
+
+                if len(pendingFutures) >= workers:
+                    partitionDF:pd.DataFrame = pendingFutures.popleft().result()
+                    partitionDF.index = pd.RangeIndex(rowOffset, rowOffset + len(partitionDF))
+                    rowOffset += len(partitionDF)
+                    yield partitionDF
+
+            while pendingFutures:
+                partitionDF:pd.DataFrame = pendingFutures.popleft().result()
+                partitionDF.index = pd.RangeIndex(rowOffset, rowOffset + len(partitionDF))
+                rowOffset += len(partitionDF)
+                yield partitionDF
+
+        finally:
+            #partitions not started yet are dropped when the consumer stops early or a partition failed
+            for future in pendingFutures:
+                future.cancel()
+
+
+def fetchViewPartitioned(connector: dbc.DBConnector, viewName: str, parallelism: int, fastFetchBatchSize: int = None, \
+                         columnGroupViewNames: list = None) -> pd.DataFrame:
+    '''Returns all rows from the view, or from its column group views when given, in a pandas dataframe,
+    read as concurrent range partitions and merged in (SurveyId, UserId) order.
+    Column types are settled on the merged dataframe, as they would be by a single read of the whole view'''
+
+    partitionDFs:list = list(iterViewPartitions(connector, viewName, parallelism, fastFetchBatchSize, columnGroupViewNames))
+
+    #a column entirely NULL in a partition comes as objects, inferred again once merged
+    return pd.concat(partitionDFs, ignore_index=True).infer_objects()
@@ -0,0 +1,305 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+import json
+import numbers
+import sqlite3
+from typing import Iterable, Iterator
+
+import myTools.ModuleInstaller as mi
+
+np = mi.deferImport("numpy")
+pd = mi.deferImport("pandas")
+
+
+
+#widest results table of a SQLite file compiled with the default SQLITE_MAX_COLUMN, UserId and SurveyId included
+_maxStoreColumns: int = 2000
+
+#rows sent to SQLite by each executemany call
+_writeBatchSize: int = 10000
+
+
+class ResultsStore:
+    """This class keeps the pivoted survey answers in a local SQLite file, in a Results table clustered on (SurveyId, UserId)
+    and indexed on (UserId, SurveyId), so that slices for a survey or a handful of users are served by index lookups
+    instead of reading the whole results file or querying the view. The store is updated in place: rows are upserted
+    only when their answers differ and rows whose pair has no answer anymore are deleted, the table being rebuilt
+    only when the list of questions changes. Each update is one transaction, committed together with the state of the store
+    (e.g. the answers fingerprint it reflects), and the file is in WAL mode, so that readers keep reading a consistent
+    snapshot while it is updated. The columns of the Results table are read again whenever the schema version of the file changed,
+    so that a store kept open follows the rebuilds made through another connection"""
+
+    _resultsTableName: str = 'Results'
+
+    def __init__(self: object, storeFilePath: str, isReadOnly: bool = False):
+        self._m_storeFilePath: str = storeFilePath
+        self._m_isReadOnly: bool = isReadOnly
+        self._m_conduit: sqlite3.Connection = None
+        self._m_columnNames: list = None
+        self._m_schemaVersion: int = None
+
+
+    def __enter__(self: object) -> ResultsStore:
+        self.Open()
+        return self
+
+
+    def __exit__(self: object, excType, excValue, traceback) -> None:
+        self.Close()
+
+
+    @property
+    def IsOpen(self: object) -> bool:
+        return self._m_conduit is not None
+
+
+    @property
+    def ColumnNames(self: object) -> list:
+        '''Columns of the Results table, UserId and SurveyId first, None when the store holds no results yet'''
+        if self.IsOpen:
+            self._refreshColumnNames()
+        return None if self._m_columnNames is None else list(self._m_columnNames)
+
+
+    @property
+    def AnswerColumnNames(self: object) -> list:
+        '''ANS_Q<QUESTION_ID> columns of the Results table, None when the store holds no results yet'''
+        if self.IsOpen:
+            self._refreshColumnNames()
+        return None if self._m_columnNames is None else self._m_columnNames[2:]
+
+
+    def Open(self: object) -> None:
+        '''Opens the store file, creating it unless read-only'''
+        if self._m_isReadOnly:
+            self._m_conduit = sqlite3.connect('file:' + self._m_storeFilePath + '?mode=ro', uri=True, check_same_thread=False, isolation_level=None)
+        else:
+            #transactions are opened explicitly by _transaction, so that the DDL of a rebuild is part of them
+            self._m_conduit = sqlite3.connect(self._m_storeFilePath, check_same_thread=False, isolation_level=None)
+            self._m_conduit.execute('PRAGMA journal_mode=WAL')
+            self._m_conduit.execute('CREATE TABLE IF NOT EXISTS StoreState (Name TEXT PRIMARY KEY, Value TEXT NOT NULL)')
+        self._refreshColumnNames()
+
+
+    def Close(self: object) -> None:
+        if self._m_conduit is not None:
+            self._m_conduit.close()
+            self._m_conduit = None
+            self._m_schemaVersion = None
+
+
+    @contextmanager
+    def _transaction(self: object) -> Iterator[None]:
+        '''Context-managed write transaction, committed when leaving the block and rolled back on error'''
+        self._m_conduit.execute('BEGIN IMMEDIATE')
+        try:
+            self._refreshColumnNames()
+            yield
+        except BaseException:
+            self._m_conduit.execute('ROLLBACK')
+            raise
+        self._m_conduit.execute('COMMIT')
+
+
+    @contextmanager
+    def _snapshot(self: object) -> Iterator[None]:
+        '''Context-managed read transaction, so that the columns checked against the schema and the rows read come from the same snapshot'''
+        self._m_conduit.execute('BEGIN')
+        try:
+            self._refreshColumnNames()
+            yield
+        finally:
+            self._m_conduit.execute('COMMIT')
+
+
+    def _readColumnNames(self: object) -> list:
+        columnInfos:list = self._m_conduit.execute('PRAGMA table_info(' + ResultsStore._resultsTableName + ')').fetchall()
+        return [columnInfo[1] for columnInfo in columnInfos] if columnInfos else None
+
+
+    def _refreshColumnNames(self: object) -> None:
+        '''Reads the columns of the Results table again when the schema changed since they were read, e.g. rebuilt by another connection'''
+        schemaVersion:int = self._m_conduit.execute('PRAGMA schema_version').fetchone()[0]
+        if schemaVersion != self._m_schemaVersion:
+            self._m_columnNames = self._readColumnNames()
+            self._m_schemaVersion = schemaVersion
+
+
+    def GetState(self: object) -> dict:
+        '''Returns the state committed with the last update of the store, None if it was never updated'''
+        try:
+            stateRow:tuple = self._m_conduit.execute("SELECT Value FROM StoreState WHERE Name = 'state'").fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return None if stateRow is None else json.loads(stateRow[0])
+
+
+    def GetRows(self: object, surveyIds: Iterable[int] = None, userIds: Iterable[int] = None, columns: list = None) -> list:
+        '''Returns the rows of the given surveys and / or users as tuples, in (SurveyId, UserId) order, with the given columns only
+        when asked (UserId and SurveyId are always returned first). The lightest way to read a few rows, without pandas'''
+        return self._readSlice(surveyIds, userIds, columns)[1]
+
+
+    def _readSlice(self: object, surveyIds: Iterable[int], userIds: Iterable[int], columns: list) -> tuple:
+        '''Returns the selected columns and the rows of the given surveys and / or users, both read from the same snapshot of the store'''
+
+        with self._snapshot():
+            if self._m_columnNames is None:
+                return ['UserId', 'SurveyId'], []
+
+            selectedColumns:list = self._getSelectedColumns(columns)
+            return selectedColumns, self._m_conduit.execute(*self._getSliceQuery(selectedColumns, surveyIds, userIds)).fetchall()
+
+
+    def _getSliceQuery(self: object, selectedColumns: list, surveyIds: Iterable[int], userIds: Iterable[int]) -> tuple:
+        predicates:list = []
+        parameters:list = []
+
+        for columnName, values in (('SurveyId', surveyIds), ('UserId', userIds)):
+            if values is not None:
+                values = [int(value) for value in ([values] if isinstance(values, numbers.Integral) else values)]
+                predicates.append(columnName + ' IN (' + ','.join('?' * len(values)) + ')')
+                parameters += values
+
+        sliceQuery:str = 'SELECT ' + ', '.join(selectedColumns) + ' FROM ' + ResultsStore._resultsTableName \
+            + (' WHERE ' + ' AND '.join(predicates) if predicates else '') + ' ORDER BY SurveyId, UserId'
+
+        return sliceQuery, parameters
+
+
+    def GetSlice(self: object, surveyIds: Iterable[int] = None, userIds: Iterable[int] = None, columns: list = None) -> pd.DataFrame:
+        '''Returns the rows of the given surveys and / or users in a pandas dataframe laid out as the export of the view,
+        answers as float64 with NaN for questions outside of the survey'''
+
+        selectedColumns, sliceRows = self._readSlice(surveyIds, userIds, columns)
+
+        #NULL answers become NaN when the rows are converted at once, the keys are taken back as integers
+        sliceValues:np.ndarray = np.array(sliceRows, dtype=np.float64).reshape(len(sliceRows), len(selectedColumns))
+        keyValues:np.ndarray = np.array([sliceRow[:2] for sliceRow in sliceRows], dtype=np.int64).reshape(len(sliceRows), 2)
+
+        sliceDF:pd.DataFrame = pd.DataFrame(sliceValues[:, 2:], columns=selectedColumns[2:])
+        sliceDF.insert(0, 'SurveyId', keyValues[:, 1])
+        sliceDF.insert(0, 'UserId', keyValues[:, 0])
+
+        return sliceDF
+
+
+    def GetSurvey(self: object, survey_ID: int, columns: list = None) -> pd.DataFrame:
+        '''Returns the rows of one survey in a pandas dataframe'''
+        return self.GetSlice(surveyIds=[survey_ID], columns=columns)
+
+
+    def GetUsers(self: object, userIds: Iterable[int], surveyIds: Iterable[int] = None, columns: list = None) -> pd.DataFrame:
+        '''Returns the rows of the given users, in all surveys or in the given ones, in a pandas dataframe'''
+        return self.GetSlice(surveyIds=surveyIds, userIds=userIds, columns=columns)
+
+
+    def _getSelectedColumns(self: object, columns: list) -> list:
+        if columns is None:
+            return list(self._m_columnNames)
+        unknownColumns:list = [columnName for columnName in columns if columnName not in self._m_columnNames]
+        if unknownColumns:
+            raise Exception('Unknown columns in the results store: ' + ', '.join(unknownColumns))
+        return ['UserId', 'SurveyId'] + [columnName for columnName in columns if columnName not in ('UserId', 'SurveyId')]
+
+
+    def ReplaceAll(self: object, pivotedChunks: Iterable[pd.DataFrame], answerColumnNames: list, state: dict) -> int:
+        '''Rebuilds the Results table with the given answer columns from all the pivoted results, received as successive chunks,
+        for a new list of questions. Readers see the previous table until the new one is committed. Returns the number of stored rows'''
+
+        if len(answerColumnNames) + 2 > _maxStoreColumns:
+            raise Exception('The results store cannot hold more than ' + str(_maxStoreColumns - 2) + ' questions')
+
+        columnNames:list = ['UserId', 'SurveyId'] + list(answerColumnNames)
+        storedRows:int = 0
+
+        with self._transaction():
+            self._m_conduit.execute('DROP TABLE IF EXISTS ' + ResultsStore._resultsTableName)
+            self._m_conduit.execute('CREATE TABLE ' + ResultsStore._resultsTableName + ' (UserId INTEGER NOT NULL, SurveyId INTEGER NOT NULL' \
+                + ''.join(', ' + columnName + ' INTEGER' for columnName in answerColumnNames) + ', PRIMARY KEY (SurveyId, UserId)) WITHOUT ROWID')
+            self._m_conduit.execute('CREATE INDEX IX_' + ResultsStore._resultsTableName + '_UserId ON ' \
+                + ResultsStore._resultsTableName + ' (UserId, SurveyId)')
+
+            insertQuery:str = 'INSERT INTO ' + ResultsStore._resultsTableName + ' (' + ', '.join(columnNames) + ') VALUES (' \
+                + ','.join('?' * len(columnNames)) + ')'
+            for pivotedDF in pivotedChunks:
+                storedRows += self._writeRows(insertQuery, pivotedDF[columnNames])
+
+            self._saveState(state)
+
+        self._m_columnNames = columnNames
+        return storedRows
+
+
+    def UpdateAll(self: object, pivotedChunks: Iterable[pd.DataFrame], state: dict) -> int:
+        '''Brings the Results table in line with all the pivoted results, received as successive chunks with the columns of the table:
+        rows are upserted only when their answers differ and rows missing from the results are deleted. Returns the number of received rows'''
+
+        receivedRows:int = 0
+
+        with self._transaction():
+            self._m_conduit.execute('CREATE TEMP TABLE IF NOT EXISTS ReceivedPairs (SurveyId INTEGER NOT NULL, UserId INTEGER NOT NULL, ' \
+                + 'PRIMARY KEY (SurveyId, UserId)) WITHOUT ROWID')
+            self._m_conduit.execute('DELETE FROM temp.ReceivedPairs')
+
+            for pivotedDF in pivotedChunks:
+                receivedRows += self._upsertRows(pivotedDF)
+                self._m_conduit.executemany('INSERT INTO temp.ReceivedPairs (SurveyId, UserId) VALUES (?, ?)', \
+                    zip(pivotedDF['SurveyId'].tolist(), pivotedDF['UserId'].tolist()))
+
+            self._m_conduit.execute('DELETE FROM ' + ResultsStore._resultsTableName + ' WHERE NOT EXISTS (SELECT * FROM temp.ReceivedPairs as p ' \
+                + 'WHERE p.SurveyId = ' + ResultsStore._resultsTableName + '.SurveyId AND p.UserId = ' + ResultsStore._resultsTableName + '.UserId)')
+            self._m_conduit.execute('DELETE FROM temp.ReceivedPairs')
+
+            self._saveState(state)
+
+        return receivedRows
+
+
+    def UpdatePairs(self: object, changedSurveyUsersDF: pd.DataFrame, pivotedDF: pd.DataFrame, state: dict) -> None:
+        '''Replaces the rows of the changed (UserId, SurveyId) pairs with their re-pivoted version,
+        the pairs without pivoted row (all their answers deleted) being deleted'''
+
+        with self._transaction():
+            if pivotedDF is not None and len(pivotedDF) > 0:
+                self._upsertRows(pivotedDF)
+                pivotedPairs:set = set(zip(pivotedDF['SurveyId'].tolist(), pivotedDF['UserId'].tolist()))
+            else:
+                pivotedPairs = set()
+
+            self._m_conduit.executemany('DELETE FROM ' + ResultsStore._resultsTableName + ' WHERE SurveyId = ? AND UserId = ?', \
+                [pair for pair in zip(changedSurveyUsersDF['SurveyId'].tolist(), changedSurveyUsersDF['UserId'].tolist()) if pair not in pivotedPairs])
+
+            self._saveState(state)
+
+
+    def _upsertRows(self: object, pivotedDF: pd.DataFrame) -> int:
+        '''Inserts the new rows and updates the existing ones whose answers differ, leaving the identical ones untouched'''
+
+        answerColumnNames:list = self._m_columnNames[2:]
+        #the row value comparison keeps the expression flat whatever the number of questions
+        changedPredicate:str = '(' + ', '.join(ResultsStore._resultsTableName + '.' + columnName for columnName in answerColumnNames) + ') IS NOT (' \
+            + ', '.join('excluded.' + columnName for columnName in answerColumnNames) + ')' if len(answerColumnNames) > 1 else \
+            ''.join(ResultsStore._resultsTableName + '.' + columnName + ' IS NOT excluded.' + columnName for columnName in answerColumnNames)
+
+        upsertQuery:str = 'INSERT INTO ' + ResultsStore._resultsTableName + ' (' + ', '.join(self._m_columnNames) + ') VALUES (' \
+            + ','.join('?' * len(self._m_columnNames)) + ') ON CONFLICT (SurveyId, UserId) DO ' \
+            + ('UPDATE SET ' + ', '.join(columnName + ' = excluded.' + columnName for columnName in answerColumnNames) + ' WHERE ' + changedPredicate \
+               if answerColumnNames else 'NOTHING')
+
+        return self._writeRows(upsertQuery, pivotedDF[self._m_columnNames])
+
+
+    def _writeRows(self: object, writeQuery: str, pivotedDF: pd.DataFrame) -> int:
+        '''Runs the insert or upsert query over the rows of the dataframe, answers going as integers and NaN as NULL'''
+        values:np.ndarray = pivotedDF.to_numpy(dtype=object, copy=True)
+        values[pd.isna(values)] = None
+        for batchStart in range(0, len(values), _writeBatchSize):
+            self._m_conduit.executemany(writeQuery, [tuple(int(value) if value is not None else None for value in row) \
+                for row in values[batchStart:batchStart + _writeBatchSize]])
+        return len(values)
+
+
+    def _saveState(self: object, state: dict) -> None:
+        self._m_conduit.execute("INSERT OR REPLACE INTO StoreState (Name, Value) VALUES ('state', ?)", (json.dumps(state),))
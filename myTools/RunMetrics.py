@@ -0,0 +1,184 @@
+from contextlib import contextmanager
+import datetime
+import json
+import os
+import threading
+import time
+from typing import Iterator
+
+
+
+class RunMetrics:
+    """This class collects the metrics of one refresh run: the wall time of its phases, with the rows, columns, bytes written and
+    generated SQL length reported by them, and the wall time, rows and SQL length of every query executed by a DBConnector it is attached to.
+    Phases can be nested, each one being reported under its path (e.g. view_refresh/view_ddl) with its nested phases included in its time,
+    and a phase entered several times is reported once with the sum of its calls. Queries are attributed to the innermost phase open
+    when they run, including the ones run by worker threads of that phase. The run is saved as a JSON report and as a Prometheus textfile"""
+
+    #queries whose text is kept in the report, the slowest ones
+    _slowestQueryCount: int = 10
+    _slowestQueryTextLength: int = 500
+
+    def __init__(self: object, labels: dict = None):
+        self._m_lock: threading.Lock = threading.Lock()
+        self._m_labels: dict = dict(labels) if labels else {}
+        self._m_startTimestamp: float = time.time()
+        self._m_startTime: float = time.perf_counter()
+        self._m_endTime: float = None
+        self._m_phasePath: list = []
+        self._m_phases: dict = {}
+        self._m_queryTotals: dict = self._newQueryTotals()
+        self._m_queriesByMethod: dict = {}
+        self._m_slowestQueries: list = []
+        self._m_status: str = 'running'
+        self._m_error: str = None
+        self._m_details: dict = {}
+
+
+    @staticmethod
+    def _newQueryTotals() -> dict:
+        return {"count": 0, "failed": 0, "seconds": 0.0, "rows": 0, "sqllength": 0}
+
+
+    @property
+    def CurrentPhase(self: object) -> str:
+        return '/'.join(self._m_phasePath) if self._m_phasePath else None
+
+
+    @contextmanager
+    def Phase(self: object, name: str) -> Iterator[None]:
+        '''Context-managed phase, nested in the phase currently open if any, whose wall time is added to its record when leaving the block'''
+        with self._m_lock:
+            self._m_phasePath.append(str(name))
+            phaseName:str = self.CurrentPhase
+            if phaseName not in self._m_phases:
+                self._m_phases[phaseName] = {"phase": phaseName, "calls": 0, "seconds": 0.0, "rows": None, "columns": None, \
+                                             "byteswritten": None, "sqllength": None, "queries": self._newQueryTotals()}
+        startTime:float = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._m_lock:
+                self._m_phases[phaseName]["calls"] += 1
+                self._m_phases[phaseName]["seconds"] += time.perf_counter() - startTime
+                self._m_phasePath.pop()
+
+
+    def AddPhaseValues(self: object, rows: int = None, columns: int = None, bytesWritten: int = None, sqlLength: int = None) -> None:
+        '''Adds rows, bytes written and generated SQL length to the phase currently open, columns being the widest reported'''
+        with self._m_lock:
+            if not self._m_phasePath:
+                return
+            phaseRecord:dict = self._m_phases[self.CurrentPhase]
+            for key, value in (("rows", rows), ("byteswritten", bytesWritten), ("sqllength", sqlLength)):
+                if value is not None:
+                    phaseRecord[key] = int(value) + (phaseRecord[key] or 0)
+            if columns is not None:
+                phaseRecord["columns"] = max(int(columns), phaseRecord["columns"] or 0)
+
+
+    def RecordQuery(self: object, method: str, query: str, seconds: float, rows: int = None, columns: int = None, isFailed: bool = False) -> None:
+        '''Records one query executed by a DBConnector method: its wall time, rows and columns of the result set (if any) and SQL length'''
+        with self._m_lock:
+            phaseName:str = self.CurrentPhase
+            queryTotals:list = [self._m_queryTotals, self._m_queriesByMethod.setdefault(method, self._newQueryTotals())]
+            if phaseName is not None:
+                queryTotals.append(self._m_phases[phaseName]["queries"])
+
+            for totals in queryTotals:
+                totals["count"] += 1
+                totals["failed"] += int(isFailed)
+                totals["seconds"] += seconds
+                totals["rows"] += int(rows or 0)
+                totals["sqllength"] += len(query)
+
+            self._m_slowestQueries.append({"phase": phaseName, "method": method, "seconds": seconds, "rows": rows, "columns": columns, \
+                                           "failed": isFailed, "sqllength": len(query), "sql": query[:RunMetrics._slowestQueryTextLength]})
+            self._m_slowestQueries.sort(key=lambda queryRecord: queryRecord["seconds"], reverse=True)
+            del self._m_slowestQueries[RunMetrics._slowestQueryCount:]
+
+
+    def SetOutcome(self: object, isSucceeded: bool, error: str = None, **details) -> None:
+        '''Ends the run with its status, the error it failed with and any detail worth reporting (e.g. viewrefreshed)'''
+        with self._m_lock:
+            self._m_endTime = time.perf_counter()
+            self._m_status = 'succeeded' if isSucceeded else 'failed'
+            self._m_error = None if error is None else str(error)
+            self._m_details.update(details)
+
+
+    def ToDict(self: object) -> dict:
+        '''Returns the run report as a JSON serializable dictionary'''
+        with self._m_lock:
+            endTime:float = self._m_endTime if self._m_endTime is not None else time.perf_counter()
+            return {"labels": dict(self._m_labels), \
+                    "started": datetime.datetime.fromtimestamp(self._m_startTimestamp, datetime.timezone.utc).isoformat(), \
+                    "seconds": endTime - self._m_startTime, \
+                    "status": self._m_status, \
+                    "error": self._m_error, \
+                    "details": dict(self._m_details), \
+                    "phases": [dict(phaseRecord, queries=dict(phaseRecord["queries"])) for phaseRecord in self._m_phases.values()], \
+                    "queries": dict(self._m_queryTotals, \
+                                    bymethod={method: dict(totals) for method, totals in self._m_queriesByMethod.items()}, \
+                                    slowest=[dict(queryRecord) for queryRecord in self._m_slowestQueries])}
+
+
+    def SaveJSONReport(self: object, filePath: str) -> None:
+        '''Saves the run report as a JSON file'''
+        _writeFileAtomically(filePath, json.dumps(self.ToDict(), indent=4))
+
+
+    def SavePrometheusTextfile(self: object, filePath: str) -> None:
+        '''Saves the run metrics in the Prometheus text exposition format, as gauges describing the last run,
+        for the textfile collector of the node exporter'''
+
+        report:dict = self.ToDict()
+        runSamples:list = [({}, report["status"] == 'succeeded')]
+
+        #(metric name, help, samples of (extra labels, value)), phases without a value for a metric are left out of it
+        metricFamilies:list = [
+            ("survey_refresh_last_run_timestamp_seconds", "Start time of the last refresh run", [({}, self._m_startTimestamp)]),
+            ("survey_refresh_last_run_success", "Whether the last refresh run succeeded", runSamples),
+            ("survey_refresh_run_seconds", "Wall time of the last refresh run", [({}, report["seconds"])]),
+            ("survey_refresh_queries", "Queries executed by the last refresh run", [({}, report["queries"]["count"])]),
+            ("survey_refresh_failed_queries", "Failed queries of the last refresh run", [({}, report["queries"]["failed"])])]
+
+        for metricName, key, helpText in (("survey_refresh_phase_seconds", "seconds", "Wall time of the phases of the last refresh run"), \
+                                          ("survey_refresh_phase_rows", "rows", "Rows handled by the phases of the last refresh run"), \
+                                          ("survey_refresh_phase_columns", "columns", "Columns handled by the phases of the last refresh run"), \
+                                          ("survey_refresh_phase_bytes_written", "byteswritten", "Bytes written by the phases of the last refresh run"), \
+                                          ("survey_refresh_phase_generated_sql_length", "sqllength", "Length of the SQL generated by the phases of the last refresh run")):
+            metricFamilies.append((metricName, helpText, [({"phase": phaseRecord["phase"]}, phaseRecord[key]) \
+                for phaseRecord in report["phases"] if phaseRecord[key] is not None]))
+
+        for metricName, key, helpText in (("survey_refresh_phase_queries", "count", "Queries executed by the phases of the last refresh run"), \
+                                          ("survey_refresh_phase_query_seconds", "seconds", "Wall time of the queries of the phases of the last refresh run"), \
+                                          ("survey_refresh_phase_query_rows", "rows", "Rows fetched by the queries of the phases of the last refresh run")):
+            metricFamilies.append((metricName, helpText, [({"phase": phaseRecord["phase"]}, phaseRecord["queries"][key]) \
+                for phaseRecord in report["phases"]]))
+
+        lines:list = []
+        for metricName, helpText, samples in metricFamilies:
+            lines.append('# HELP ' + metricName + ' ' + helpText)
+            lines.append('# TYPE ' + metricName + ' gauge')
+            for extraLabels, value in samples:
+                lines.append(metricName + _formatPrometheusLabels({**report["labels"], **extraLabels}) + ' ' + repr(float(value)))
+
+        _writeFileAtomically(filePath, '\n'.join(lines) + '\n')
+
+
+
+def _formatPrometheusLabels(labels: dict) -> str:
+    '''Returns the {name="value",...} label set of a sample, values escaped as the text exposition format requires'''
+    if not labels:
+        return ''
+    return '{' + ','.join(name + '="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' \
+                          for name, value in labels.items()) + '}'
+
+
+def _writeFileAtomically(filePath: str, content: str) -> None:
+    '''Writes the file through a temporary file renamed over it, so that readers (e.g. the node exporter) never see it half written'''
+    temporaryFilePath:str = filePath + '.tmp'
+    with open(temporaryFilePath, 'w') as handle:
+        handle.write(content)
+    os.replace(temporaryFilePath, filePath)
@@ -0,0 +1,111 @@
+import re
+import sqlite3
+import zlib
+
+from myTools import DBConnector as db
+
+
+
+class _ChecksumAggregate:
+    """SQLite aggregate standing for the T-SQL CHECKSUM_AGG: XOR of the checksums of the rows, NULL over no row"""
+
+    def __init__(self: object):
+        self._m_checksum: int = None
+
+    def step(self: object, value: int) -> None:
+        if value is not None:
+            self._m_checksum = value if self._m_checksum is None else self._m_checksum ^ value
+
+    def finalize(self: object) -> int:
+        return self._m_checksum
+
+
+def _binaryChecksum(*values) -> int:
+    '''SQLite function standing for the T-SQL BINARY_CHECKSUM: signed 32 bits checksum of the values of a row'''
+    checksum:int = zlib.crc32(repr(values).encode())
+    return checksum - 2**32 if checksum >= 2**31 else checksum
+
+
+
+class SQLite_DBConnector(db.DBConnector):
+    """This class inherits from the abstract class _DBConnector and implements a connection to a local SQLite database file,
+       so that the whole refresh pipeline can be run and profiled without a SQL Server (see SyntheticSurveyData for test databases).
+       The T-SQL queries of the project are translated by _translateQuery: CREATE OR ALTER VIEW, COUNT_BIG, BINARY_CHECKSUM(*) / CHECKSUM_AGG,
+       DATEDIFF_BIG(MILLISECOND, ..., SYSUTCDATETIME()), the sys.sql_modules view definition lookup and the change tracking version functions (reported as disabled). The [User] quoting is understood by SQLite as is.
+       The features relying on HASHBYTES / FOR JSON, CHANGETABLE or sp_rename (fingerprint change detection, incremental extraction,
+       materialized results table) are not available"""
+
+    #T-SQL constructs without SQLite counterpart
+    _unsupportedConstructs: tuple = ('HASHBYTES', 'FOR JSON', 'CHANGETABLE', 'SP_RENAME', 'STRING_AGG', 'SELECT TOP')
+
+    def __init__(self: object, dbfilepath: str, viewname: str = ""):
+
+        #the database file path takes the place of the database name, there is no server nor authentication
+        #the empty password is never used, it is not obfuscated so that cryptography is not imported
+        super().__init__(dbserver = 'localhost',
+                         dbname = dbfilepath,
+                         dbusername = '',
+                         dbpassword = '',
+                         viewname = viewname,
+                         isPasswordObfuscated = True)
+
+
+
+    def _selectBestDBDriverAvailable(self: object) -> None:
+        '''SQLite is reached through the sqlite3 module of the standard library, no ODBC driver is needed'''
+        self.selectedDriver = 'sqlite3 ' + sqlite3.sqlite_version
+
+
+    def _createConduit(self: object) -> sqlite3.Connection:
+        '''Opens a connection to the database file, usable from the threads of the connection pool and the async connector,
+        with the T-SQL functions the queries of the project need'''
+        conduit:sqlite3.Connection = sqlite3.connect(self.dbName, check_same_thread=False)
+        conduit.create_function('BINARY_CHECKSUM', -1, _binaryChecksum, deterministic=True)
+        conduit.create_aggregate('CHECKSUM_AGG', 1, _ChecksumAggregate)
+        return conduit
+
+
+    def _expandBinaryChecksum(self: object, query: str) -> str:
+        '''Replaces BINARY_CHECKSUM(*) by BINARY_CHECKSUM(<all the columns of the table queried>), SQLite functions not taking *'''
+        fromTable = re.search(r'\bFROM\s+(\[?\w+\]?)', query, flags=re.IGNORECASE)
+        if fromTable is None:
+            raise Exception('BINARY_CHECKSUM(*) needs a FROM table with the SQLite connector')
+        tableInfo:list = self._dbConduit.execute('PRAGMA table_info(' + fromTable.group(1) + ')').fetchall()
+        return re.sub(r'BINARY_CHECKSUM\(\s*\*\s*\)', 'BINARY_CHECKSUM(' + ', '.join('[' + column[1] + ']' for column in tableInfo) + ')', \
+                      query, flags=re.IGNORECASE)
+
+
+    def _translateQuery(self: object, query: str) -> str:
+        '''Rewrites the T-SQL queries of the project into SQLite'''
+
+        upperQuery:str = query.upper()
+        for construct in SQLite_DBConnector._unsupportedConstructs:
+            if construct in upperQuery:
+                raise Exception(construct + ' is not supported by the SQLite connector')
+
+        query = re.sub(r'CREATE\s+OR\s+ALTER\s+VIEW\s+(\S+)\s+AS\b', r'DROP VIEW IF EXISTS \1; CREATE VIEW \1 AS', query, flags=re.IGNORECASE)
+        query = re.sub(r'\bCOUNT_BIG\s*\(', 'COUNT(', query, flags=re.IGNORECASE)
+
+        #ages of the refresh queue events, SQLite keeping the UTC timestamps as text
+        query = re.sub(r'\bDATEDIFF_BIG\s*\(\s*MILLISECOND\s*,\s*(.+?)\s*,\s*SYSUTCDATETIME\s*\(\s*\)\s*\)', \
+                       r"CAST(ROUND((julianday('now') - julianday(\1)) * 86400000) AS INTEGER)", query, flags=re.IGNORECASE)
+
+        #change tracking is reported as not enabled, callers then fall back to full extractions and checksums
+        query = re.sub(r'\bCHANGE_TRACKING_CURRENT_VERSION\s*\(\s*\)', 'NULL', query, flags=re.IGNORECASE)
+        query = re.sub(r'\bCHANGE_TRACKING_MIN_VALID_VERSION\s*\(\s*OBJECT_ID\s*\([^()]*\)\s*\)', 'NULL', query, flags=re.IGNORECASE)
+
+        #view definitions are kept by SQLite in sqlite_master, as the CREATE VIEW statement run
+        query, moduleLookups = re.subn(r'\bsys\.sql_modules\s+as\s+(\w+)\s+WHERE\s+\1\.object_id\s*=\s*OBJECT_ID\s*\(\s*\'([^\']*)\'\s*,\s*\'V\'\s*\)', \
+                                      r"sqlite_master as \1 WHERE \1.type = 'view' AND \1.name = '\2'", query, flags=re.IGNORECASE)
+        if moduleLookups > 0:
+            query = re.sub(r'\b(\w+)\.definition\b', r'\1.sql', query, flags=re.IGNORECASE)
+
+        if re.search(r'BINARY_CHECKSUM\(\s*\*\s*\)', query, flags=re.IGNORECASE):
+            query = self._expandBinaryChecksum(query)
+
+        return query
+
+
+    def _executeStatements(self: object, cursor: sqlite3.Cursor, statements: str) -> None:
+        '''SQLite cursors execute a single statement, translated batches may hold several (e.g. DROP VIEW then CREATE VIEW)'''
+        cursor.executescript(statements)
@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+from myTools import DBConnector as dbc
+from myTools import SurveyPivotEngine as spe
+import myTools.ModuleInstaller as mi
+
+np = mi.deferImport("numpy")
+pd = mi.deferImport("pandas")
+
+
+
+#layout of the .npz results file. The data / indices / indptr / format / shape arrays are the ones of scipy.sparse.save_npz,
+#so that scipy.sparse.load_npz reads the answers matrix straight from the file and ignores the other arrays:
+#   data, indices, indptr    CSR answers matrix, one row per (UserId, SurveyId) and one column per question, storing the provided answers
+#   userids, surveyids       UserId and SurveyId of each row, in (SurveyId, UserId) order
+#   questionids              QuestionId of each column, in the order of the columns of the view
+#   membershipsurveyids      SurveyId of each row of the CSR membership matrix, in the order of the Survey table
+#   membershipindices,       CSR membership matrix, one row per survey, storing the columns of its in-survey questions
+#   membershipindptr
+#
+#a cell stored in the answers matrix is answered, with its Answer_Value, an answer of 0 being stored explicitly.
+#a cell not stored whose question is in the survey of the row is unanswered (-1 in the view), any other cell is outside of the survey (NULL)
+
+
+def _getCSRIndexPointer(rowNumbers: np.ndarray, rowCount: int) -> np.ndarray:
+    '''Returns the CSR index pointer of entries sorted by row number'''
+    indexPointer:np.ndarray = np.zeros(rowCount + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rowNumbers, minlength=rowCount), out=indexPointer[1:])
+    return indexPointer
+
+
+def exportAnswersToSparse(connector: dbc.DBConnector, membershipDF: pd.DataFrame, resultsFilePath: str, chunkSize: int, isCompressed: bool = True) -> int:
+    '''Streams the raw answers from the database in chunks of chunkSize rows and saves them as a sparse user x question matrix in a .npz file,
+    along with the index arrays of its rows and columns and the survey question membership. The file size and the export time only
+    depend on the number of answers, not on the number of questions. Returns the number of exported rows'''
+
+    questionIds:np.ndarray = membershipDF.columns.to_numpy(dtype=np.int64)
+    membershipMatrix:np.ndarray = membershipDF.to_numpy(dtype=bool)
+
+    rowUserIdParts:list = []
+    rowSurveyIdParts:list = []
+    answerRowParts:list = []
+    answerColumnParts:list = []
+    answerValueParts:list = []
+
+    rowCount:int = 0
+    lastPair:tuple = None
+
+    for answersDF in connector.ExecuteQuery_withRSChunks(spe.strRawAnswersQuery, chunkSize):
+
+        #answers of surveys missing from the Survey table are not part of the view
+        surveyPositions:np.ndarray = membershipDF.index.get_indexer(answersDF['SurveyId'])
+        answersDF = answersDF[surveyPositions >= 0]
+        surveyPositions = surveyPositions[surveyPositions >= 0]
+
+        if len(answersDF) == 0:
+            continue
+
+        userIds:np.ndarray = answersDF['UserId'].to_numpy(dtype=np.int64)
+        surveyIds:np.ndarray = answersDF['SurveyId'].to_numpy(dtype=np.int64)
+
+        #rows are sorted, so a new row starts whenever the (SurveyId, UserId) pair changes, the first one possibly continuing the previous chunk
+        isNewRow:np.ndarray = np.ones(len(answersDF), dtype=bool)
+        isNewRow[1:] = (surveyIds[1:] != surveyIds[:-1]) | (userIds[1:] != userIds[:-1])
+        isNewRow[0] = lastPair != (int(surveyIds[0]), int(userIds[0]))
+        rowNumbers:np.ndarray = rowCount - 1 + np.cumsum(isNewRow)
+
+        #only the provided answers of in-survey questions are stored, a NULL Answer_Value being unanswered as in the view
+        questionPositions:np.ndarray = membershipDF.columns.get_indexer(answersDF['QuestionId'])
+        answerValues:np.ndarray = answersDF['Answer_Value'].to_numpy(dtype=np.float64, na_value=np.nan)
+        isAnswerKept:np.ndarray = (questionPositions >= 0) & ~np.isnan(answerValues)
+        isAnswerKept[isAnswerKept] = membershipMatrix[surveyPositions[isAnswerKept], questionPositions[isAnswerKept]]
+
+        rowUserIdParts.append(userIds[isNewRow])
+        rowSurveyIdParts.append(surveyIds[isNewRow])
+        answerRowParts.append(rowNumbers[isAnswerKept])
+        answerColumnParts.append(questionPositions[isAnswerKept])
+        answerValueParts.append(answerValues[isAnswerKept].astype(np.int32))
+
+        rowCount = int(rowNumbers[-1]) + 1
+        lastPair = (int(surveyIds[-1]), int(userIds[-1]))
+
+    answerRows:np.ndarray = np.concatenate(answerRowParts) if answerRowParts else np.empty(0, dtype=np.int64)
+    answerColumns:np.ndarray = np.concatenate(answerColumnParts) if answerColumnParts else np.empty(0, dtype=np.int64)
+    answerValues:np.ndarray = np.concatenate(answerValueParts) if answerValueParts else np.empty(0, dtype=np.int32)
+
+    #entries sorted by row, then by column, as CSR expects
+    entryOrder:np.ndarray = np.lexsort((answerColumns, answerRows))
+
+    membershipRows, membershipColumns = np.nonzero(membershipMatrix)
+
+    saveArrays = np.savez_compressed if isCompressed else np.savez
+    with open(resultsFilePath, 'wb') as resultsFile:
+        saveArrays(resultsFile, \
+            data = answerValues[entryOrder], \
+            indices = answerColumns[entryOrder].astype(np.int32), \
+            indptr = _getCSRIndexPointer(answerRows, rowCount), \
+            format = np.array('csr'.encode('ascii')), \
+            shape = np.array([rowCount, len(questionIds)], dtype=np.int64), \
+            userids = np.concatenate(rowUserIdParts) if rowUserIdParts else np.empty(0, dtype=np.int64), \
+            surveyids = np.concatenate(rowSurveyIdParts) if rowSurveyIdParts else np.empty(0, dtype=np.int64), \
+            questionids = questionIds, \
+            membershipsurveyids = membershipDF.index.to_numpy(dtype=np.int64), \
+            membershipindices = membershipColumns.astype(np.int32), \
+            membershipindptr = _getCSRIndexPointer(membershipRows, len(membershipDF.index)))
+
+    return rowCount
+
+
+def loadSparseResults(resultsFilePath: str) -> dict:
+    '''Loads a .npz results file as a dictionary of its arrays, with the answers and membership matrices as scipy CSR matrices
+    under "answers" and "membership" when scipy is installed'''
+
+    with np.load(resultsFilePath, allow_pickle=False) as loadedArrays:
+        sparseResults:dict = {arrayName: loadedArrays[arrayName] for arrayName in loadedArrays.files}
+
+    try:
+        import scipy.sparse as sps
+    except ImportError:
+        return sparseResults
+
+    sparseResults["answers"] = sps.csr_matrix((sparseResults["data"], sparseResults["indices"], sparseResults["indptr"]), \
+        shape=tuple(sparseResults["shape"]))
+    sparseResults["membership"] = sps.csr_matrix((np.ones(len(sparseResults["membershipindices"]), dtype=bool), \
+        sparseResults["membershipindices"], sparseResults["membershipindptr"]), \
+        shape=(len(sparseResults["membershipsurveyids"]), len(sparseResults["questionids"])))
+
+    return sparseResults
+
+
+def sparseResultsToDataFrame(sparseResults: dict) -> pd.DataFrame:
+    '''Returns the pivoted results held by loaded sparse results as the dense dataframe the view would give,
+    -1 for unanswered in-survey questions and NULL for questions outside of the survey. Meant for small slices and checks'''
+
+    rowCount, questionCount = (int(size) for size in sparseResults["shape"])
+    indexPointer:np.ndarray = sparseResults["indptr"]
+    membershipIndexPointer:np.ndarray = sparseResults["membershipindptr"]
+
+    #-1 for every in-survey question of the survey of each row, NULL for the others
+    membershipMatrix:np.ndarray = np.zeros((len(sparseResults["membershipsurveyids"]), questionCount), dtype=bool)
+    membershipMatrix[np.repeat(np.arange(len(membershipIndexPointer) - 1), np.diff(membershipIndexPointer)), sparseResults["membershipindices"]] = True
+    surveyPositions:np.ndarray = pd.Index(sparseResults["membershipsurveyids"]).get_indexer(sparseResults["surveyids"])
+
+    pivotedValues:np.ndarray = np.full((rowCount, questionCount), np.nan)
+    pivotedValues[membershipMatrix[surveyPositions]] = -1
+    pivotedValues[np.repeat(np.arange(rowCount), np.diff(indexPointer)), sparseResults["indices"]] = sparseResults["data"]
+
+    pivotedDF:pd.DataFrame = pd.DataFrame(pivotedValues, columns=['ANS_Q' + str(question_ID) for question_ID in sparseResults["questionids"]])
+    pivotedDF.insert(0, 'SurveyId', sparseResults["surveyids"])
+    pivotedDF.insert(0, 'UserId', sparseResults["userids"])
+
+    return pivotedDF
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from typing import Iterator
+
+from myTools import CSVExport as csx
+from myTools import DBConnector as dbc
+import myTools.ModuleInstaller as mi
+
+np = mi.deferImport("numpy")
+pd = mi.deferImport("pandas")
+
+
+
+#raw answers, ordered so that all the rows of one (SurveyId, UserId) pair are contiguous in the stream
+strRawAnswersQuery: str = """
+			SELECT
+				a.UserId
+				, a.SurveyId
+				, a.QuestionId
+				, a.Answer_Value
+			FROM
+				Answer as a
+			WHERE EXISTS
+			(
+				SELECT *
+				FROM [User] as u
+				WHERE u.UserId = a.UserId
+			)
+			ORDER BY a.SurveyId, a.UserId
+	"""
+
+
+def getAnswerColumnNames(membershipDF: pd.DataFrame) -> list:
+    '''Returns the pivoted answer column names (ANS_Q<QUESTION_ID>) in the order of the membership matrix columns'''
+    return ['ANS_Q' + str(question_ID) for question_ID in membershipDF.columns]
+
+
+def getNullAnswerColumnNames(connector: dbc.DBConnector, membershipDF: pd.DataFrame) -> list:
+    '''Returns the answer columns holding NULL in some row of the pivoted results: the questions outside of at least one survey
+    having rows, that is answers of users of the User table. One index seek per survey finds these surveys'''
+
+    answeredSurveysQuery:str = """
+			SELECT
+				s.SurveyId
+			FROM
+				Survey as s
+			WHERE EXISTS
+			(
+				SELECT *
+				FROM Answer as a
+				WHERE a.SurveyId = s.SurveyId
+				AND EXISTS
+				(
+					SELECT *
+					FROM [User] as u
+					WHERE u.UserId = a.UserId
+				)
+			)
+	"""
+
+    answeredSurveyIds:list = list(connector.ExecuteQuery_withRS(answeredSurveysQuery)['SurveyId'])
+    isQuestionInAllSurveys:np.ndarray = membershipDF.loc[membershipDF.index.isin(answeredSurveyIds)].to_numpy(dtype=bool).all(axis=0)
+
+    return [columnName for columnName, is_question_in_all_surveys in zip(getAnswerColumnNames(membershipDF), isQuestionInAllSurveys) \
+            if not is_question_in_all_surveys]
+
+
+def pivotAnswerChunk(answersDF: pd.DataFrame, membershipDF: pd.DataFrame, rowOffset: int = 0) -> pd.DataFrame:
+    '''Pivots raw (UserId, SurveyId, QuestionId, Answer_Value) rows sorted by SurveyId, UserId into one row per (UserId, SurveyId).
+    In-survey questions without an answer are put to -1 and questions outside of the survey to NULL, as in the view.
+    Answer columns holding no NULL in the chunk are int64, the others float64 with NaN for NULL, as pd.read_sql types them.
+    The returned dataframe is indexed from rowOffset so that successive chunks can be appended to the same CSV file'''
+
+    answerColumnNames:list = getAnswerColumnNames(membershipDF)
+    membershipMatrix:np.ndarray = membershipDF.to_numpy(dtype=bool)
+
+    #answers of surveys missing from the Survey table are not part of the view
+    surveyPositions:np.ndarray = membershipDF.index.get_indexer(answersDF['SurveyId'])
+    answersDF = answersDF[surveyPositions >= 0]
+    surveyPositions = surveyPositions[surveyPositions >= 0]
+
+    if len(answersDF) == 0:
+        emptyDF:pd.DataFrame = pd.DataFrame({'UserId': np.empty(0, dtype=np.int64), 'SurveyId': np.empty(0, dtype=np.int64)})
+        for columnName in answerColumnNames:
+            emptyDF[columnName] = np.empty(0, dtype=np.int64)
+        return emptyDF
+
+    userIds:np.ndarray = answersDF['UserId'].to_numpy(dtype=np.int64)
+    surveyIds:np.ndarray = answersDF['SurveyId'].to_numpy(dtype=np.int64)
+
+    #rows are sorted, so a new pivoted row starts whenever the (SurveyId, UserId) pair changes
+    isNewRow:np.ndarray = np.ones(len(answersDF), dtype=bool)
+    isNewRow[1:] = (surveyIds[1:] != surveyIds[:-1]) | (userIds[1:] != userIds[:-1])
+    rowNumbers:np.ndarray = np.cumsum(isNewRow) - 1
+
+    #-1 for every in-survey question, NULL for the others
+    pivotedValues:np.ndarray = np.full((int(rowNumbers[-1]) + 1, len(answerColumnNames)), np.nan)
+    pivotedValues[membershipMatrix[surveyPositions[isNewRow]]] = -1
+
+    #scatter the provided answers of in-survey questions over the -1 defaults
+    questionPositions:np.ndarray = membershipDF.columns.get_indexer(answersDF['QuestionId'])
+    answerValues:np.ndarray = answersDF['Answer_Value'].to_numpy(dtype=np.float64, na_value=np.nan)
+    isAnswerKept:np.ndarray = (questionPositions >= 0) & ~np.isnan(answerValues)
+    isAnswerKept[isAnswerKept] = membershipMatrix[surveyPositions[isAnswerKept], questionPositions[isAnswerKept]]
+    pivotedValues[rowNumbers[isAnswerKept], questionPositions[isAnswerKept]] = answerValues[isAnswerKept]
+
+    pivotedDF:pd.DataFrame = pd.DataFrame(pivotedValues, columns=answerColumnNames)
+    isNullColumn:np.ndarray = np.isnan(pivotedValues).any(axis=0)
+    pivotedDF = pivotedDF.astype({columnName: np.int64 for columnName, is_null_column in zip(answerColumnNames, isNullColumn) if not is_null_column})
+    pivotedDF.insert(0, 'SurveyId', surveyIds[isNewRow])
+    pivotedDF.insert(0, 'UserId', userIds[isNewRow])
+    pivotedDF.index = pd.RangeIndex(rowOffset, rowOffset + len(pivotedDF))
+
+    return pivotedDF
+
+
+def iterPivotedAnswerChunks(connector: dbc.DBConnector, membershipDF: pd.DataFrame, chunkSize: int) -> Iterator[pd.DataFrame]:
+    '''Streams the raw answers from the database in chunks of chunkSize rows and yields them pivoted, chunk by chunk.
+    The rows of the last (SurveyId, UserId) pair of a chunk are held back until the next chunk, since they may continue there'''
+
+    pendingAnswersDF:pd.DataFrame = None
+    rowOffset:int = 0
+
+    for answersDF in connector.ExecuteQuery_withRSChunks(strRawAnswersQuery, chunkSize):
+
+        if pendingAnswersDF is not None:
+            answersDF = pd.concat([pendingAnswersDF, answersDF], ignore_index=True)
+
+        if len(answersDF) == 0:
+            continue
+
+        lastSurveyId = answersDF['SurveyId'].iat[-1]
+        lastUserId = answersDF['UserId'].iat[-1]
+        isPending:pd.Series = (answersDF['SurveyId'] == lastSurveyId) & (answersDF['UserId'] == lastUserId)
+
+        pendingAnswersDF = answersDF[isPending]
+        pivotedDF:pd.DataFrame = pivotAnswerChunk(answersDF[~isPending], membershipDF, rowOffset)
+        rowOffset += len(pivotedDF)
+
+        if len(pivotedDF) > 0:
+            yield pivotedDF
+
+    if pendingAnswersDF is not None and len(pendingAnswersDF) > 0:
+        yield pivotAnswerChunk(pendingAnswersDF, membershipDF, rowOffset)
+
+
+def exportPivotedAnswersToCSV(connector: dbc.DBConnector, membershipDF: pd.DataFrame, resultsFilePath: str, chunkSize: int) -> int:
+    '''Pivots the answers on the client side chunk by chunk and appends each chunk to the results CSV file,
+    in the same layout as the export of the view: the answer columns holding NULL in some row are written as floats in every chunk,
+    the others as integers. Returns the number of exported rows'''
+
+    with csx.CSVBatchWriter(resultsFilePath, getNullAnswerColumnNames(connector, membershipDF)) as resultsWriter:
+
+        for pivotedDF in iterPivotedAnswerChunks(connector, membershipDF, chunkSize):
+            resultsWriter.Write(pivotedDF)
+
+        #an empty result set still gets its header line
+        if resultsWriter.WrittenRows == 0:
+            resultsWriter.Write(pivotAnswerChunk(pd.DataFrame(columns=['UserId', 'SurveyId', 'QuestionId', 'Answer_Value']), membershipDF))
+
+        return resultsWriter.WrittenRows
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+from typing import Iterable, Iterator
+
+from myTools import CSVExport as csx
+import myTools.ModuleInstaller as mi
+
+np = mi.deferImport("numpy")
+pd = mi.deferImport("pandas")
+
+
+
+class SurveyResultsMatrix:
+    """This class holds the pivoted survey answers in a compact form: integer UserId/SurveyId vectors,
+    a matrix of answer codes stored in the smallest integer type able to hold them (-1 standing for a missing answer)
+    and a bit-packed validity mask telling which cells are NULL because the question is not in the survey.
+    It converts to and from the dataframe shape of the view (UserId, SurveyId, ANS_Q<QUESTION_ID>...), typed as pd.read_sql types
+    the whole view: int64, or float64 with NaN for the answer columns holding a NULL in some row"""
+
+    def __init__(self: object, userIds: np.ndarray, surveyIds: np.ndarray, questionIds: np.ndarray, \
+                 answerCodes: np.ndarray, packedValidityMask: np.ndarray):
+
+        if answerCodes.shape != (len(userIds), len(questionIds)) or len(surveyIds) != len(userIds):
+            raise Exception('Inconsistent SurveyResultsMatrix dimensions')
+
+        self._m_userIds: np.ndarray = userIds
+        self._m_surveyIds: np.ndarray = surveyIds
+        self._m_questionIds: np.ndarray = questionIds
+        self._m_answerCodes: np.ndarray = answerCodes
+        self._m_packedValidityMask: np.ndarray = packedValidityMask
+        #computed once, the typing of every converted chunk depends on the whole results
+        self._m_columnValidity: np.ndarray = None
+
+
+    @staticmethod
+    def _smallestIntegerType(minValue: int, maxValue: int) -> type:
+        '''Returns the smallest signed integer type holding both bounds'''
+        for integerType in (np.int8, np.int16, np.int32):
+            if np.iinfo(integerType).min <= minValue and maxValue <= np.iinfo(integerType).max:
+                return integerType
+        return np.int64
+
+
+    @classmethod
+    def _compactIdentifiers(cls: type, identifiers: np.ndarray) -> np.ndarray:
+        '''Returns the identifiers as int32 when they fit, int64 otherwise'''
+        if len(identifiers) == 0:
+            return identifiers.astype(np.int32)
+        return identifiers.astype(np.int32 if cls._smallestIntegerType(int(identifiers.min()), int(identifiers.max())) != np.int64 else np.int64)
+
+
+    @classmethod
+    def fromDataFrame(cls: type, resultsDF: pd.DataFrame) -> 'SurveyResultsMatrix':
+        '''Builds the compact representation from a dataframe shaped like the view, NaN standing for NULL'''
+
+        answerColumnNames:list = [columnName for columnName in resultsDF.columns if columnName.startswith('ANS_Q')]
+        questionIds:np.ndarray = np.array([int(columnName[len('ANS_Q'):]) for columnName in answerColumnNames], dtype=np.int64)
+
+        answerValues:np.ndarray = resultsDF[answerColumnNames].to_numpy(dtype=np.float64, na_value=np.nan)
+        validityMask:np.ndarray = ~np.isnan(answerValues)
+
+        if not np.array_equal(answerValues[validityMask], np.round(answerValues[validityMask])):
+            raise Exception('Answer values must be integers to be stored as answer codes')
+
+        minValue:int = int(answerValues[validityMask].min()) if validityMask.any() else -1
+        maxValue:int = int(answerValues[validityMask].max()) if validityMask.any() else -1
+        answerCodes:np.ndarray = np.where(validityMask, answerValues, -1).astype(cls._smallestIntegerType(minValue, maxValue))
+
+        return cls(cls._compactIdentifiers(resultsDF['UserId'].to_numpy(dtype=np.int64)), \
+                   cls._compactIdentifiers(resultsDF['SurveyId'].to_numpy(dtype=np.int64)), \
+                   questionIds, answerCodes, np.packbits(validityMask, axis=1))
+
+
+    @classmethod
+    def fromColumns(cls: type, resultColumns: dict) -> 'SurveyResultsMatrix':
+        '''Builds the compact representation from the (buffer, validity mask) columns of the view
+        returned by DBConnector.ExecuteQuery_withRSColumns, without going through float64'''
+
+        answerColumnNames:list = [columnName for columnName in resultColumns if columnName.startswith('ANS_Q')]
+        questionIds:np.ndarray = np.array([int(columnName[len('ANS_Q'):]) for columnName in answerColumnNames], dtype=np.int64)
+        rowCount:int = len(resultColumns['UserId'][0])
+
+        for columnName in answerColumnNames:
+            if resultColumns[columnName][0].dtype.kind not in 'iO':
+                raise Exception('Answer values must be integers to be stored as answer codes')
+
+        #a column only holding NULLs has no integer type, its codes are all -1
+        answerCodeColumns:list = [np.full(rowCount, -1, dtype=np.int8) if columnBuffer.dtype == object else columnBuffer \
+                                  for columnBuffer, validityMask in (resultColumns[columnName] for columnName in answerColumnNames)]
+        validityMask:np.ndarray = np.empty((rowCount, len(answerColumnNames)), dtype=bool)
+        for position, columnName in enumerate(answerColumnNames):
+            columnBuffer, columnValidityMask = resultColumns[columnName]
+            validityMask[:, position] = columnBuffer.dtype != object if columnValidityMask is None else columnValidityMask
+
+        answerCodesType = np.result_type(np.int8, *[answerCodeColumn.dtype for answerCodeColumn in answerCodeColumns])
+        answerCodes:np.ndarray = np.empty((rowCount, len(answerColumnNames)), dtype=answerCodesType)
+        for position, answerCodeColumn in enumerate(answerCodeColumns):
+            answerCodes[:, position] = answerCodeColumn
+        answerCodes[~validityMask] = -1
+
+        return cls(cls._compactIdentifiers(resultColumns['UserId'][0].astype(np.int64)), \
+                   cls._compactIdentifiers(resultColumns['SurveyId'][0].astype(np.int64)), \
+                   questionIds, answerCodes, np.packbits(validityMask, axis=1))
+
+
+    @classmethod
+    def fromDataFrameChunks(cls: type, resultsChunks: Iterable[pd.DataFrame]) -> 'SurveyResultsMatrix':
+        '''Builds the compact representation from successive dataframe chunks (e.g. the partitions of the view),
+        only one chunk being held as a dataframe at a time'''
+        return cls.concatenate([cls.fromDataFrame(resultsDF) for resultsDF in resultsChunks])
+
+
+    @classmethod
+    def concatenate(cls: type, compactChunks: list) -> 'SurveyResultsMatrix':
+        '''Returns the rows of the given results matrices one after the other, all with the same answer columns'''
+
+        if len(compactChunks) == 0:
+            return cls(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), \
+                       np.empty((0, 0), dtype=np.int8), np.empty((0, 0), dtype=np.uint8))
+
+        for compactChunk in compactChunks[1:]:
+            if not np.array_equal(compactChunk.questionIds, compactChunks[0].questionIds):
+                raise Exception('Chunks with different answer columns cannot be concatenated')
+
+        answerCodesType = np.result_type(*[compactChunk._m_answerCodes.dtype for compactChunk in compactChunks])
+
+        return cls(np.concatenate([compactChunk._m_userIds.astype(np.int64) for compactChunk in compactChunks]), \
+                   np.concatenate([compactChunk._m_surveyIds.astype(np.int64) for compactChunk in compactChunks]), \
+                   compactChunks[0].questionIds, \
+                   np.concatenate([compactChunk._m_answerCodes.astype(answerCodesType) for compactChunk in compactChunks]), \
+                   np.concatenate([compactChunk._m_packedValidityMask for compactChunk in compactChunks])).compacted()
+
+
+
+    #series of properties to have "getters" wherever appropriate
+
+    @property
+    def userIds(self: object) -> np.ndarray:
+        return self._m_userIds
+
+    @property
+    def surveyIds(self: object) -> np.ndarray:
+        return self._m_surveyIds
+
+    @property
+    def questionIds(self: object) -> np.ndarray:
+        return self._m_questionIds
+
+    @property
+    def answerCodes(self: object) -> np.ndarray:
+        '''Answer codes, -1 for a missing answer, meaningless where the validity mask is False'''
+        return self._m_answerCodes
+
+    @property
+    def validityMask(self: object) -> np.ndarray:
+        '''Unpacked boolean mask, False where the question is not in the survey (NULL in the view)'''
+        return np.unpackbits(self._m_packedValidityMask, axis=1, count=len(self._m_questionIds)).astype(bool)
+
+    @property
+    def nbytes(self: object) -> int:
+        return self._m_userIds.nbytes + self._m_surveyIds.nbytes + self._m_questionIds.nbytes \
+            + self._m_answerCodes.nbytes + self._m_packedValidityMask.nbytes
+
+    def __len__(self: object) -> int:
+        return len(self._m_userIds)
+
+
+
+    def compacted(self: object) -> 'SurveyResultsMatrix':
+        '''Returns the same results with the identifiers narrowed to int32 whenever they fit'''
+        return SurveyResultsMatrix(SurveyResultsMatrix._compactIdentifiers(self._m_userIds), \
+                                   SurveyResultsMatrix._compactIdentifiers(self._m_surveyIds), \
+                                   self._m_questionIds, self._m_answerCodes, self._m_packedValidityMask)
+
+
+    def getAnswerColumnNames(self: object) -> list:
+        '''Returns the ANS_Q<QUESTION_ID> column names in the order of the answer codes'''
+        return ['ANS_Q' + str(question_ID) for question_ID in self._m_questionIds]
+
+
+    def _getColumnValidity(self: object) -> np.ndarray:
+        '''Returns for each answer column whether it holds no NULL in the whole results, from the packed mask'''
+        if self._m_columnValidity is None:
+            self._m_columnValidity = np.unpackbits(np.bitwise_and.reduce(self._m_packedValidityMask, axis=0), \
+                                                   count=len(self._m_questionIds)).astype(bool)
+        return self._m_columnValidity
+
+
+    def getNullAnswerColumnNames(self: object) -> list:
+        '''Returns the answer column names holding a NULL in some row, the ones typed as float64 (see CSVExport.CSVBatchWriter)'''
+        return [columnName for columnName, isValid in zip(self.getAnswerColumnNames(), self._getColumnValidity()) if not isValid]
+
+
+    def takeRows(self: object, rowPositions: np.ndarray) -> 'SurveyResultsMatrix':
+        '''Returns the rows at the given positions (integer positions or boolean mask), in that order'''
+        return SurveyResultsMatrix(self._m_userIds[rowPositions], self._m_surveyIds[rowPositions], self._m_questionIds, \
+                                   self._m_answerCodes[rowPositions], self._m_packedValidityMask[rowPositions])
+
+
+    def toDataFrame(self: object, rowStart: int = 0, rowStop: int = None) -> pd.DataFrame:
+        '''Converts the rows [rowStart, rowStop) back to the dataframe shape of the view, indexed by their row number.
+        The answer columns are typed on the whole results, not on the rows converted, so that successive chunks are typed alike:
+        int64 for the columns without NULL, float64 with NaN for the others'''
+
+        rowStop = len(self) if rowStop is None else min(rowStop, len(self))
+
+        validityMask:np.ndarray = np.unpackbits(self._m_packedValidityMask[rowStart:rowStop], axis=1, \
+                                                count=len(self._m_questionIds)).astype(bool)
+        answerCodes:np.ndarray = self._m_answerCodes[rowStart:rowStop]
+
+        columns:dict = {'UserId': self._m_userIds[rowStart:rowStop].astype(np.int64), \
+                        'SurveyId': self._m_surveyIds[rowStart:rowStop].astype(np.int64)}
+        for position, (columnName, isValid) in enumerate(zip(self.getAnswerColumnNames(), self._getColumnValidity())):
+            columns[columnName] = answerCodes[:, position].astype(np.int64) if isValid \
+                else np.where(validityMask[:, position], answerCodes[:, position], np.nan)
+
+        return pd.DataFrame(columns, index=pd.RangeIndex(rowStart, rowStop), copy=False)
+
+
+    def iterDataFrameChunks(self: object, chunkSize: int) -> Iterator[pd.DataFrame]:
+        '''Yields the rows converted back to the dataframe shape of the view, chunkSize rows at a time, e.g. for a bounded-memory export'''
+        for rowStart in range(0, len(self), chunkSize):
+            yield self.toDataFrame(rowStart, rowStart + chunkSize)
+
+
+    def toCSV(self: object, filePath: str, chunkSize: int, nullColumnNames: list = None) -> int:
+        '''Writes the rows to a CSV file in the layout pandas gives for the whole view, converted back to dataframes chunkSize rows at a time
+        so that the results are never held as a whole dataframe. nullColumnNames are written as floats even without NULL
+        (e.g. columns known to hold NULLs in the results the rows belong to). Returns the number of written rows'''
+
+        with csx.CSVBatchWriter(filePath, self.getNullAnswerColumnNames() + list(nullColumnNames or [])) as resultsWriter:
+            for resultsDF in self.iterDataFrameChunks(chunkSize):
+                resultsWriter.Write(resultsDF)
+            #the header line is written even when there is no row
+            if len(self) == 0:
+                resultsWriter.Write(self.toDataFrame())
+
+        return len(self)
+
+
+    def equals(self: object, other: 'SurveyResultsMatrix') -> bool:
+        '''Compares two results matrices on their identifiers, answer codes and validity'''
+
+        if not (np.array_equal(self._m_userIds, other._m_userIds) \
+                and np.array_equal(self._m_surveyIds, other._m_surveyIds) \
+                and np.array_equal(self._m_questionIds, other._m_questionIds) \
+                and np.array_equal(self._m_packedValidityMask, other._m_packedValidityMask)):
+            return False
+
+        #NULL cells are stored as -1 by fromDataFrame, so plain comparison of the codes is enough
+        return np.array_equal(self._m_answerCodes, other._m_answerCodes)
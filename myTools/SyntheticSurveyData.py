@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from typing import Iterator
+
+import myTools.ModuleInstaller as mi
+
+np = mi.deferImport("numpy")
+pd = mi.deferImport("pandas")
+
+
+
+#same tables and keys as the SQL Server database, restricted to the columns the refresh pipeline reads
+strSurveySchemaScript: str = """
+			CREATE TABLE Survey
+			(
+				SurveyId INTEGER NOT NULL PRIMARY KEY
+			);
+
+			CREATE TABLE Question
+			(
+				QuestionId INTEGER NOT NULL PRIMARY KEY
+			);
+
+			CREATE TABLE SurveyStructure
+			(
+				SurveyId INTEGER NOT NULL REFERENCES Survey (SurveyId)
+				, QuestionId INTEGER NOT NULL REFERENCES Question (QuestionId)
+				, OrdinalValue INTEGER NOT NULL
+				, PRIMARY KEY (SurveyId, QuestionId)
+			);
+
+			CREATE TABLE [User]
+			(
+				UserId INTEGER NOT NULL PRIMARY KEY
+			);
+
+			CREATE TABLE Answer
+			(
+				QuestionId INTEGER NOT NULL REFERENCES Question (QuestionId)
+				, SurveyId INTEGER NOT NULL REFERENCES Survey (SurveyId)
+				, UserId INTEGER NOT NULL REFERENCES [User] (UserId)
+				, Answer_Value INTEGER NULL
+				, PRIMARY KEY (QuestionId, SurveyId, UserId)
+			);
+	"""
+
+#created once the answers are loaded, faster than maintaining them row by row
+strSurveyIndexesScript: str = """
+			CREATE INDEX IX_Answer_SurveyId_UserId ON Answer (SurveyId, UserId, QuestionId);
+			ANALYZE;
+	"""
+
+#SQLite counterpart of table-dbo.SurveyViewRefreshQueue.sql and trigger-dbo.trg_enqueueSurveyViewRefresh.sql, for --changedetection queue.
+#SQLite triggers fire for each row, so a statement appends one event per row changed instead of one per statement
+strRefreshQueueScript: str = """
+			CREATE TABLE IF NOT EXISTS SurveyViewRefreshQueue
+			(
+				EventId INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT
+				, EnqueuedAt TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%f', 'now'))
+				, AffectedRows INTEGER NOT NULL
+			);
+
+			CREATE TRIGGER IF NOT EXISTS trg_enqueueSurveyViewRefresh_Insert AFTER INSERT ON SurveyStructure
+			BEGIN
+				INSERT INTO SurveyViewRefreshQueue (AffectedRows) VALUES (1);
+			END;
+
+			CREATE TRIGGER IF NOT EXISTS trg_enqueueSurveyViewRefresh_Delete AFTER DELETE ON SurveyStructure
+			BEGIN
+				INSERT INTO SurveyViewRefreshQueue (AffectedRows) VALUES (1);
+			END;
+
+			CREATE TRIGGER IF NOT EXISTS trg_enqueueSurveyViewRefresh_Update AFTER UPDATE ON SurveyStructure
+			BEGIN
+				INSERT INTO SurveyViewRefreshQueue (AffectedRows) VALUES (2);
+			END;
+	"""
+
+
+def createSurveyDatabase(databaseFilePath: str) -> sqlite3.Connection:
+    '''Creates an empty survey database file, replacing any previous one, and returns a connection to it set up for bulk loading'''
+
+    if os.path.exists(databaseFilePath):
+        os.remove(databaseFilePath)
+
+    conduit:sqlite3.Connection = sqlite3.connect(databaseFilePath)
+    #the file is rebuilt from scratch on failure, no need for a journal
+    conduit.execute('PRAGMA journal_mode = OFF')
+    conduit.execute('PRAGMA synchronous = OFF')
+    conduit.executescript(strSurveySchemaScript)
+
+    return conduit
+
+
+def insertRows(conduit: sqlite3.Connection, tableName: str, columns: dict, batchSize: int = 500000) -> None:
+    '''Inserts the given column arrays into the table, batchSize rows at a time'''
+
+    columnNames:list = list(columns.keys())
+    rowCount:int = len(columns[columnNames[0]]) if columnNames else 0
+    insertQuery:str = 'INSERT INTO ' + tableName + ' (' + ', '.join(columnNames) + ') VALUES (' + ', '.join('?' * len(columnNames)) + ')'
+
+    for rowStart in range(0, rowCount, batchSize):
+        #tolist turns the NumPy integers into Python ones, which sqlite3 binds
+        batchColumns:list = [np.asarray(columns[columnName][rowStart:rowStart + batchSize]).tolist() for columnName in columnNames]
+        conduit.executemany(insertQuery, zip(*batchColumns))
+
+
+def iterSyntheticAnswers(rng: np.random.Generator, userIds: np.ndarray, membership: dict, responseRate: float, \
+                         answerRate: float, maxAnswerValue: int) -> Iterator[dict]:
+    '''Yields the answers of one survey at a time as (QuestionId, SurveyId, UserId, Answer_Value) column arrays.
+    Each user takes part in a survey with probability responseRate and then answers each of its questions with probability answerRate,
+    at least one of them, so that every participation shows up in the view'''
+
+    for survey_ID, questionIds in membership.items():
+
+        respondentIds:np.ndarray = userIds[rng.random(len(userIds)) < responseRate]
+        isAnswered:np.ndarray = rng.random((len(respondentIds), len(questionIds))) < answerRate
+
+        #participations without any answer get one, on a random question of the survey
+        isSilent:np.ndarray = ~isAnswered.any(axis=1)
+        isAnswered[np.flatnonzero(isSilent), rng.integers(0, len(questionIds), int(isSilent.sum()))] = True
+
+        respondentPositions, questionPositions = np.nonzero(isAnswered)
+
+        yield {"QuestionId": np.asarray(questionIds)[questionPositions], \
+               "SurveyId": np.full(len(respondentPositions), survey_ID), \
+               "UserId": respondentIds[respondentPositions], \
+               "Answer_Value": rng.integers(0, maxAnswerValue + 1, len(respondentPositions))}
+
+
+def generateSurveyDatabase(databaseFilePath: str, surveyCount: int = 3, questionCount: int = 4, questionsPerSurvey: int = 2, \
+                           userCount: int = 5000, responseRate: float = 0.34, answerRate: float = 0.6, \
+                           maxAnswerValue: int = 9, seed: int = 0) -> int:
+    '''Creates a SQLite survey database filled with random data: surveyCount surveys of questionsPerSurvey questions each,
+    drawn among questionCount questions, answered by userCount users. The defaults give about the size of the sample
+    extracted-vw_AllSurveyData.csv. The same seed always gives the same database. Returns the number of answers'''
+
+    if questionsPerSurvey > questionCount:
+        raise Exception('A survey cannot have more questions than there are questions')
+
+    rng:np.random.Generator = np.random.default_rng(seed)
+    conduit:sqlite3.Connection = createSurveyDatabase(databaseFilePath)
+    answerCount:int = 0
+
+    try:
+        surveyIds:np.ndarray = np.arange(1, surveyCount + 1)
+        questionIds:np.ndarray = np.arange(1, questionCount + 1)
+        userIds:np.ndarray = np.arange(1, userCount + 1)
+
+        #questions of each survey, in increasing QuestionId order
+        membership:dict = {int(survey_ID): np.sort(rng.choice(questionIds, questionsPerSurvey, replace=False)) for survey_ID in surveyIds}
+
+        insertRows(conduit, 'Survey', {"SurveyId": surveyIds})
+        insertRows(conduit, 'Question', {"QuestionId": questionIds})
+        insertRows(conduit, '[User]', {"UserId": userIds})
+        insertRows(conduit, 'SurveyStructure', \
+            {"SurveyId": np.repeat(surveyIds, questionsPerSurvey), \
+             "QuestionId": np.concatenate(list(membership.values())) if membership else np.empty(0, dtype=np.int64), \
+             "OrdinalValue": np.tile(np.arange(1, questionsPerSurvey + 1), surveyCount)})
+
+        for answerColumns in iterSyntheticAnswers(rng, userIds, membership, responseRate, answerRate, maxAnswerValue):
+            insertRows(conduit, 'Answer', answerColumns)
+            answerCount += len(answerColumns["UserId"])
+
+        conduit.executescript(strSurveyIndexesScript)
+        conduit.commit()
+
+    finally:
+        conduit.close()
+
+    return answerCount
+
+
+def createSurveyDatabaseFromResults(databaseFilePath: str, resultsFilePath: str) -> int:
+    '''Creates a SQLite survey database from an exported results CSV file (e.g. extracted-vw_AllSurveyData.csv), so that the pipeline
+    run against it must export that same file again: questions with a value in a survey belong to it, values other than -1 are answers.
+    Returns the number of answers'''
+
+    resultsDF:pd.DataFrame = pd.read_csv(resultsFilePath, index_col=0)
+    answerColumnNames:list = [columnName for columnName in resultsDF.columns if columnName.startswith('ANS_Q')]
+
+    answersDF:pd.DataFrame = resultsDF.melt(id_vars=['UserId', 'SurveyId'], value_vars=answerColumnNames, \
+                                            var_name='AnswerColumn', value_name='Answer_Value').dropna(subset=['Answer_Value'])
+    answersDF['QuestionId'] = answersDF['AnswerColumn'].str[len('ANS_Q'):].astype(np.int64)
+
+    structureDF:pd.DataFrame = answersDF[['SurveyId', 'QuestionId']].drop_duplicates().sort_values(['SurveyId', 'QuestionId'])
+    answersDF = answersDF[answersDF['Answer_Value'] != -1]
+
+    conduit:sqlite3.Connection = createSurveyDatabase(databaseFilePath)
+
+    try:
+        insertRows(conduit, 'Survey', {"SurveyId": np.sort(resultsDF['SurveyId'].unique())})
+        insertRows(conduit, 'Question', {"QuestionId": np.array([int(columnName[len('ANS_Q'):]) for columnName in answerColumnNames])})
+        insertRows(conduit, '[User]', {"UserId": np.sort(resultsDF['UserId'].unique())})
+        insertRows(conduit, 'SurveyStructure', \
+            {"SurveyId": structureDF['SurveyId'].to_numpy(), \
+             "QuestionId": structureDF['QuestionId'].to_numpy(), \
+             "OrdinalValue": structureDF.groupby('SurveyId').cumcount().to_numpy() + 1})
+        insertRows(conduit, 'Answer', \
+            {"QuestionId": answersDF['QuestionId'].to_numpy(), \
+             "SurveyId": answersDF['SurveyId'].to_numpy(), \
+             "UserId": answersDF['UserId'].to_numpy(), \
+             "Answer_Value": answersDF['Answer_Value'].astype(np.int64).to_numpy()})
+
+        conduit.executescript(strSurveyIndexesScript)
+        conduit.commit()
+
+    finally:
+        conduit.close()
+
+    return len(answersDF)
+
+
+def createRefreshQueue(databaseFilePath: str) -> None:
+    '''Adds the refresh queue table and the triggers filling it on the Survey Structure changes to a survey database file'''
+
+    conduit:sqlite3.Connection = sqlite3.connect(databaseFilePath)
+
+    try:
+        conduit.executescript(strRefreshQueueScript)
+        conduit.commit()
+    finally:
+        conduit.close()
@@ -11,6 +11,8 @@ setuptools.setup(
     description="myTools offers utility classes and functions for dealing with the Always Fresh Survey Data Project",
     url="",
     packages=setuptools.find_packages(),
-    python_requires='>=3.6',
+    install_requires=["pandas", "numpy", "pyodbc", "cryptography", "pyarrow"],
+    extras_require={"sparse": ["scipy"]},
+    python_requires='>=3.7',
 )
 
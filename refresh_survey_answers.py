@@ -1,25 +1,48 @@
+from __future__ import annotations
+
 import argparse as agp
+import asyncio
+import concurrent.futures as cf
 from getpass import getpass
+import hashlib
+import json
 import os
+import pickle
+import re
+import signal
+import threading
+import time
 
 from myTools import MSSQL_DBConnector as mssql
+from myTools import SQLite_DBConnector as sqlite
 from myTools import DBConnector as dbc
+from myTools import AsyncDBConnector as adb
+from myTools import SurveyPivotEngine as spe
+from myTools import IncrementalExtraction as ie
+from myTools import ColumnarExport as cx
+from myTools import SparseExport as sx
+from myTools import PartitionedFetch as pf
+from myTools import ParallelPivot as pp
+from myTools import MaterializedResults as mr
+from myTools import RunMetrics as rm
+from myTools import ResultsStore as rs
+from myTools import SurveyResultsMatrix as srm
 import myTools.ContentObfuscation as ce
 import myTools.ModuleInstaller as mi
 import myTools.CLIArgumentParser as cli
 
 
-try:
-    import pandas as pd
-except:
-    mi.installModule("pandas")
-    import pandas as pd
+pd = mi.deferImport("pandas")
+
+
+#widest select list of a SQL Server view, a view of a wider survey cannot join its column group views
+maxSelectColumns: int = 4096
+
+#longest burst of queued structure changes, in debounce windows, before the view is refreshed even though changes keep coming
+maxDebounceWindows: int = 10
 
-try:
-    import pickle
-except:
-    mi.installModule("pickle")
-    import pickle
+#consumed refresh queue events deleted by each DELETE statement
+maxDeletedEventIds: int = 1000
 
 
 
@@ -72,6 +95,113 @@ def removeExistingPersistenceFile(persistenceFilePath:str) -> None:
 
 
 
+def getSidecarFilePath(persistenceFilePath:str, suffix:str) -> str:
+    '''Returns the path of a companion file kept next to the persistence file, e.g. <name>.watermark.json'''
+    filePathNoExtension = os.path.splitext(persistenceFilePath)[0]
+    return filePathNoExtension + suffix
+
+
+def saveSidecarJSON(persistenceFilePath:str, suffix:str, content:dict) -> None:
+    '''Saves a dictionary as a json companion file next to the persistence file'''
+    with open(getSidecarFilePath(persistenceFilePath, suffix), 'w') as handle :
+        json.dump(content, handle)
+
+
+def loadSidecarJSON(persistenceFilePath:str, suffix:str) -> dict:
+    '''Loads a json companion file saved next to the persistence file, None if there is none'''
+    if not os.path.exists(getSidecarFilePath(persistenceFilePath, suffix)):
+        return None
+    with open(getSidecarFilePath(persistenceFilePath, suffix), 'r') as handle :
+        return json.load(handle)
+
+
+def saveWatermark(persistenceFilePath:str, watermark:dict) -> None:
+    '''Saves the incremental extraction watermark next to the persistence file'''
+    saveSidecarJSON(persistenceFilePath, '.watermark.json', watermark)
+
+
+def loadWatermark(persistenceFilePath:str) -> dict:
+    '''Loads the incremental extraction watermark saved next to the persistence file, None if there is none'''
+    return loadSidecarJSON(persistenceFilePath, '.watermark.json')
+
+
+def saveViewFragments(persistenceFilePath:str, viewFragments:dict) -> None:
+    '''Saves the survey question lists the view fragments were last generated from next to the persistence file'''
+    saveSidecarJSON(persistenceFilePath, '.fragments.json', viewFragments)
+
+
+def loadViewFragments(persistenceFilePath:str) -> dict:
+    '''Loads the survey question lists the view fragments were last generated from, None if there are none'''
+    return loadSidecarJSON(persistenceFilePath, '.fragments.json')
+
+
+def removeViewFragments(persistenceFilePath:str) -> None:
+    '''Removes the saved view fragments state, if any, once the view is no longer made of fragments'''
+    if os.path.exists(getSidecarFilePath(persistenceFilePath, '.fragments.json')):
+        os.remove(getSidecarFilePath(persistenceFilePath, '.fragments.json'))
+
+
+def saveFingerprint(persistenceFilePath:str, fingerprint:dict) -> None:
+    '''Saves the Survey Structure fingerprint next to the persistence file'''
+    saveSidecarJSON(persistenceFilePath, '.fingerprint.json', fingerprint)
+
+
+def loadFingerprint(persistenceFilePath:str) -> dict:
+    '''Loads the Survey Structure fingerprint saved next to the persistence file, None if there is none'''
+    return loadSidecarJSON(persistenceFilePath, '.fingerprint.json')
+
+
+
+def saveQueryCache(persistenceFilePath:str, queryCache:dict) -> None:
+    '''Saves the last generated pivot query and the hash of the structure it was generated from next to the persistence file'''
+    saveSidecarJSON(persistenceFilePath, '.querycache.json', queryCache)
+
+
+def loadQueryCache(persistenceFilePath:str) -> dict:
+    '''Loads the last generated pivot query and the hash of the structure it was generated from, None if there are none'''
+    return loadSidecarJSON(persistenceFilePath, '.querycache.json')
+
+
+
+def saveColumnGroups(persistenceFilePath:str, columnGroups:dict) -> None:
+    '''Saves the column group views the single view was last split into next to the persistence file'''
+    saveSidecarJSON(persistenceFilePath, '.columngroups.json', columnGroups)
+
+
+def loadColumnGroups(persistenceFilePath:str) -> dict:
+    '''Loads the column group views the single view was last split into, None if there are none'''
+    return loadSidecarJSON(persistenceFilePath, '.columngroups.json')
+
+
+
+def saveMaterializationState(persistenceFilePath:str, materializationState:dict) -> None:
+    '''Saves the table name and answers fingerprint of the last materialization next to the persistence file'''
+    saveSidecarJSON(persistenceFilePath, '.materialized.json', materializationState)
+
+
+def loadMaterializationState(persistenceFilePath:str) -> dict:
+    '''Loads the state of the last materialization saved next to the persistence file, None if there is none'''
+    return loadSidecarJSON(persistenceFilePath, '.materialized.json')
+
+
+
+def saveExportStamp(persistenceFilePath:str, exportStamp:dict) -> None:
+    '''Saves the checksums and settings the last export was made with next to the persistence file'''
+    saveSidecarJSON(persistenceFilePath, '.exported.json', exportStamp)
+
+
+def loadExportStamp(persistenceFilePath:str) -> dict:
+    '''Loads the checksums and settings the last export was made with, None if there are none'''
+    return loadSidecarJSON(persistenceFilePath, '.exported.json')
+
+
+def removeExportStamp(persistenceFilePath:str) -> None:
+    '''Removes the saved export stamp, if any, once it no longer describes the results file'''
+    if os.path.exists(getSidecarFilePath(persistenceFilePath, '.exported.json')):
+        os.remove(getSidecarFilePath(persistenceFilePath, '.exported.json'))
+
+
+
 def isPersistenceFileDirectoryWritable(persistenceFilePath: str)-> bool:
     '''Checks if the directory of the specified persistence path is writable'''
     fileDirectoryPath = os.path.dirname(persistenceFilePath)
@@ -91,46 +221,108 @@ def getSurveyStructure(connector: mssql.MSSQL_DBConnector) -> pd.DataFrame:
     return surveyStructResults
 
 
-def getAllSurveyDataQuery(connector: dbc.DBConnector) -> str:
-    '''Returns a string containing the query for pivoting all survey answers data'''
- 
-    
-    #DYNAMIC QUERY BUILDING BLOCKS
-    ##define all string templates to use for assembling the dynamic query
+def normalizeSurveyStructure(surveyStructureDF: pd.DataFrame) -> pd.DataFrame:
+    '''Returns the Survey Structure rows sorted on all their columns with a fresh index, so that comparisons ignore the row order of the result set'''
+    return surveyStructureDF.sort_values(list(surveyStructureDF.columns), ignore_index=True)
 
-    strQueryTemplateForAnswerColumn: str = """COALESCE( 
-				( 
-					SELECT a.Answer_Value 
-					FROM Answer as a 
-					WHERE 
-						a.UserId = u.UserId 
-						AND a.SurveyId = <SURVEY_ID> 
-						AND a.QuestionId = <QUESTION_ID> 
-				), -1) AS ANS_Q<QUESTION_ID> """ 
 
-    strQueryTemplateForNullColumnn: str = ' NULL AS ANS_Q<QUESTION_ID> '
+def getSurveyStructureFingerprint(connector: dbc.DBConnector) -> dict:
+    '''Returns a compact fingerprint of the Survey Structure table computed on the server side: its row count and
+    a SHA2_256 hash of its rows serialized in a fixed order, so that the row order of the table has no effect'''
 
-    strQueryTemplateOuterUnionQuery: str = """ 
-			SELECT 
-					UserId 
-					, <SURVEY_ID> as SurveyId 
-					, <DYNAMIC_QUESTION_ANSWERS> 
-			FROM 
-				[User] as u 
-			WHERE EXISTS 
-			( 
-					SELECT * 
-					FROM Answer as a 
-					WHERE u.UserId = a.UserId 
-					AND a.SurveyId = <SURVEY_ID> 
-			) 
+    fingerprintQuery:str = """
+			SELECT
+				COUNT_BIG(*) as StructureRowCount
+				, CONVERT(varchar(64), HASHBYTES('SHA2_256', 
+					(
+						SELECT *
+						FROM SurveyStructure
+						ORDER BY SurveyId, QuestionId
+						FOR JSON PATH, INCLUDE_NULL_VALUES
+					)), 2) as StructureHash
+			FROM
+				SurveyStructure
+	"""
+
+    structureRowCount, structureHash = connector.ExecuteQuery_withRow(fingerprintQuery)
+
+    return {"rowcount": int(structureRowCount), \
+            "hash": None if structureHash is None else str(structureHash)}
+
+
+def getSurveyStructureChecksum(connector: dbc.DBConnector) -> dict:
+    '''Returns the row count and checksum of the Survey Structure table, computed on the server side and fetched without pandas'''
+
+    structureRowCount, structureChecksum = connector.ExecuteQuery_withRow( \
+        'SELECT COUNT_BIG(*) as StructureRowCount, CHECKSUM_AGG(BINARY_CHECKSUM(*)) as StructureChecksum FROM SurveyStructure')
+
+    return {"rowcount": int(structureRowCount), \
+            "checksum": None if structureChecksum is None else int(structureChecksum)}
+
+
+def getRefreshQueueState(connector: dbc.DBConnector) -> dict:
+    '''Returns the number of events waiting in the refresh queue filled by the dbo.trg_enqueueSurveyViewRefresh trigger
+    and the ages in milliseconds of the first and the last one, measured on the server clock so that the clock of the client has no effect'''
+
+    queueStateQuery:str = """
+			SELECT
+				COUNT_BIG(*) as EventCount
+				, DATEDIFF_BIG(MILLISECOND, MIN(q.EnqueuedAt), SYSUTCDATETIME()) as FirstEventAge
+				, DATEDIFF_BIG(MILLISECOND, MAX(q.EnqueuedAt), SYSUTCDATETIME()) as LastEventAge
+			FROM
+				SurveyViewRefreshQueue as q
 	"""
 
-    strCurrentUnionQueryBlock: str = ''
+    try:
+        eventCount, firstEventAge, lastEventAge = connector.ExecuteQuery_withRow(queueStateQuery)
+    except Exception as excp:
+        raise Exception('Couldn''t read the SurveyViewRefreshQueue table, create it with table-dbo.SurveyViewRefreshQueue.sql ' \
+                        + 'and enable the trigger of trigger-dbo.trg_enqueueSurveyViewRefresh.sql: ' + str(excp))
+
+    return {"eventcount": int(eventCount), \
+            "firsteventage": None if firstEventAge is None else int(firstEventAge), \
+            "lasteventage": None if lastEventAge is None else int(lastEventAge)}
+
+
+def getRefreshQueueEventIds(connector: dbc.DBConnector) -> list:
+    '''Returns the IDs of the events committed in the refresh queue. IDENTITY values are handed out before commit, so an event
+    committed later may get a lower ID than these: only the events read are deleted after the refresh, never a range of IDs'''
+    return [int(event_ID) for event_ID in connector.ExecuteQuery_withRS('SELECT q.EventId FROM SurveyViewRefreshQueue as q')['EventId']]
+
+
+def getSurveyQuestionMembership(connector: dbc.DBConnector) -> pd.DataFrame:
+    '''Returns a boolean SurveyId x QuestionId matrix flagging the questions belonging to each survey,
+    built in memory from a single fetch of the Survey, Question and SurveyStructure tables'''
+
+    surveysDF:pd.DataFrame = connector.ExecuteQuery_withRS('SELECT SurveyId FROM Survey ORDER BY SurveyId')
+    questionsDF:pd.DataFrame = connector.ExecuteQuery_withRS('SELECT QuestionId FROM Question ORDER BY QuestionId')
+    structureDF:pd.DataFrame = connector.ExecuteQuery_withRS('SELECT SurveyId, QuestionId FROM SurveyStructure')
+
+    #every survey gets a column for each question of the Question table plus the ones referenced in its structure
+    questionIds:list = sorted(set(questionsDF['QuestionId']).union(structureDF['QuestionId']))
+
+    membershipDF:pd.DataFrame = pd.crosstab(structureDF['SurveyId'], structureDF['QuestionId']) > 0
+    membershipDF = membershipDF.reindex(index=surveysDF['SurveyId'], columns=questionIds, fill_value=False)
 
-    strFinalQuery: str = ''
+    return membershipDF
 
 
+def getQuestionsInSurveys(connector: dbc.DBConnector, bulkStructureFetch:bool = True) -> dict:
+    '''Returns a dictionary mapping each SurveyId, in ascending order, to its ordered list of (QuestionId, InSurvey) pairs.
+    With bulkStructureFetch the structure tables are read once, otherwise one query is issued per survey'''
+
+    questionsInSurveys:dict = {}
+
+    if bulkStructureFetch:
+
+        membershipDF:pd.DataFrame = getSurveyQuestionMembership(connector)
+
+        for survey_ID, membershipRow in membershipDF.iterrows():
+            questionsInSurveys[int(survey_ID)] = [(int(question_ID), bool(is_question_in_survey)) \
+                for question_ID, is_question_in_survey in membershipRow.items()]
+
+        return questionsInSurveys
+
 
     #QUESTIONS QUERY TEMPLATE
     #extract the questions corresponding to each survey
@@ -162,157 +354,1296 @@ def getAllSurveyDataQuery(connector: dbc.DBConnector) -> str:
 				) as t
 			ORDER BY QuestionId;"""
 
-
-
-    #BUILDING DYNAMIC QUERY
-    #outer loop: loop over each surveyId in the Survey Table
-    #inner loop: loop over the questions in each survey in order to build the answer columns query
-
     surveyQuery:str = 'SELECT SurveyId FROM Survey ORDER BY SurveyId' 
 
     surveyQueryDF:pd.DataFrame = connector.ExecuteQuery_withRS(surveyQuery)
 
-    for survey_ID in range(1, len(surveyQueryDF)+1):
+    for survey_ID in surveyQueryDF['SurveyId']:
 
         questionsInCurrentSurveyQuery:str = questionsInSurveyQuery.replace('<CURRENT_SURVEY_ID>', str(survey_ID))
 
         questionsInSurveyRS:pd.DataFrame = connector.ExecuteQuery_withRS(questionsInCurrentSurveyQuery)
 
-        strColumnsQueryPart:str = ''
+        questionsInSurveys[int(survey_ID)] = [(int(question_ID), bool(is_question_in_survey)) \
+            for question_ID, is_question_in_survey in zip(questionsInSurveyRS['QuestionId'], questionsInSurveyRS['InSurvey'])]
 
-        for i in range(len(questionsInSurveyRS)):
-            
-            question_ID = questionsInSurveyRS.loc[i,'QuestionId']
-            is_question_in_survey = questionsInSurveyRS.loc[i,'InSurvey']
+    return questionsInSurveys
+
+
+def getSurveyDataQueryTemplates(queryStrategy:str = 'coalesce') -> dict:
+    '''Returns the string templates used for assembling the dynamic pivot query with the given strategy.
+    The 'coalesce' strategy emits one correlated subquery on Answer per question, glued with UNION,
+    the 'aggregate' strategy reads the Answer rows of each survey once with conditional aggregation, glued with UNION ALL'''
+
+    #DYNAMIC QUERY BUILDING BLOCKS
+    ##define all string templates to use for assembling the dynamic query
+
+    if queryStrategy == 'coalesce':
+
+        strQueryTemplateForAnswerColumn: str = """COALESCE( 
+				( 
+					SELECT a.Answer_Value 
+					FROM Answer as a 
+					WHERE 
+						a.UserId = u.UserId 
+						AND a.SurveyId = <SURVEY_ID> 
+						AND a.QuestionId = <QUESTION_ID> 
+				), -1) AS ANS_Q<QUESTION_ID> """ 
+
+        strQueryTemplateOuterUnionQuery: str = """ 
+			SELECT 
+					UserId 
+					, <SURVEY_ID> as SurveyId 
+					, <DYNAMIC_QUESTION_ANSWERS> 
+			FROM 
+				[User] as u 
+			WHERE EXISTS 
+			( 
+					SELECT * 
+					FROM Answer as a 
+					WHERE u.UserId = a.UserId 
+					AND a.SurveyId = <SURVEY_ID> 
+			) 
+	"""
+
+        strUnionOperator: str = ' UNION '
+
+    elif queryStrategy == 'aggregate':
+
+        #a missing answer row and a NULL Answer_Value both end up as -1, as with the correlated subquery
+        strQueryTemplateForAnswerColumn: str = """COALESCE( 
+				MAX(CASE WHEN a.QuestionId = <QUESTION_ID> THEN a.Answer_Value END) 
+				, -1) AS ANS_Q<QUESTION_ID> """ 
+
+        strQueryTemplateOuterUnionQuery: str = """ 
+			SELECT 
+					u.UserId 
+					, <SURVEY_ID> as SurveyId 
+					, <DYNAMIC_QUESTION_ANSWERS> 
+			FROM 
+				[User] as u 
+				INNER JOIN Answer as a ON a.UserId = u.UserId 
+			WHERE 
+				a.SurveyId = <SURVEY_ID> 
+			GROUP BY 
+				u.UserId, a.SurveyId 
+	"""
+
+        #each block holds a single SurveyId so blocks can never share a row, no dedupe sort is needed
+        strUnionOperator: str = ' UNION ALL '
+
+    else:
+        raise Exception('Unknown query strategy: ' + str(queryStrategy))
+
+    strQueryTemplateForNullColumnn: str = ' NULL AS ANS_Q<QUESTION_ID> '
+
+    return {"answercolumn": strQueryTemplateForAnswerColumn, \
+            "nullcolumn": strQueryTemplateForNullColumnn, \
+            "outerunionquery": strQueryTemplateOuterUnionQuery, \
+            "unionoperator": strUnionOperator}
+
+
+def getSurveyDataQueryBlock(survey_ID:int, questionsInSurvey:list, queryStrategy:str = 'coalesce') -> str:
+    '''Returns the query block pivoting the answers of one survey, given its ordered list of (QuestionId, InSurvey) pairs'''
+
+    queryTemplates:dict = getSurveyDataQueryTemplates(queryStrategy)
+
+    #the survey ID is substituted in each column part on its own and the parts are joined once,
+    #so that building the block takes a time linear in the number of questions
+    strAnswerColumnTemplate:str = queryTemplates["answercolumn"].replace('<SURVEY_ID>', str(survey_ID))
+
+    columnQueryParts:list = [(strAnswerColumnTemplate if is_question_in_survey else queryTemplates["nullcolumn"]).replace('<QUESTION_ID>', str(question_ID)) \
+                             for question_ID, is_question_in_survey in questionsInSurvey]
+
+    strQueryOuterUnionQuery = queryTemplates["outerunionquery"].replace('<SURVEY_ID>', str(survey_ID))
+    strQueryOuterUnionQuery = strQueryOuterUnionQuery.replace('<DYNAMIC_QUESTION_ANSWERS>', ' , '.join(columnQueryParts))
+
+    return strQueryOuterUnionQuery
 
-            if is_question_in_survey:
-                strColumnsQueryPart += strQueryTemplateForAnswerColumn.replace('<QUESTION_ID>', str(question_ID))
-                strColumnsQueryPart = strColumnsQueryPart.replace('<SURVEY_ID>', str(survey_ID))
-            else:
-                strColumnsQueryPart += strQueryTemplateForNullColumnn.replace('<QUESTION_ID>', str(question_ID))
 
-            if i < len(questionsInSurveyRS) - 1 :
-                strColumnsQueryPart += ' , '
+def buildAllSurveyDataQuery(questionsInSurveys:dict, queryStrategy:str = 'coalesce') -> str:
+    '''Returns a string containing the query for pivoting all survey answers data, given the question lists of the surveys'''
 
-        strQueryOuterUnionQuery = strQueryTemplateOuterUnionQuery.replace('<SURVEY_ID>', str(survey_ID))
-        strQueryOuterUnionQuery = strQueryOuterUnionQuery.replace('<DYNAMIC_QUESTION_ANSWERS>', strColumnsQueryPart)
+    strUnionOperator: str = getSurveyDataQueryTemplates(queryStrategy)["unionoperator"]
 
-        strFinalQuery += strQueryOuterUnionQuery
+    #BUILDING DYNAMIC QUERY
+    #each surveyId in the Survey Table contributes one union block
+
+    return strUnionOperator.join(getSurveyDataQueryBlock(survey_ID, questionsInSurvey, queryStrategy) \
+                                 for survey_ID, questionsInSurvey in questionsInSurveys.items())
+
+
+def getAllSurveyDataQuery(connector: dbc.DBConnector, bulkStructureFetch:bool = True, queryStrategy:str = 'coalesce') -> str:
+    '''Returns a string containing the query for pivoting all survey answers data'''
+
+    with connector.Metrics.Phase('structure_fetch'):
+        questionsInSurveys:dict = getQuestionsInSurveys(connector, bulkStructureFetch)
+
+    with connector.Metrics.Phase('query_generation'):
+        strFinalQuery:str = buildAllSurveyDataQuery(questionsInSurveys, queryStrategy)
+        connector.Metrics.AddPhaseValues(sqlLength=len(strFinalQuery))
 
-        if survey_ID < len(surveyQueryDF) :
-            strFinalQuery += ' UNION '
-   
     return strFinalQuery
 
 
+def getStructureHash(questionsInSurveys:dict, queryStrategy:str) -> str:
+    '''Returns a SHA-256 hash of the normalized survey structure (the ordered question lists of the surveys) and of the query strategy,
+    the only inputs of the generated pivot query'''
+    normalizedStructure:str = json.dumps({"querystrategy": queryStrategy, \
+        "surveys": [[int(survey_ID), [[int(question_ID), bool(is_question_in_survey)] for question_ID, is_question_in_survey in questionsInSurvey]] \
+                    for survey_ID, questionsInSurvey in sorted(questionsInSurveys.items())]}, separators=(',', ':'))
+    return hashlib.sha256(normalizedStructure.encode()).hexdigest()
 
-def refreshViewInDB(connector: dbc.DBConnector, baseViewQuery:str, viewName:str)->None:
-    '''Creates or refreshes the view table in the database using the specified query '''
 
-    refreshViewQuery = ' CREATE OR ALTER VIEW <VIEW_NAME> AS '.replace('<VIEW_NAME>', viewName) + baseViewQuery
+def getColumnGroupViewName(viewName:str, group_number:int) -> str:
+    '''Returns the name of the view holding one group of answer columns of a survey too wide for a single view'''
+    return viewName + '_C' + str(group_number)
 
-    connector.ExecuteQuery_view(refreshViewQuery)
 
-     
+def buildViewQueries(questionsInSurveys:dict, queryStrategy:str, viewName:str, maxViewColumns:int) -> list:
+    '''Returns the (view name, query) pairs of the views to create, in creation order, for pivoting all survey answers data.
+    Up to maxViewColumns questions, that is the single pivot view. Beyond, the questions are split into column groups of
+    maxViewColumns questions, each pivoted by its own view holding UserId, SurveyId and the answer columns of the group,
+    and the view joins the column group views on (UserId, SurveyId) as long as its select list fits in maxSelectColumns columns.
+    All column group views hold the same rows, since the rows of a survey block do not depend on its columns'''
 
-def surveyResultsToDF(connector: dbc.DBConnector, viewName:str)->pd.DataFrame:
-    '''Returns all rows from the view table in the database in a pandas dataframe'''
+    questionIds:list = sorted({question_ID for questionsInSurvey in questionsInSurveys.values() for question_ID, is_question_in_survey in questionsInSurvey})
 
-    getViewResultsQuery = ' SELECT * FROM <VIEW_NAME> '.replace('<VIEW_NAME>', viewName)
+    if len(questionIds) <= maxViewColumns:
+        return [(viewName, buildAllSurveyDataQuery(questionsInSurveys, queryStrategy))]
 
-    return connector.ExecuteQuery_withRS(getViewResultsQuery)
+    columnGroups:list = [questionIds[position:position + maxViewColumns] for position in range(0, len(questionIds), maxViewColumns)]
+    questionGroupPositions:dict = {question_ID: question_position // maxViewColumns for question_position, question_ID in enumerate(questionIds)}
 
+    #one pass over the question list of each survey deals its questions out to the column groups, keeping their order
+    groupQuestionsInSurveys:list = [{survey_ID: [] for survey_ID in questionsInSurveys.keys()} for columnGroup in columnGroups]
+    for survey_ID, questionsInSurvey in questionsInSurveys.items():
+        for question_ID, is_question_in_survey in questionsInSurvey:
+            groupQuestionsInSurveys[questionGroupPositions[question_ID]][survey_ID].append((question_ID, is_question_in_survey))
 
+    viewQueries:list = [(getColumnGroupViewName(viewName, group_number), buildAllSurveyDataQuery(groupQuestionsInSurvey, queryStrategy)) \
+                        for group_number, groupQuestionsInSurvey in enumerate(groupQuestionsInSurveys, start=1)]
 
-####### MAIN FUNCTION
+    if len(questionIds) + 2 <= maxSelectColumns:
 
-def main():
-    
-    cliArguments:dict = None
+        #the first column group brings the keys, every column being listed since the column list of a SELECT * view is bound when it is created
+        selectedColumns:list = ['c1.UserId', 'c1.SurveyId'] + ['c' + str(group_number) + '.ANS_Q' + str(question_ID) \
+            for group_number, columnGroup in enumerate(columnGroups, start=1) for question_ID in columnGroup]
+        joinedViews:list = [getColumnGroupViewName(viewName, 1) + ' as c1'] + [getColumnGroupViewName(viewName, group_number) + ' as c' + str(group_number) \
+            + ' ON c' + str(group_number) + '.UserId = c1.UserId AND c' + str(group_number) + '.SurveyId = c1.SurveyId' \
+            for group_number in range(2, len(columnGroups) + 1)]
 
-    printSplashScreen()    
+        viewQueries.append((viewName, ' SELECT ' + ' , '.join(selectedColumns) + ' FROM ' + ' INNER JOIN '.join(joinedViews) + ' '))
+
+    return viewQueries
+
+
+def getCachedViewQueries(connector: dbc.DBConnector, cliArguments:dict, bulkStructureFetch:bool) -> list:
+    '''Returns the (view name, query) pairs of the views pivoting all survey answers data, taken from the query cache saved
+    next to the persistence file when they were generated from the same structure and view settings, generated and cached otherwise'''
+
+    with connector.Metrics.Phase('structure_fetch'):
+        questionsInSurveys:dict = getQuestionsInSurveys(connector, bulkStructureFetch)
+
+    structureHash:str = getStructureHash(questionsInSurveys, cliArguments["querystrategy"])
 
-    #take connection arguments from the CLI
     try:
-        cliArguments = cli.processCLIArguments()
-    except Exception as excp:
-        print("Exiting")
-        return
+        queryCache:dict = loadQueryCache(cliArguments["persistencefilepath"])
+    except Exception as e:
+        print('Problem with loading the query cache, will generate the view query! \n')
+        queryCache = None
 
-    if(cliArguments is not None):
+    if queryCache is not None and queryCache.get("structurehash") == structureHash \
+        and queryCache.get("viewname") == cliArguments["viewname"] \
+        and queryCache.get("maxviewcolumns") == cliArguments["maxviewcolumns"] \
+        and "viewqueries" in queryCache:
+        print('INFO - View query taken from the query cache')
+        return [(viewName, viewQuery) for viewName, viewQuery in queryCache["viewqueries"]]
+
+    with connector.Metrics.Phase('query_generation'):
+        viewQueries:list = buildViewQueries(questionsInSurveys, cliArguments["querystrategy"], cliArguments["viewname"], cliArguments["maxviewcolumns"])
+        connector.Metrics.AddPhaseValues(sqlLength=sum(len(viewQuery) for viewName, viewQuery in viewQueries))
+
+    saveQueryCache(cliArguments["persistencefilepath"], {"structurehash": structureHash, "viewname": cliArguments["viewname"], \
+        "maxviewcolumns": cliArguments["maxviewcolumns"], "viewqueries": [[viewName, viewQuery] for viewName, viewQuery in viewQueries]})
+
+    return viewQueries
+
+
+
+def getFragmentViewName(viewName:str, survey_ID:int) -> str:
+    '''Returns the name of the view holding the pivoted answers of one survey'''
+    return viewName + '_S' + str(survey_ID)
+
+
+def getFragmentColumnIds(questionsInSurveys:dict) -> list:
+    '''Returns the QuestionIds of the answer columns of the fragment views, in the order of their columns, over all the surveys'''
+    return list(dict.fromkeys(question_ID for questionsInSurvey in questionsInSurveys.values() for question_ID, is_question_in_survey in questionsInSurvey))
+
+
+def refreshViewFragmentsInDB(connector: dbc.DBConnector, cliArguments:dict, bulkStructureFetch:bool) -> bool:
+    '''Creates or refreshes one view per survey plus a thin top-level view gluing them together.
+    Only the fragments of the surveys whose question membership differs from the previous run are altered,
+    the top-level view only when the list of surveys or the columns of the fragments have changed. Returns whether any view definition changed'''
+
+    isAnyViewAltered:bool = False
+
+    queryStrategy:str = cliArguments["querystrategy"]
+    viewName:str = cliArguments["viewname"]
+
+    with connector.Metrics.Phase('structure_fetch'):
+        questionsInSurveys:dict = getQuestionsInSurveys(connector, bulkStructureFetch)
+
+    #fragments generated for another view or with another strategy cannot be reused
+    previousViewFragments:dict = None
+    try:
+        previousViewFragments = loadViewFragments(cliArguments["persistencefilepath"])
+    except Exception as e:
+        print('Problem with loading the saved view fragments, will refresh all of them! \n')
+
+    previousQuestionsInSurveys:dict = {}
+    if previousViewFragments is not None \
+        and previousViewFragments.get("viewname") == viewName \
+        and previousViewFragments.get("querystrategy") == queryStrategy:
+        previousQuestionsInSurveys = {int(survey_ID): [(int(question_ID), bool(is_question_in_survey)) \
+            for question_ID, is_question_in_survey in questionsInSurvey] \
+            for survey_ID, questionsInSurvey in previousViewFragments["surveys"].items()}
+
+    refreshedSurveyIds:list = [survey_ID for survey_ID, questionsInSurvey in questionsInSurveys.items() \
+        if previousQuestionsInSurveys.get(survey_ID) != questionsInSurvey]
+
+    for survey_ID in refreshedSurveyIds:
+        with connector.Metrics.Phase('query_generation'):
+            fragmentViewQuery:str = getSurveyDataQueryBlock(survey_ID, questionsInSurveys[survey_ID], queryStrategy)
+            connector.Metrics.AddPhaseValues(sqlLength=len(fragmentViewQuery))
+        isAnyViewAltered = refreshViewInDB(connector, fragmentViewQuery, getFragmentViewName(viewName, survey_ID)) or isAnyViewAltered
+
+    #the top-level view selects * from the fragments, its column list is only bound again when it is altered, e.g. for a new question
+    isFragmentColumnsChanged:bool = getFragmentColumnIds(previousQuestionsInSurveys) != getFragmentColumnIds(questionsInSurveys)
+
+    if list(previousQuestionsInSurveys.keys()) != list(questionsInSurveys.keys()) or isFragmentColumnsChanged:
+
+        with connector.Metrics.Phase('query_generation'):
+            strUnionOperator:str = getSurveyDataQueryTemplates(queryStrategy)["unionoperator"]
+            topLevelViewQuery:str = strUnionOperator.join(' SELECT * FROM ' + getFragmentViewName(viewName, survey_ID) + ' ' \
+                for survey_ID in questionsInSurveys.keys())
+            connector.Metrics.AddPhaseValues(sqlLength=len(topLevelViewQuery))
+
+        isAnyViewAltered = refreshViewInDB(connector, topLevelViewQuery, viewName, isFragmentColumnsChanged) or isAnyViewAltered
+
+        #fragments of surveys removed from the Survey table are no longer referenced by the top-level view
+        for survey_ID in previousQuestionsInSurveys.keys():
+            if survey_ID not in questionsInSurveys:
+                connector.ExecuteQuery_view(' DROP VIEW IF EXISTS ' + getFragmentViewName(viewName, survey_ID) + ' ')
+
+    saveViewFragments(cliArguments["persistencefilepath"], {"viewname": viewName, "querystrategy": queryStrategy, \
+        "surveys": {str(survey_ID): questionsInSurvey for survey_ID, questionsInSurvey in questionsInSurveys.items()}})
+
+    print('INFO - ' + str(len(refreshedSurveyIds)) + ' of ' + str(len(questionsInSurveys)) + ' survey view fragments refreshed') 
+
+    return isAnyViewAltered
+
+
+def refreshSurveyView(connector: dbc.DBConnector, cliArguments:dict, bulkStructureFetch:bool) -> bool:
+    '''Regenerates the pivot query, or takes it from the query cache, and creates or refreshes the view with the selected layout.
+    Returns whether the view definition changed, the DDL being skipped when the new definition is the one already in the database'''
+    if cliArguments["viewlayout"] == "fragmented":
+        return refreshViewFragmentsInDB(connector, cliArguments, bulkStructureFetch)
+
+    viewName:str = cliArguments["viewname"]
+    viewQueries:list = getCachedViewQueries(connector, cliArguments, bulkStructureFetch)
+
+    #the column group views are created before the view joining them
+    isViewAltered:bool = False
+    for refreshedViewName, viewQuery in viewQueries:
+        isViewAltered = refreshViewInDB(connector, viewQuery, refreshedViewName) or isViewAltered
+
+    columnGroupViewNames:list = [refreshedViewName for refreshedViewName, viewQuery in viewQueries if refreshedViewName != viewName]
+    hasTopLevelView:bool = len(columnGroupViewNames) < len(viewQueries)
+
+    #column group views of a previous wider structure are no longer referenced, nor is a view too wide to join its column groups kept
+    previousColumnGroups:dict = None
+    try:
+        previousColumnGroups = loadColumnGroups(cliArguments["persistencefilepath"])
+    except Exception as e:
+        print('Problem with loading the saved column groups, previous column group views are kept! \n')
+
+    droppedViewNames:list = [] if hasTopLevelView else [viewName]
+    if previousColumnGroups is not None and previousColumnGroups.get("viewname") == viewName:
+        droppedViewNames += [groupViewName for groupViewName in previousColumnGroups["columngroupviews"] if groupViewName not in columnGroupViewNames]
+
+    for droppedViewName in droppedViewNames:
+        if getViewDefinition(connector, droppedViewName) is not None:
+            connector.ExecuteQuery_view(' DROP VIEW IF EXISTS ' + droppedViewName + ' ')
+            isViewAltered = True
+
+    saveColumnGroups(cliArguments["persistencefilepath"], {"viewname": viewName, "columngroupviews": columnGroupViewNames, "hastoplevelview": hasTopLevelView})
+
+    if columnGroupViewNames:
+        print('INFO - ' + str(len(columnGroupViewNames)) + ' column group views created for the ' + viewName + ' view' \
+              + ('' if hasTopLevelView else ', too wide to join them, the view-based engines read them directly'))
+
+    #the top-level view no longer references the fragments, a later fragmented refresh must rebuild it
+    removeViewFragments(cliArguments["persistencefilepath"])
+    return isViewAltered
+
+
+def refreshViewOnDataFrameChange(connector: dbc.DBConnector, cliArguments:dict, bulkStructureFetch:bool) -> bool:
+    '''Compares the whole Survey Structure table with the copy pickled by the previous run
+    and refreshes the view only when they differ. Returns whether the view has been refreshed'''
+
+    isViewRefreshed:bool = False
+
+    #extract Survey Structure table data into a pandas dataframe
+    with connector.Metrics.Phase('structure_check'):
+        surveyStructureDF:pd.DataFrame = getSurveyStructure(connector)
+
+    #check non-existence scenario of a previous persisted Survey Structure table 
+    #this means first time running the script on the current environment
+    if(doesPersistenceFileExist(cliArguments["persistencefilepath"]) == False):
+
+        #check writability of file path to save the Survey Structure table content
+        if(isPersistenceFileDirectoryWritable(cliArguments["persistencefilepath"]) == True):
+        
+            #persist content and confirm operation success
+            pickleDataFrame(cliArguments["persistencefilepath"], surveyStructureDF)
+            print("\nINFO - Content of SurveyResults table pickled in " + cliArguments["persistencefilepath"] + "\n")
+        
+            #create or refresh the view anyway because comparison is not yet possible in this scenario
+            isViewRefreshed = refreshSurveyView(connector, cliArguments, bulkStructureFetch)
+            print('INFO - View has been refreshed!' if isViewRefreshed else 'INFO - View definition is already up to date!') 
+
+    #check existence scenario of a previous persisted Survey Structure table to perform comparison
+    #compare the existing pickled Survey Structure file with the newly extracted surveyStructureDF      
+    else:
 
         try:
 
-            #define MSSQL connection with processed CLI arguments
-            connector = mssql.MSSQL_DBConnector(DSN = cliArguments["dsn"], dbserver = cliArguments["dbserver"], \
-                dbname = cliArguments["dbname"], dbusername = cliArguments["dbusername"], \
-                dbpassword = cliArguments["dbuserpassword"], trustedmode = cliArguments["trustedmode"], \
-                viewname = cliArguments["viewname"])
+            #unpickle previously saved Survey Structure
+            unpickledSurveyStructureDF:pd.DataFrame = unpickleDataFrame(cliArguments["persistencefilepath"])
 
-            #open MSSQL connection
-            connector.Open()
+            #check equality of pandas dataframes regardless of row order and save result into a boolean variable
+            with connector.Metrics.Phase('structure_check'):
+                existing_equals_new:bool = normalizeSurveyStructure(surveyStructureDF).equals(normalizeSurveyStructure(unpickledSurveyStructureDF))
 
-            #extract Survey Structure table data into a pandas dataframe
-            surveyStructureDF:pd.DataFrame = getSurveyStructure(connector)
-
-            #check non-existence scenario of a previous persisted Survey Structure table 
-            #this means first time running the script on the current environment
-            if(doesPersistenceFileExist(cliArguments["persistencefilepath"]) == False):
-
-                #check writability of file path to save the Survey Structure table content
-                if(isPersistenceFileDirectoryWritable(cliArguments["persistencefilepath"]) == True):
-                    
-                    #persist content and confirm operation success
-                    pickleDataFrame(cliArguments["persistencefilepath"], surveyStructureDF)
-                    print("\nINFO - Content of SurveyResults table pickled in " + cliArguments["persistencefilepath"] + "\n")
-                    
-                    #create or refresh the view anyway because comparison is not yet possible in this scenario
-                    refreshViewInDB(connector, getAllSurveyDataQuery(connector), cliArguments["viewname"])
-                    print('INFO - View has been refreshed!') 
-            
-            #check existence scenario of a previous persisted Survey Structure table to perform comparison
-            #compare the existing pickled Survey Structure file with the newly extracted surveyStructureDF      
-            else:
+            if existing_equals_new: 
+                print('INFO - Survey Structure hasn''t been modified!') 
+            else :
+                print('INFO - Survey Structure has been modified!') 
+                #create or refresh view because survey structure has been modofied
+                isViewRefreshed = refreshSurveyView(connector, cliArguments, bulkStructureFetch)
+                print('INFO - View has been refreshed!' if isViewRefreshed else 'INFO - View definition is already up to date!') 
 
-                try:
+                #remove existing saved Survey Structure table and save the updated one
+                removeExistingPersistenceFile(cliArguments["persistencefilepath"])
+                pickleDataFrame(cliArguments["persistencefilepath"], surveyStructureDF)
+
+        except Exception as e:
+        
+            print('Problem with unpickling process, can''t proceed with comparing previous and current view states, will refresh view by default! \n')
+            #refresh the view in case there's a problem with persistence or comparison process
+            isViewRefreshed = refreshSurveyView(connector, cliArguments, bulkStructureFetch)
 
-                    #unpickle previously saved Survey Structure
-                    unpickledSurveyStructureDF:pd.DataFrame = unpickleDataFrame(cliArguments["persistencefilepath"])
+    return isViewRefreshed
 
-                    #check equality of pandas dataframes and save result into a boolean variable
-                    existing_equals_new:bool = surveyStructureDF.equals(unpickledSurveyStructureDF)
 
-                    if existing_equals_new: 
-                        print('INFO - Survey Structure hasn''t been modified!') 
-                    else :
-                        print('INFO - Survey Structure has been modified!') 
-                        #create or refresh view because survey structure has been modofied
-                        refreshViewInDB(connector, getAllSurveyDataQuery(connector), cliArguments["viewname"])
-                        print('INFO - View has been refreshed!') 
+def refreshViewOnFingerprintChange(connector: dbc.DBConnector, cliArguments:dict, bulkStructureFetch:bool) -> bool:
+    '''Compares the server-side fingerprint of the Survey Structure table with the one saved by the previous run
+    and refreshes the view only when they differ. Returns whether the view has been refreshed'''
 
-                        #remove existing saved Survey Structure table and save the updated one
-                        removeExistingPersistenceFile(cliArguments["persistencefilepath"])
-                        pickleDataFrame(cliArguments["persistencefilepath"], surveyStructureDF)
+    with connector.Metrics.Phase('structure_check'):
 
-                except Exception as e:
-                    
-                    print('Problem with unpickling process, can''t proceed with comparing previous and current view states, will refresh view by default! \n')
-                    #refresh the view in case there's a problem with persistence or comparison process
-                    refreshViewInDB(connector, getAllSurveyDataQuery(connector), cliArguments["viewname"])
+        currentFingerprint:dict = getSurveyStructureFingerprint(connector)
 
-            
-            #save the refreshed view content (updated pivoted survey answers data) to the given results path
+        try:
+            previousFingerprint:dict = loadFingerprint(cliArguments["persistencefilepath"])
+        except Exception as e:
+            print('Problem with loading the saved fingerprint, will refresh view by default! \n')
+            previousFingerprint = None
 
-            surveyResults:pd.DataFrame = surveyResultsToDF(connector, cliArguments["viewname"])
+    if previousFingerprint is not None and previousFingerprint == currentFingerprint:
+        print('INFO - Survey Structure hasn''t been modified!') 
+        return False
 
-            try:
-                surveyResults.to_csv(cliArguments["resultsfilepath"])
-                print("\nINFO - Done! Results exported in " + cliArguments["resultsfilepath"] + "\n")
-            except Exception as e:
-                raise Exception('Cannot save results to resultsFilePath', e)
-          
-            #close MSSQL connection
-            connector.Close()
+    print('INFO - Survey Structure has been modified!') 
+    isViewRefreshed:bool = refreshSurveyView(connector, cliArguments, bulkStructureFetch)
+    print('INFO - View has been refreshed!' if isViewRefreshed else 'INFO - View definition is already up to date!') 
+
+    saveFingerprint(cliArguments["persistencefilepath"], currentFingerprint)
+
+    return isViewRefreshed
+
+
+def refreshViewOnQueuedEvents(connector: dbc.DBConnector, cliArguments:dict, bulkStructureFetch:bool) -> bool:
+    '''Consumes the refresh queue filled by the dbo.trg_enqueueSurveyViewRefresh trigger: a burst of structure changes is coalesced
+    into a single refresh once no event has been queued for the debounce window, or once the burst has lasted maxDebounceWindows windows.
+    In watch mode a burst still going on is left to the next cycle, otherwise the run waits for it to settle.
+    Only the events read before the refresh are deleted, by their IDs, the ones committed in the meantime trigger the next one.
+    Returns whether the view has been refreshed'''
+
+    debounceMilliseconds:int = int(cliArguments["debounce"] * 1000)
+    maxBurstMilliseconds:int = debounceMilliseconds * maxDebounceWindows
+
+    while True:
+
+        with connector.Metrics.Phase('structure_check'):
+            queueState:dict = getRefreshQueueState(connector)
+
+        #the view of a first run is created even though no change has been queued yet
+        if queueState["eventcount"] == 0 and getViewDefinition(connector, cliArguments["viewname"]) is not None:
+            print('INFO - Survey Structure hasn''t been modified!')
+            return False
+
+        if queueState["eventcount"] == 0:
+            break
+
+        #a burst which keeps going is still refreshed once it has lasted maxDebounceWindows windows
+        remainingMilliseconds:int = min(debounceMilliseconds - queueState["lasteventage"], maxBurstMilliseconds - queueState["firsteventage"])
+        if remainingMilliseconds <= 0:
+            break
+
+        if cliArguments["watch"] is not None:
+            print('INFO - Survey Structure is being modified (' + str(queueState["eventcount"]) + ' queued changes), refresh postponed')
+            return False
+
+        time.sleep(remainingMilliseconds / 1000)
+
+    if queueState["eventcount"] == 0:
+        print('INFO - View ' + cliArguments["viewname"] + ' doesn''t exist yet!')
+    else:
+        print('INFO - Survey Structure has been modified! (' + str(queueState["eventcount"]) + ' queued changes coalesced into one refresh)')
+
+    #the events are read before the structure, so that the refresh sees the changes of every event it consumes
+    consumedEventIds:list = getRefreshQueueEventIds(connector) if queueState["eventcount"] > 0 else []
+
+    isViewRefreshed:bool = refreshSurveyView(connector, cliArguments, bulkStructureFetch)
+    print('INFO - View has been refreshed!' if isViewRefreshed else 'INFO - View definition is already up to date!')
+
+    for batchStart in range(0, len(consumedEventIds), maxDeletedEventIds):
+        connector.ExecuteQuery_view('DELETE FROM SurveyViewRefreshQueue WHERE EventId IN (' \
+            + ', '.join(str(event_ID) for event_ID in consumedEventIds[batchStart:batchStart + maxDeletedEventIds]) + ')')
+
+    return isViewRefreshed
+
+
+
+def getViewDefinition(connector: dbc.DBConnector, viewName:str) -> str:
+    '''Returns the definition of the view as stored in sys.sql_modules, None if there is no such view'''
+
+    viewDefinitionQuery:str = " SELECT m.definition as ViewDefinition FROM sys.sql_modules as m WHERE m.object_id = OBJECT_ID('<VIEW_NAME>', 'V') "
+
+    viewDefinitionRow:tuple = connector.ExecuteQuery_withRow(viewDefinitionQuery.replace('<VIEW_NAME>', viewName))
+
+    return None if viewDefinitionRow is None else viewDefinitionRow[0]
+
+
+def normalizeViewDefinition(viewDefinition:str) -> str:
+    '''Returns the body of a view definition, without its CREATE [OR ALTER] VIEW <VIEW_NAME> AS header and with its runs of whitespace collapsed'''
+    viewBody:str = re.sub(r'^\s*CREATE\s+(?:OR\s+ALTER\s+)?VIEW\s+\S+\s+AS\s', '', viewDefinition, count=1, flags=re.IGNORECASE)
+    return ' '.join(viewBody.split())
+
+
+def refreshViewInDB(connector: dbc.DBConnector, baseViewQuery:str, viewName:str, isRebindNeeded:bool = False)->bool:
+    '''Creates or refreshes the view table in the database using the specified query.
+    The DDL, which takes schema locks and invalidates the cached plans depending on the view, is skipped
+    when the view already has that definition, unless isRebindNeeded: the column list of a SELECT * view is bound when it is created,
+    so a view selecting * from views whose columns changed has to be altered again even with the same definition.
+    Returns whether the view has been created or altered'''
+
+    refreshViewQuery = ' CREATE OR ALTER VIEW <VIEW_NAME> AS '.replace('<VIEW_NAME>', viewName) + baseViewQuery
+
+    with connector.Metrics.Phase('view_ddl'):
+
+        currentViewDefinition:str = getViewDefinition(connector, viewName)
+
+        if not isRebindNeeded and currentViewDefinition is not None \
+            and normalizeViewDefinition(currentViewDefinition) == normalizeViewDefinition(refreshViewQuery):
+            print('INFO - View ' + viewName + ' already has the generated definition, not altered')
+            return False
+
+        connector.ExecuteQuery_view(refreshViewQuery)
+        connector.Metrics.AddPhaseValues(sqlLength=len(refreshViewQuery))
+
+    return True
+
+     
+
+def surveyResultsToMatrix(connector: dbc.DBConnector, viewName:str, fastFetchBatchSize:int = None)->srm.SurveyResultsMatrix:
+    '''Returns all rows from the view table in the database in a compact results matrix,
+    decoded by the fast fetch path in batches of fastFetchBatchSize rows when given, straight into small integer answer codes'''
+
+    getViewResultsQuery = ' SELECT * FROM <VIEW_NAME> '.replace('<VIEW_NAME>', viewName)
+
+    if fastFetchBatchSize is not None:
+        return srm.SurveyResultsMatrix.fromColumns(connector.ExecuteQuery_withRSColumns(getViewResultsQuery, fastFetchBatchSize))
+
+    return srm.SurveyResultsMatrix.fromDataFrame(connector.ExecuteQuery_withRS(getViewResultsQuery))
+
+
+
+def surveyResultsToCSV(connector: dbc.DBConnector, viewName:str, resultsFilePath:str, batchSize:int)->int:
+    '''Streams all rows from the view table in the database to the results CSV file, batchSize rows at a time, and returns the number of rows.
+    The answer columns holding NULLs are found from the survey structure beforehand, so that they are written as floats from the first batch'''
+
+    getViewResultsQuery = ' SELECT * FROM <VIEW_NAME> '.replace('<VIEW_NAME>', viewName)
+
+    nullColumnNames:list = spe.getNullAnswerColumnNames(connector, getSurveyQuestionMembership(connector))
+
+    return connector.ExportQuery_toCSV(getViewResultsQuery, resultsFilePath, batchSize, nullColumnNames)
+
+
+
+####### RESULTS EXPORT
+
+
+def getResultsSourceName(cliArguments:dict) -> str:
+    '''Returns the database object the view-based engines read the results from: the materialized results table when there is one, the view otherwise'''
+    return cliArguments["materializedtable"] if cliArguments["materializedtable"] else cliArguments["viewname"]
+
+
+def getResultsColumnGroupViewNames(cliArguments:dict) -> list:
+    '''Returns the column group views the view-based engines read the results from when the survey is too wide for the view
+    to join them, None when they read the view or the materialized results table'''
+
+    if cliArguments["materializedtable"] or cliArguments["viewlayout"] != "single":
+        return None
+
+    columnGroups:dict = loadColumnGroups(cliArguments["persistencefilepath"])
+
+    if columnGroups is None or columnGroups.get("viewname") != cliArguments["viewname"] or columnGroups.get("hastoplevelview", True):
+        return None
+
+    return columnGroups["columngroupviews"]
+
+
+def exportSurveyResultsToColumnar(connector: dbc.DBConnector, cliArguments:dict) -> None:
+    '''Exports the complete pivoted survey answers data as parquet or feather, chunk by chunk, with the selected engine'''
+
+    columnGroupViewNames:list = getResultsColumnGroupViewNames(cliArguments)
+
+    #the columns of the results, for the schema of the file written even when there is no row
+    membershipDF:pd.DataFrame = getSurveyQuestionMembership(connector)
+    columnNames:list = ['UserId', 'SurveyId'] + spe.getAnswerColumnNames(membershipDF)
+
+    if cliArguments["engine"] == "client":
+        resultsChunks = spe.iterPivotedAnswerChunks(connector, membershipDF, cliArguments["chunksize"])
+    elif cliArguments["engine"] == "parallelclient":
+        resultsChunks = pp.iterPivotedPartitions(connector, createConnector, cliArguments, membershipDF, \
+            cliArguments["parallelism"], cliArguments["chunksize"] if cliArguments["fastfetch"] else None)
+    elif cliArguments["engine"] == "parallelview" or columnGroupViewNames:
+        resultsChunks = pf.iterViewPartitions(connector, getResultsSourceName(cliArguments), cliArguments["parallelism"], \
+            cliArguments["chunksize"] if cliArguments["fastfetch"] else None, columnGroupViewNames)
+    else:
+        resultsChunks = connector.ExecuteQuery_withRSChunks(' SELECT * FROM <VIEW_NAME> '.replace('<VIEW_NAME>', getResultsSourceName(cliArguments)), \
+            cliArguments["chunksize"])
+
+    try:
+        exportedRows:int = cx.exportResultsToColumnar(resultsChunks, cliArguments["resultsfilepath"], cliArguments["format"], columnNames, \
+            cliArguments["compression"], cliArguments["partitionbysurvey"])
+        connector.Metrics.AddPhaseValues(rows=exportedRows)
+        print("\nINFO - Done! " + str(exportedRows) + " rows exported in " + cliArguments["resultsfilepath"] + "\n")
+    except Exception as e:
+        raise Exception('Cannot save results to resultsFilePath', e)
+
+
+def exportSurveyResults(connector: dbc.DBConnector, cliArguments:dict) -> None:
+    '''Exports the complete pivoted survey answers data to the results file path with the selected engine and format'''
+
+    #a survey too wide for the view to join its column group views is read from them partition by partition, whatever the view-based engine
+    columnGroupViewNames:list = getResultsColumnGroupViewNames(cliArguments)
+
+    if cliArguments["format"] == "npz":
+
+        #the sparse matrix is built from the raw answers, its size following their number, the view itself is not queried
+        try:
+            exportedRows:int = sx.exportAnswersToSparse(connector, getSurveyQuestionMembership(connector), \
+                cliArguments["resultsfilepath"], cliArguments["chunksize"], cliArguments["compression"] != "none")
+            connector.Metrics.AddPhaseValues(rows=exportedRows)
+            print("\nINFO - Done! " + str(exportedRows) + " rows exported in " + cliArguments["resultsfilepath"] + "\n")
+        except Exception as e:
+            raise Exception('Cannot save results to resultsFilePath', e)
+
+    elif cliArguments["format"] != "csv":
+        exportSurveyResultsToColumnar(connector, cliArguments)
+
+    elif cliArguments["engine"] == "client":
+
+        #pivot the streamed raw answers on the client side, the view itself is not queried
+        try:
+            exportedRows:int = spe.exportPivotedAnswersToCSV(connector, getSurveyQuestionMembership(connector), \
+                cliArguments["resultsfilepath"], cliArguments["chunksize"])
+            connector.Metrics.AddPhaseValues(rows=exportedRows)
+            print("\nINFO - Done! " + str(exportedRows) + " rows exported in " + cliArguments["resultsfilepath"] + "\n")
+        except Exception as e:
+            raise Exception('Cannot save results to resultsFilePath', e)
+
+    elif cliArguments["engine"] == "parallelclient":
+
+        #pivot range partitions of the raw answers in worker processes, each one on its own connection, and append them in order
+        try:
+            exportedRows:int = pp.exportPivotedPartitionsToCSV(connector, createConnector, cliArguments, getSurveyQuestionMembership(connector), \
+                cliArguments["resultsfilepath"], cliArguments["parallelism"], cliArguments["chunksize"] if cliArguments["fastfetch"] else None)
+            connector.Metrics.AddPhaseValues(rows=exportedRows)
+            print("\nINFO - Done! " + str(exportedRows) + " rows exported in " + cliArguments["resultsfilepath"] + "\n")
+        except Exception as e:
+            raise Exception('Cannot save results to resultsFilePath', e)
+
+    elif cliArguments["engine"] == "streamedview" and not columnGroupViewNames:
+
+        #read the view with fetchmany and write each batch straight to the results file
+        try:
+            exportedRows:int = surveyResultsToCSV(connector, getResultsSourceName(cliArguments), cliArguments["resultsfilepath"], cliArguments["chunksize"])
+            connector.Metrics.AddPhaseValues(rows=exportedRows)
+            print("\nINFO - Done! " + str(exportedRows) + " rows exported in " + cliArguments["resultsfilepath"] + "\n")
+        except Exception as e:
+            raise Exception('Cannot save results to resultsFilePath', e)
+
+    else:
+
+        #the whole results are held as a compact matrix of small integer answer codes rather than a float64 dataframe
+        with connector.Metrics.Phase('fetch'):
+            #the parallelview engine reads the view as concurrent range partitions merged in (SurveyId, UserId) order
+            if cliArguments["engine"] == "parallelview" or columnGroupViewNames:
+                surveyResults:srm.SurveyResultsMatrix = srm.SurveyResultsMatrix.fromDataFrameChunks(pf.iterViewPartitions(connector, \
+                    getResultsSourceName(cliArguments), cliArguments["parallelism"], \
+                    cliArguments["chunksize"] if cliArguments["fastfetch"] else None, columnGroupViewNames))
+            else:
+                surveyResults:srm.SurveyResultsMatrix = surveyResultsToMatrix(connector, getResultsSourceName(cliArguments), \
+                    cliArguments["chunksize"] if cliArguments["fastfetch"] else None)
+
+        connector.Metrics.AddPhaseValues(rows=len(surveyResults), columns=2 + len(surveyResults.questionIds))
+
+        try:
+            with connector.Metrics.Phase('write'):
+                surveyResults.toCSV(cliArguments["resultsfilepath"], cliArguments["chunksize"])
+            print("\nINFO - Done! Results exported in " + cliArguments["resultsfilepath"] + "\n")
+        except Exception as e:
+            raise Exception('Cannot save results to resultsFilePath', e)
+
+
+def exportIncrementalSurveyResults(connector: dbc.DBConnector, cliArguments:dict, isViewRefreshed:bool) -> None:
+    '''Merges the answers changed since the persisted watermark into the previously exported results,
+    falling back to a full export whenever the watermark cannot be used'''
+
+    #the version is read before extracting, so changes made during the export are picked up again by the next run
+    currentVersion, minValidVersion = ie.getChangeTrackingVersions(connector)
+    watermark:dict = loadWatermark(cliArguments["persistencefilepath"])
+
+    #merging into the previous results is only supported for the csv format
+    isIncrementalPossible:bool = not isViewRefreshed \
+        and cliArguments["format"] == "csv" \
+        and watermark is not None \
+        and watermark.get("resultsfilepath") == cliArguments["resultsfilepath"] \
+        and os.path.exists(cliArguments["resultsfilepath"]) \
+        and ie.isWatermarkUsable(watermark.get("changetrackingversion"), currentVersion, minValidVersion)
+
+    if isIncrementalPossible:
+        try:
+            changedPairs:int = ie.exportIncrementalResults(connector, getSurveyQuestionMembership(connector), \
+                cliArguments["resultsfilepath"], watermark["changetrackingversion"])
+            connector.Metrics.AddPhaseValues(rows=changedPairs)
+            print("\nINFO - Done! " + str(changedPairs) + " changed user answers merged in " + cliArguments["resultsfilepath"] + "\n")
+        except Exception as e:
+            raise Exception('Cannot merge incremental results to resultsFilePath', e)
+    else:
+        print('INFO - Incremental extraction not possible, performing a full export')
+        exportSurveyResults(connector, cliArguments)
+
+    if currentVersion is not None:
+        saveWatermark(cliArguments["persistencefilepath"], \
+            {"changetrackingversion": currentVersion, "resultsfilepath": cliArguments["resultsfilepath"]})
+    else:
+        print('INFO - Change tracking is not enabled on the Answer table, no watermark saved')
+
+
+
+####### RUN METRICS
+
+
+def createRunMetrics(cliArguments:dict) -> rm.RunMetrics:
+    '''Returns empty run metrics labelled with the database and view of the run, to be attached to its connector'''
+    return rm.RunMetrics({"database": cliArguments["dbname"], "view": cliArguments["viewname"]})
+
+
+def getWrittenBytes(resultsFilePath:str) -> int:
+    '''Returns the size of the results file, or of all the files of the results directory when partitioned by survey'''
+    if os.path.isdir(resultsFilePath):
+        return sum(os.path.getsize(os.path.join(directoryPath, fileName)) \
+            for directoryPath, directoryNames, fileNames in os.walk(resultsFilePath) for fileName in fileNames)
+    return os.path.getsize(resultsFilePath) if os.path.exists(resultsFilePath) else 0
+
+
+def saveRunReports(metrics:rm.RunMetrics, cliArguments:dict) -> None:
+    '''Saves the JSON run report and the Prometheus textfile, when asked for. A failure to save them does not fail the run'''
+    try:
+        if cliArguments["runreportfilepath"]:
+            metrics.SaveJSONReport(cliArguments["runreportfilepath"])
+        if cliArguments["prometheusfilepath"]:
+            metrics.SavePrometheusTextfile(cliArguments["prometheusfilepath"])
+    except Exception as excp:
+        print('Problem with saving the run metrics: ' + str(excp))
+
+
+
+####### REFRESH CYCLE
+
+
+def createConnector(cliArguments:dict) -> dbc.DBConnector:
+    '''Returns a MSSQL connector, or a SQLite one on the local database file, (not yet opened) defined with the processed CLI arguments'''
+    if cliArguments["dbengine"] == "sqlite":
+        connector:dbc.DBConnector = sqlite.SQLite_DBConnector(dbfilepath = cliArguments["dbname"], viewname = cliArguments["viewname"])
+    else:
+        connector:dbc.DBConnector = mssql.MSSQL_DBConnector(DSN = cliArguments["dsn"], dbserver = cliArguments["dbserver"], \
+                dbname = cliArguments["dbname"], dbusername = cliArguments["dbusername"], \
+                dbpassword = cliArguments["dbuserpassword"], trustedmode = cliArguments["trustedmode"], \
+                viewname = cliArguments["viewname"])
+
+    #one pooled connection per range partition read concurrently
+    if cliArguments["engine"] == "parallelview" and cliArguments["parallelism"] > 1:
+        connector.ConfigurePool(minSize=1, maxSize=cliArguments["parallelism"])
+
+    return connector
+
+
+def isExportUpToDate(connector: dbc.DBConnector, cliArguments:dict) -> tuple:
+    '''With --skipunchanged, checks whether the Survey Structure, the answers and the export settings are the same as at the last export,
+    whose results are still there, using server-side checksums only so that an unchanged run ends without importing pandas.
+    Returns whether they are, along with the stamp to save once exported (None without --skipunchanged)'''
+
+    if not cliArguments["skipunchanged"]:
+        return False, None
+
+    with connector.Metrics.Phase('change_check'):
+        exportStamp:dict = {"structure": getSurveyStructureChecksum(connector), "answers": getAnswersFingerprint(connector), \
+                            "viewname": cliArguments["viewname"], "materializedtable": cliArguments["materializedtable"], \
+                            "resultsfilepath": cliArguments["resultsfilepath"], "format": cliArguments["format"], \
+                            "partitionbysurvey": cliArguments["partitionbysurvey"], "resultsstorefilepath": cliArguments["resultsstorefilepath"]}
+
+    isUpToDate:bool = exportStamp == loadExportStamp(cliArguments["persistencefilepath"]) \
+        and os.path.exists(cliArguments["resultsfilepath"])
+
+    return isUpToDate, exportStamp
+
+
+def updateExportStamp(cliArguments:dict, exportStamp:dict) -> None:
+    '''Saves the stamp of the export just made, or removes the one of an older export when the run did not take any'''
+    if exportStamp is not None:
+        saveExportStamp(cliArguments["persistencefilepath"], exportStamp)
+    else:
+        removeExportStamp(cliArguments["persistencefilepath"])
+
+
+def refreshSurveyViewIfChanged(connector: dbc.DBConnector, cliArguments:dict) -> bool:
+    '''Replicates the trigger: refreshes the view when the Survey Structure has changed since the previous check.
+    Returns whether the view has been refreshed'''
+
+    bulkStructureFetch:bool = (cliArguments["structurefetch"] == "bulk")
+
+    with connector.Metrics.Phase('view_refresh'):
+
+        #the fingerprint mode only transfers a row count and a hash of the Survey Structure table
+        if cliArguments["changedetection"] == "fingerprint":
+            return refreshViewOnFingerprintChange(connector, cliArguments, bulkStructureFetch)
+
+        #the queue mode only reads the events appended by the dbo.trg_enqueueSurveyViewRefresh trigger
+        if cliArguments["changedetection"] == "queue":
+            return refreshViewOnQueuedEvents(connector, cliArguments, bulkStructureFetch)
+
+        return refreshViewOnDataFrameChange(connector, cliArguments, bulkStructureFetch)
+
+
+def refreshMaterializedResults(connector: dbc.DBConnector, cliArguments:dict, isViewRefreshed:bool) -> None:
+    '''Keeps the materialized results table, if any, in line with the view: rebuilt through a staging table and a swap
+    when the structure changed, merged on the (UserId, SurveyId) pairs whose answers changed otherwise.
+    Without change tracking on the Answer table, the table is rebuilt whenever the answers checksum changed'''
+
+    if not cliArguments["materializedtable"]:
+        return
+
+    with connector.Metrics.Phase('materialization'):
+
+        tableName:str = cliArguments["materializedtable"]
+
+        columnGroups:dict = loadColumnGroups(cliArguments["persistencefilepath"])
+        if cliArguments["viewlayout"] == "single" and columnGroups is not None \
+            and columnGroups.get("viewname") == cliArguments["viewname"] and not columnGroups.get("hastoplevelview", True):
+            raise Exception('The survey is too wide for the ' + cliArguments["viewname"] + ' view, the materialized results table cannot be built from it')
+
+        answersFingerprint:dict = getAnswersFingerprint(connector)
+        materializationState:dict = loadMaterializationState(cliArguments["persistencefilepath"])
+
+        isStateUsable:bool = materializationState is not None \
+            and materializationState.get("table") == tableName \
+            and materializationState.get("viewname") == cliArguments["viewname"] \
+            and mr.doesTableExist(connector, tableName)
+
+        previousFingerprint:dict = materializationState["answersfingerprint"] if isStateUsable else None
+
+        if not isViewRefreshed and previousFingerprint == answersFingerprint:
+            print('INFO - Materialized results table ' + tableName + ' is up to date')
+            return
+
+        #merging needs the structure unchanged and the changes since the last materialization still in the change tracking tables
+        sinceVersion = None if previousFingerprint is None else previousFingerprint.get("changetrackingversion")
+        isMergePossible:bool = not isViewRefreshed and sinceVersion is not None and "changetrackingversion" in answersFingerprint
+
+        if isMergePossible:
+            currentVersion, minValidVersion = ie.getChangeTrackingVersions(connector)
+            isMergePossible = ie.isWatermarkUsable(sinceVersion, currentVersion, minValidVersion)
+
+        if isMergePossible:
+            mr.mergeChangedPairs(connector, cliArguments["viewname"], tableName, sinceVersion)
+            print('INFO - Changed answers merged in the materialized results table ' + tableName)
+        else:
+            mr.rebuildMaterializedTable(connector, cliArguments["viewname"], tableName)
+            print('INFO - Materialized results table ' + tableName + ' rebuilt')
+
+        #the fingerprint was taken first, answers changed meanwhile are merged again by the next refresh
+        saveMaterializationState(cliArguments["persistencefilepath"], \
+            {"table": tableName, "viewname": cliArguments["viewname"], "answersfingerprint": answersFingerprint})
+
+
+def getMembershipHash(membershipDF:pd.DataFrame) -> str:
+    '''Returns a SHA-256 hash of the survey question membership matrix, the structure the stored results were pivoted with'''
+    return hashlib.sha256(json.dumps({"surveys": [int(survey_ID) for survey_ID in membershipDF.index], \
+        "questions": [int(question_ID) for question_ID in membershipDF.columns], \
+        "membership": membershipDF.to_numpy(dtype=bool).astype(int).tolist()}, separators=(',', ':')).encode()).hexdigest()
+
+
+def refreshResultsStore(connector: dbc.DBConnector, cliArguments:dict) -> None:
+    '''Keeps the local results store, if any, in line with the answers, pivoting them on the client side whatever the engine.
+    The store is rebuilt when the list of questions changed, updated from the pairs changed since its last update when the structure is the same
+    and change tracking allows it, and updated in place from all the pivoted answers otherwise, rows being only rewritten when they differ'''
+
+    if not cliArguments["resultsstorefilepath"]:
+        return
+
+    with connector.Metrics.Phase('results_store'):
+
+        #the fingerprint is taken first, answers changed meanwhile are stored again by the next refresh
+        answersFingerprint:dict = getAnswersFingerprint(connector)
+        membershipDF:pd.DataFrame = getSurveyQuestionMembership(connector)
+        storeState:dict = {"answersfingerprint": answersFingerprint, "membershiphash": getMembershipHash(membershipDF)}
+
+        with rs.ResultsStore(cliArguments["resultsstorefilepath"]) as store:
+
+            previousStoreState:dict = store.GetState()
+
+            if store.AnswerColumnNames != spe.getAnswerColumnNames(membershipDF) or previousStoreState is None:
+                storedRows:int = store.ReplaceAll(spe.iterPivotedAnswerChunks(connector, membershipDF, cliArguments["chunksize"]), \
+                    spe.getAnswerColumnNames(membershipDF), storeState)
+                connector.Metrics.AddPhaseValues(rows=storedRows)
+                print('INFO - Results store ' + cliArguments["resultsstorefilepath"] + ' rebuilt with ' + str(storedRows) + ' rows')
+                return
+
+            if previousStoreState == storeState:
+                print('INFO - Results store ' + cliArguments["resultsstorefilepath"] + ' is up to date')
+                return
+
+            #merging needs the same structure and the changes since the last update still in the change tracking tables
+            sinceVersion = previousStoreState["answersfingerprint"].get("changetrackingversion")
+            isMergePossible:bool = previousStoreState["membershiphash"] == storeState["membershiphash"] \
+                and sinceVersion is not None and "changetrackingversion" in answersFingerprint
+
+            if isMergePossible:
+                currentVersion, minValidVersion = ie.getChangeTrackingVersions(connector)
+                isMergePossible = ie.isWatermarkUsable(sinceVersion, currentVersion, minValidVersion)
+
+            if isMergePossible:
+                changedSurveyUsersDF, pivotedDF = ie.getChangedResults(connector, membershipDF, sinceVersion)
+                store.UpdatePairs(changedSurveyUsersDF, pivotedDF, storeState)
+                connector.Metrics.AddPhaseValues(rows=len(changedSurveyUsersDF))
+                print('INFO - ' + str(len(changedSurveyUsersDF)) + ' changed user answers updated in the results store ' + cliArguments["resultsstorefilepath"])
+            else:
+                receivedRows:int = store.UpdateAll(spe.iterPivotedAnswerChunks(connector, membershipDF, cliArguments["chunksize"]), storeState)
+                connector.Metrics.AddPhaseValues(rows=receivedRows)
+                print('INFO - Results store ' + cliArguments["resultsstorefilepath"] + ' updated in place from ' + str(receivedRows) + ' rows')
+
+
+def exportResults(connector: dbc.DBConnector, cliArguments:dict, isViewRefreshed:bool) -> None:
+    '''Saves the refreshed view content (updated pivoted survey answers data) to the given results path.
+    In incremental mode, only the users whose answers changed since the last run are re-pivoted when possible'''
+
+    with connector.Metrics.Phase('export'):
+
+        if cliArguments["incremental"]:
+            exportIncrementalSurveyResults(connector, cliArguments, isViewRefreshed)
+        else:
+            exportSurveyResults(connector, cliArguments)
+
+        connector.Metrics.AddPhaseValues(bytesWritten=getWrittenBytes(cliArguments["resultsfilepath"]))
+
+
+
+####### WATCH MODE
+
+
+strAnswersChecksumQuery: str = 'SELECT COUNT_BIG(*) as AnswerRowCount, CHECKSUM_AGG(BINARY_CHECKSUM(*)) as AnswerChecksum FROM Answer'
+
+
+def getAnswersFingerprint(connector: dbc.DBConnector) -> dict:
+    '''Returns a compact fingerprint of the Answer table used to detect answer changes between two checks:
+    the change tracking version when change tracking is enabled, a server-side row count and checksum otherwise'''
+
+    currentVersion, minValidVersion = ie.getChangeTrackingVersions(connector)
+
+    if currentVersion is not None and minValidVersion is not None:
+        return {"changetrackingversion": currentVersion}
+
+    answerRowCount, answerChecksum = connector.ExecuteQuery_withRow(strAnswersChecksumQuery)
+
+    return {"rowcount": int(answerRowCount), \
+            "checksum": None if answerChecksum is None else int(answerChecksum)}
+
+
+async def getAnswersFingerprintAsync(asyncConnector: adb.AsyncDBConnector, timeout:float) -> dict:
+    '''Returns the same fingerprint as getAnswersFingerprint, each of its queries being cancelled on the server
+    when it runs for more than timeout seconds (e.g. blocked by the locks of a long transaction on Answer)'''
+
+    try:
+        currentVersion, minValidVersion = await asyncConnector.ExecuteQuery_withRow(ie.strChangeTrackingVersionQuery, timeout)
+
+        if currentVersion is not None and minValidVersion is not None:
+            return {"changetrackingversion": int(currentVersion)}
+
+        answerRowCount, answerChecksum = await asyncConnector.ExecuteQuery_withRow(strAnswersChecksumQuery, timeout)
+
+    except asyncio.TimeoutError:
+        raise Exception('The answers check did not complete within ' + str(timeout) + ' seconds and was cancelled')
+
+    return {"rowcount": int(answerRowCount), \
+            "checksum": None if answerChecksum is None else int(answerChecksum)}
+
+
+def watchSurveyAnswers(cliArguments:dict, watchInterval:float, maxBackoff:float = 300.0) -> None:
+    '''Keeps one connection open and checks for structure or answer changes every watchInterval seconds,
+    refreshing the view and exporting the results only when something changed.
+    With a watch timeout, the answers check goes through an AsyncDBConnector on the same connection, so that a check running longer
+    is cancelled on the server and fails the cycle instead of blocking the watch.
+    Reconnects with exponential backoff on failure and stops cleanly on SIGTERM or SIGINT'''
+
+    shutdownRequested:threading.Event = threading.Event()
+
+    def requestShutdown(signalNumber, frame):
+        print('INFO - Shutdown requested, stopping after the current cycle')
+        shutdownRequested.set()
+
+    signal.signal(signal.SIGTERM, requestShutdown)
+    signal.signal(signal.SIGINT, requestShutdown)
+
+    connector:dbc.DBConnector = None
+    lastAnswersFingerprint:dict = None
+    backoff:float = 1.0
+
+    #the event loop running the checks with a timeout, and the async connector of the current connection
+    checkLoop:asyncio.AbstractEventLoop = asyncio.new_event_loop() if cliArguments["watchtimeout"] is not None else None
+    asyncConnector:adb.AsyncDBConnector = None
+
+    def closeConnection() -> None:
+        #the async connector closes the connection once the check it may have abandoned is over
+        if asyncConnector is not None:
+            checkLoop.run_until_complete(asyncConnector.Close())
+        if connector.IsConnected:
+            connector.Close()
+
+    while not shutdownRequested.is_set():
+
+        #each cycle is reported on its own, the reports of the last one being kept
+        metrics:rm.RunMetrics = createRunMetrics(cliArguments)
+
+        try:
+
+            if connector is None or not connector.IsConnected:
+                connector = createConnector(cliArguments)
+                connector.AttachMetrics(metrics)
+                with metrics.Phase('connect'):
+                    connector.Open()
+                if checkLoop is not None:
+                    asyncConnector = adb.AsyncDBConnector(connector, maxConcurrency=1)
+                print('INFO - Connected to ' + cliArguments["dbname"])
+
+            connector.AttachMetrics(metrics)
+
+            isViewRefreshed:bool = refreshSurveyViewIfChanged(connector, cliArguments)
+
+            #the fingerprint is taken before the export, so answers changed during the export are exported by the next cycle
+            with metrics.Phase('answers_check'):
+                if asyncConnector is not None:
+                    answersFingerprint:dict = checkLoop.run_until_complete(getAnswersFingerprintAsync(asyncConnector, cliArguments["watchtimeout"]))
+                else:
+                    answersFingerprint = getAnswersFingerprint(connector)
+
+            isExported:bool = isViewRefreshed or answersFingerprint != lastAnswersFingerprint
+
+            if isExported:
+                refreshMaterializedResults(connector, cliArguments, isViewRefreshed)
+                exportResults(connector, cliArguments, isViewRefreshed)
+                refreshResultsStore(connector, cliArguments)
+                lastAnswersFingerprint = answersFingerprint
+            else:
+                print('INFO - Answers haven''t been modified!')
+
+            metrics.SetOutcome(True, viewrefreshed=isViewRefreshed, exported=isExported)
+            saveRunReports(metrics, cliArguments)
+
+            backoff = 1.0
+
+        except Exception as excp:
+
+            metrics.SetOutcome(False, excp)
+            saveRunReports(metrics, cliArguments)
+
+            print(excp)
+            print('INFO - Reconnecting in ' + str(backoff) + ' seconds')
+
+            if connector is not None:
+                try:
+                    closeConnection()
+                except Exception as closeExcp:
+                    pass
+                connector = None
+                asyncConnector = None
+
+            shutdownRequested.wait(backoff)
+            backoff = min(backoff * 2, maxBackoff)
+            continue
+
+        shutdownRequested.wait(watchInterval)
+
+    if connector is not None:
+        closeConnection()
+    if checkLoop is not None:
+        checkLoop.close()
+
+    print('INFO - Watch mode stopped')
+
+
+
+####### BATCH MODE
+
+
+def loadBatchTargets(jobsFilePath:str, cliArguments:dict) -> list:
+    '''Reads the JSON job config file and returns one argument dictionary per target, shaped like the processed CLI arguments.
+    Each entry of "targets" is laid over the optional "defaults" section, itself laid over the command line arguments'''
+
+    with open(jobsFilePath, 'r') as handle:
+        jobsConfig:dict = json.load(handle)
+
+    obfuscator:ce.ContentObfuscation = ce.ContentObfuscation()
+    batchOnlyKeys:set = {"jobsfilepath", "workers", "jobexecutor", "watch", "watchtimeout"}
+    allowedKeys:set = (set(cliArguments.keys()) - batchOnlyKeys) | {"name"}
+    requiredKeys:tuple = ("dbname", "viewname", "persistencefilepath", "resultsfilepath")
+
+    defaults:dict = jobsConfig.get("defaults", {})
+    targets:list = []
+
+    for position, targetConfig in enumerate(jobsConfig.get("targets", [])):
+
+        unknownKeys:set = (set(defaults.keys()) | set(targetConfig.keys())) - allowedKeys
+        if unknownKeys:
+            raise Exception('Unknown keys in the job config file: ' + ', '.join(sorted(unknownKeys)))
+
+        target:dict = {**cliArguments, **defaults, **targetConfig}
+
+        #passwords are written in clear in the job config file, they are obfuscated in memory like the CLI one
+        if "dbuserpassword" in defaults or "dbuserpassword" in targetConfig:
+            target["dbuserpassword"] = obfuscator.obfuscate(target["dbuserpassword"])
+
+        for key in requiredKeys:
+            if not target.get(key):
+                raise Exception('Missing ' + key + ' for the target #' + str(position + 1) + ' of the job config file')
+        if not target.get("dbserver") and not target.get("dsn") and target.get("dbengine") != "sqlite":
+            raise Exception('Missing dbserver or dsn for the target #' + str(position + 1) + ' of the job config file')
+
+        target["name"] = str(target.get("name") or target["dbname"])
+        target["watch"] = None
+        target["watchtimeout"] = None
+        targets.append(target)
+
+    if not targets:
+        raise Exception('No target found in the job config file ' + jobsFilePath)
+
+    #concurrent targets must never write to the same files
+    for key in ("name", "persistencefilepath", "resultsfilepath", "runreportfilepath", "prometheusfilepath", "resultsstorefilepath"):
+        values:list = [os.path.abspath(target[key]) if key != "name" else target[key] for target in targets if target[key]]
+        if len(set(values)) != len(values):
+            raise Exception('Each target of the job config file needs its own ' + key)
+
+    return targets
+
+
+def refreshBatchTarget(target:dict) -> dict:
+    '''Runs one refresh cycle (view refresh if needed, then results export) for a batch target on its own connection.
+    Never raises: returns the outcome of the target with its timings in seconds'''
+
+    outcome:dict = {"name": target["name"], "status": "failed", "viewrefreshed": None, \
+                    "connect": None, "refresh": None, "export": None, "total": None, "error": None}
+    connector:dbc.DBConnector = None
+    metrics:rm.RunMetrics = createRunMetrics(target)
+    startTime:float = time.perf_counter()
+
+    try:
+        phaseStartTime:float = time.perf_counter()
+        connector = createConnector(target)
+        connector.AttachMetrics(metrics)
+        with metrics.Phase('connect'):
+            connector.Open()
+        outcome["connect"] = time.perf_counter() - phaseStartTime
+
+        phaseStartTime = time.perf_counter()
+        isUpToDate, exportStamp = isExportUpToDate(connector, target)
+
+        if not isUpToDate:
+            outcome["viewrefreshed"] = refreshSurveyViewIfChanged(connector, target)
+            refreshMaterializedResults(connector, target, outcome["viewrefreshed"])
+            outcome["refresh"] = time.perf_counter() - phaseStartTime
+
+            phaseStartTime = time.perf_counter()
+            exportResults(connector, target, outcome["viewrefreshed"])
+            refreshResultsStore(connector, target)
+            updateExportStamp(target, exportStamp)
+            outcome["export"] = time.perf_counter() - phaseStartTime
+        else:
+            outcome["viewrefreshed"] = False
+            outcome["refresh"] = time.perf_counter() - phaseStartTime
+
+        outcome["status"] = "succeeded"
+
+    except Exception as excp:
+        outcome["error"] = str(excp)
+
+    finally:
+        if connector is not None and connector.IsConnected:
+            try:
+                with metrics.Phase('close'):
+                    connector.Close()
+            except Exception as excp:
+                pass
+        outcome["total"] = time.perf_counter() - startTime
+
+        metrics.SetOutcome(outcome["status"] == "succeeded", outcome["error"], viewrefreshed=outcome["viewrefreshed"])
+        saveRunReports(metrics, target)
+
+    return outcome
+
+
+def printBatchSummary(outcomes:list, elapsedTime:float) -> None:
+    '''Prints the per-target outcomes and timings of a batch run'''
+
+    summaryDF:pd.DataFrame = pd.DataFrame(outcomes, columns=["name", "status", "viewrefreshed", "connect", "refresh", "export", "total", "error"])
+
+    print("\n####### BATCH SUMMARY\n")
+    print(summaryDF.to_string(index=False, na_rep='-', float_format=lambda seconds: '{:.2f}s'.format(seconds)))
+    print("\n" + str((summaryDF["status"] == "succeeded").sum()) + "/" + str(len(summaryDF)) + " targets succeeded in " \
+          + '{:.2f}s'.format(elapsedTime) + " (" + '{:.2f}s'.format(summaryDF["total"].sum()) + " if run one after another)")
+
+
+def runBatchRefresh(cliArguments:dict) -> list:
+    '''Refreshes all the targets of the job config file concurrently, at most cliArguments["workers"] at a time,
+    on a thread or process pool, then prints the per-target summary. Returns the outcomes in the job config file order'''
+
+    targets:list = loadBatchTargets(cliArguments["jobsfilepath"], cliArguments)
+
+    #pyodbc releases the GIL while waiting on the server, threads are enough unless the client-side pivot dominates
+    executorClass = cf.ProcessPoolExecutor if cliArguments["jobexecutor"] == "process" else cf.ThreadPoolExecutor
+
+    outcomes:list = [None] * len(targets)
+    startTime:float = time.perf_counter()
+
+    with executorClass(max_workers=min(cliArguments["workers"], len(targets))) as executor:
+
+        futurePositions:dict = {executor.submit(refreshBatchTarget, target): position for position, target in enumerate(targets)}
+
+        for future in cf.as_completed(futurePositions):
+            position:int = futurePositions[future]
+            try:
+                outcomes[position] = future.result()
+            except Exception as excp:
+                #only reached when the worker itself died, e.g. a broken process pool
+                outcomes[position] = {"name": targets[position]["name"], "status": "failed", "error": str(excp)}
+            print('INFO - ' + outcomes[position]["name"] + ' ' + outcomes[position]["status"])
+
+    printBatchSummary(outcomes, time.perf_counter() - startTime)
+
+    return outcomes
+
+
+
+####### MAIN FUNCTION
+
+def main():
+    
+    cliArguments:dict = None
+
+    printSplashScreen()    
+
+    #take connection arguments from the CLI
+    try:
+        cliArguments = cli.processCLIArguments()
+    except Exception as excp:
+        print("Exiting")
+        return
+
+    if(cliArguments is not None):
+
+        try:
+
+            #batch mode refreshing the targets of a job config file concurrently
+            if cliArguments["jobsfilepath"] is not None:
+                runBatchRefresh(cliArguments)
+                return
+
+            #long-running mode reusing one connection across refresh cycles
+            if cliArguments["watch"] is not None:
+                watchSurveyAnswers(cliArguments, cliArguments["watch"])
+                return
+
+            #define MSSQL connection with processed CLI arguments
+            connector = createConnector(cliArguments)
+
+            #time each phase of the run and every query it executes
+            metrics:rm.RunMetrics = createRunMetrics(cliArguments)
+            connector.AttachMetrics(metrics)
+
+            try:
+
+                #open MSSQL connection
+                with metrics.Phase('connect'):
+                    connector.Open()
+
+                #with --skipunchanged, a run finding nothing changed since the last export ends here
+                isUpToDate, exportStamp = isExportUpToDate(connector, cliArguments)
+                isViewRefreshed:bool = False
+
+                if isUpToDate:
+                    print('INFO - Neither the Survey Structure nor the answers changed since the last export, nothing to refresh')
+
+                else:
+                    #keeps track of a view refresh, in which case previously exported results cannot be reused
+                    isViewRefreshed = refreshSurveyViewIfChanged(connector, cliArguments)
+
+                    #keep the materialized results table, if any, in line with the view
+                    refreshMaterializedResults(connector, cliArguments, isViewRefreshed)
+
+                    #save the refreshed view content (updated pivoted survey answers data) to the given results path
+                    exportResults(connector, cliArguments, isViewRefreshed)
+
+                    #keep the local results store, if any, in line with the answers
+                    refreshResultsStore(connector, cliArguments)
+                    updateExportStamp(cliArguments, exportStamp)
+              
+                #close MSSQL connection
+                with metrics.Phase('close'):
+                    connector.Close()
+
+                metrics.SetOutcome(True, viewrefreshed=isViewRefreshed, exported=not isUpToDate)
+
+            except Exception as excp:
+                metrics.SetOutcome(False, excp)
+                raise
+
+            finally:
+                saveRunReports(metrics, cliArguments)
 
         except Exception as excp:
             print(excp)
@@ -0,0 +1,92 @@
+import json
+import os
+import sys
+
+import pytest
+
+#the scripts of the repository root are imported as modules by the tests
+repositoryPath:str = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if repositoryPath not in sys.path:
+    sys.path.insert(0, repositoryPath)
+
+import refresh_survey_answers as rsa
+import myTools.CLIArgumentParser as cli
+from myTools import SyntheticSurveyData as ssd
+
+
+sampleResultsFilePath:str = os.path.join(repositoryPath, 'extracted-vw_AllSurveyData.csv')
+
+
+@pytest.fixture
+def sampleDatabase(tmp_path) -> str:
+    '''SQLite survey database rebuilt from the sample results file, so that the pipeline run against it exports the sample again'''
+    databaseFilePath:str = str(tmp_path / 'sample.db')
+    ssd.createSurveyDatabaseFromResults(databaseFilePath, sampleResultsFilePath)
+    return databaseFilePath
+
+
+@pytest.fixture
+def smallDatabase(tmp_path) -> str:
+    '''Small random SQLite survey database, for the runs reading views SQLite cannot index (e.g. joins of views)'''
+    databaseFilePath:str = str(tmp_path / 'small.db')
+    ssd.generateSurveyDatabase(databaseFilePath, surveyCount=3, questionCount=5, questionsPerSurvey=3, userCount=200, seed=1)
+    return databaseFilePath
+
+
+@pytest.fixture
+def fullDatabase(tmp_path) -> str:
+    '''Random SQLite survey database whose surveys all hold every question, so that the pivoted results hold no NULL'''
+    databaseFilePath:str = str(tmp_path / 'full.db')
+    ssd.generateSurveyDatabase(databaseFilePath, surveyCount=3, questionCount=4, questionsPerSurvey=4, userCount=300, seed=2)
+    return databaseFilePath
+
+
+@pytest.fixture
+def cliArguments(monkeypatch, tmp_path):
+    '''Returns a function processing the command line of a run on a SQLite database, with its state and results under tmp_path'''
+
+    def getCLIArguments(databaseFilePath: str, *extraArguments: str, resultsFileName: str = 'results.csv') -> dict:
+        monkeypatch.setattr(sys, 'argv', ['refresh_survey_answers.py', '--dbengine', 'sqlite', '-d', databaseFilePath, '-v', 'vw_AllSurveyData', \
+            '-f', str(tmp_path / 'state' / 'survey.pickle'), '-r', str(tmp_path / resultsFileName), *extraArguments])
+        os.makedirs(str(tmp_path / 'state'), exist_ok=True)
+        return cli.processCLIArguments()
+
+    return getCLIArguments
+
+
+@pytest.fixture
+def runRefresh(cliArguments, tmp_path):
+    '''Returns a function running refresh_survey_answers.py once on a SQLite database and returning its processed arguments.
+    main() prints the errors of a run instead of raising them, the run report tells whether it succeeded'''
+
+    def runRefreshOnce(databaseFilePath: str, *extraArguments: str, resultsFileName: str = 'results.csv') -> dict:
+        runReportFilePath:str = str(tmp_path / 'state' / 'run.json')
+        processedArguments:dict = cliArguments(databaseFilePath, '--runreport', runReportFilePath, *extraArguments, resultsFileName=resultsFileName)
+        rsa.main()
+        with open(runReportFilePath, 'r') as runReportFile:
+            runReport:dict = json.load(runReportFile)
+        assert runReport["status"] == 'succeeded', runReport["error"]
+        os.remove(runReportFilePath)
+        return processedArguments
+
+    return runRefreshOnce
+
+
+@pytest.fixture
+def openConnector():
+    '''Returns a function opening a connector on the database of processed CLI arguments, closed at the end of the test'''
+
+    openedConnectors:list = []
+
+    def openConnectorOnce(processedArguments: dict):
+        connector = rsa.createConnector(processedArguments)
+        connector.AttachMetrics(rsa.createRunMetrics(processedArguments))
+        connector.Open()
+        openedConnectors.append(connector)
+        return connector
+
+    yield openConnectorOnce
+
+    for connector in openedConnectors:
+        if connector.IsConnected:
+            connector.Close()
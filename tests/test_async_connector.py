@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+import refresh_survey_answers as rsa
+from myTools import AsyncDBConnector as adb
+
+
+#a query running for about a second on SQLite
+slowQuery:str = 'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 3000000) SELECT COUNT(*) FROM n'
+
+
+def test_asyncQueriesAreRecorded(smallDatabase, cliArguments, openConnector):
+    connector = openConnector(cliArguments(smallDatabase))
+    asyncConnector:adb.AsyncDBConnector = adb.AsyncDBConnector(connector, maxConcurrency=1)
+
+    async def runQueries() -> list:
+        chunkSizes:list = [len(chunkDF) async for chunkDF in asyncConnector.ExecuteQuery_withRSChunks('SELECT * FROM Survey', 2)]
+        return [len(await asyncConnector.ExecuteQuery_withRS('SELECT * FROM Answer')), \
+                await asyncConnector.ExecuteQuery_withRow('SELECT COUNT(*) FROM Survey'), chunkSizes]
+
+    answerRows, surveyRow, chunkSizes = asyncio.run(runQueries())
+
+    queriesByMethod:dict = connector.Metrics.ToDict()["queries"]["bymethod"]
+    assert queriesByMethod["ExecuteQuery_withRS"]["rows"] == answerRows
+    assert queriesByMethod["ExecuteQuery_withRow"]["rows"] == 1 and surveyRow == (3,)
+    assert queriesByMethod["ExecuteQuery_withRSChunks"]["rows"] == sum(chunkSizes) == 3
+
+
+def test_watchCheckMatchesAndTimesOut(smallDatabase, cliArguments, openConnector):
+    connector = openConnector(cliArguments(smallDatabase))
+    checkLoop:asyncio.AbstractEventLoop = asyncio.new_event_loop()
+    asyncConnector:adb.AsyncDBConnector = adb.AsyncDBConnector(connector, maxConcurrency=1)
+
+    try:
+        assert checkLoop.run_until_complete(rsa.getAnswersFingerprintAsync(asyncConnector, 10.0)) == rsa.getAnswersFingerprint(connector)
+
+        #the check loop and its async connector outlive a timed out query, as in watch mode
+        with pytest.raises(asyncio.TimeoutError):
+            checkLoop.run_until_complete(asyncConnector.ExecuteQuery_withRow(slowQuery, 0.05))
+        assert connector.Metrics.ToDict()["queries"]["bymethod"]["ExecuteQuery_withRow"]["failed"] == 1
+
+        #without a pool, the next check runs on a reopened connection rather than on the one of the cancelled statement
+        timedOutConduit = connector._dbConduit
+        assert checkLoop.run_until_complete(rsa.getAnswersFingerprintAsync(asyncConnector, 10.0)) == rsa.getAnswersFingerprint(connector)
+        assert connector._dbConduit is not timedOutConduit
+    finally:
+        checkLoop.run_until_complete(asyncConnector.Close())
+        checkLoop.close()
@@ -0,0 +1,23 @@
+import pandas as pd
+
+import refresh_survey_answers as rsa
+
+
+def test_joinViewListsEveryColumn():
+    questionsInSurveys:dict = {1: [(1, True), (2, True), (4, False)], 2: [(1, False), (2, True), (4, True)]}
+    viewQueries:list = rsa.buildViewQueries(questionsInSurveys, 'coalesce', 'vw_AllSurveyData', 2)
+
+    assert [viewName for viewName, viewQuery in viewQueries] == ['vw_AllSurveyData_C1', 'vw_AllSurveyData_C2', 'vw_AllSurveyData']
+    #a SELECT * join view would keep the columns of the column group views it was created with
+    assert '*' not in viewQueries[-1][1]
+    assert viewQueries[-1][1].startswith(' SELECT c1.UserId , c1.SurveyId , c1.ANS_Q1 , c1.ANS_Q2 , c2.ANS_Q4 FROM ')
+
+
+def test_columnGroupViewsExportTheSameRows(smallDatabase, runRefresh, tmp_path):
+    runRefresh(smallDatabase, resultsFileName='single.csv')
+    runRefresh(smallDatabase, '--maxviewcolumns', '2', resultsFileName='split.csv')
+
+    #the join of the column group views gives the rows of the single view, in another order
+    singleDF:pd.DataFrame = pd.read_csv(str(tmp_path / 'single.csv'), index_col=0).sort_values(['SurveyId', 'UserId'], ignore_index=True)
+    splitDF:pd.DataFrame = pd.read_csv(str(tmp_path / 'split.csv'), index_col=0).sort_values(['SurveyId', 'UserId'], ignore_index=True)
+    pd.testing.assert_frame_equal(splitDF, singleDF)
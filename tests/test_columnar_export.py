@@ -0,0 +1,52 @@
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from myTools import ColumnarExport as cx
+
+
+columnNames:list = ['UserId', 'SurveyId', 'ANS_Q1', 'ANS_Q2']
+
+
+def getResultsChunk(surveyIds: list) -> pd.DataFrame:
+    return pd.DataFrame({'UserId': list(range(1, len(surveyIds) + 1)), 'SurveyId': surveyIds, 'ANS_Q1': [-1] * len(surveyIds), \
+                         'ANS_Q2': [None] * len(surveyIds)})
+
+
+@pytest.mark.parametrize('fileFormat, compression', [('feather', 'none'), ('parquet', 'none'), ('feather', 'lz4'), ('parquet', 'snappy')])
+def test_exportWritesWithEveryCompression(tmp_path, fileFormat, compression):
+    resultsPath:str = str(tmp_path / ('results.' + fileFormat))
+    assert cx.exportResultsToColumnar([getResultsChunk([1, 2])], resultsPath, fileFormat, columnNames, compression) == 2
+    assert len(pd.read_parquet(resultsPath) if fileFormat == 'parquet' else pd.read_feather(resultsPath)) == 2
+
+
+def test_featherRejectsParquetCodecs(smallDatabase, cliArguments, capsys):
+    with pytest.raises(SystemExit):
+        cliArguments(smallDatabase, '--format', 'feather', '--compression', 'snappy')
+    assert 'supports the compressions: none, lz4, zstd' in capsys.readouterr().err
+
+
+def test_emptyResultsReplacePreviousFile(tmp_path):
+    resultsPath:str = str(tmp_path / 'results.parquet')
+    cx.exportResultsToColumnar([getResultsChunk([1, 2])], resultsPath, 'parquet', columnNames)
+
+    assert cx.exportResultsToColumnar([], resultsPath, 'parquet', columnNames) == 0
+    assert pq.read_schema(resultsPath).names == columnNames
+    assert pq.read_metadata(resultsPath).num_rows == 0
+    assert os.listdir(str(tmp_path)) == ['results.parquet']
+
+
+def test_partitionsOfSurveysWithoutRowsAreRemoved(tmp_path):
+    resultsPath:str = str(tmp_path / 'results')
+    cx.exportResultsToColumnar([getResultsChunk([1, 2, 3])], resultsPath, 'parquet', columnNames, partitionBySurvey=True)
+    assert sorted(os.listdir(resultsPath)) == ['SurveyId_1.parquet', 'SurveyId_2.parquet', 'SurveyId_3.parquet', '_common_metadata']
+
+    cx.exportResultsToColumnar([getResultsChunk([2])], resultsPath, 'parquet', columnNames, partitionBySurvey=True)
+    assert sorted(os.listdir(resultsPath)) == ['SurveyId_2.parquet', '_common_metadata']
+
+    cx.exportResultsToColumnar([], resultsPath, 'parquet', columnNames, partitionBySurvey=True)
+    assert os.listdir(resultsPath) == ['_common_metadata']
+    assert pq.read_schema(os.path.join(resultsPath, '_common_metadata')).names == columnNames
+    assert os.listdir(str(tmp_path)) == ['results']
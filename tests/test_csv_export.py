@@ -0,0 +1,81 @@
+import io
+
+import pandas as pd
+
+from myTools.CSVExport import CSVBatchWriter
+
+
+def readFile(filePath: str) -> str:
+    with open(filePath, 'r') as readFile:
+        return readFile.read()
+
+
+def writeBatches(filePath: str, batchDFs: list, nullColumnNames: list = None) -> None:
+    rowOffset:int = 0
+    with CSVBatchWriter(filePath, nullColumnNames) as writer:
+        for batchDF in batchDFs:
+            batchDF.index = pd.RangeIndex(rowOffset, rowOffset + len(batchDF))
+            rowOffset += len(batchDF)
+            writer.Write(batchDF)
+
+
+def getBatches(records: list, columnNames: list, batchSize: int) -> list:
+    '''Splits the records of a result set into dataframe batches typed as ExportQuery_toCSV types its fetched batches'''
+    return [pd.DataFrame.from_records(records[position:position + batchSize], columns=columnNames) for position in range(0, len(records), batchSize)]
+
+
+def getWholeCSV(records: list, columnNames: list) -> str:
+    '''CSV text pandas writes for the whole result set, typed as pd.read_sql types it'''
+    csvBuffer:io.StringIO = io.StringIO()
+    pd.DataFrame.from_records(records, columns=columnNames, coerce_float=True).to_csv(csvBuffer)
+    return csvBuffer.getvalue()
+
+
+def test_writerKeepsIntegersWithoutNulls(tmp_path):
+    records:list = [(1, -1), (2, 2), (3, 5)]
+    writeBatches(str(tmp_path / 'results.csv'), getBatches(records, ['UserId', 'ANS_Q1'], 2))
+    assert readFile(str(tmp_path / 'results.csv')) == getWholeCSV(records, ['UserId', 'ANS_Q1']) == ',UserId,ANS_Q1\n0,1,-1\n1,2,2\n2,3,5\n'
+
+
+def test_writerRewritesIntegersWrittenBeforeTheFirstNull(tmp_path):
+    columnNames:list = ['UserId', 'ANS_Q1', 'ANS_Q2', 'ANS_Q3', 'Label']
+    records:list = [(1, -1, 2**60, None, 'a,b'), (2, 2, 10**16, None, 'c"d'), (3, 7, 5, None, 'e'), (4, 8, 6, 1, None), \
+                    (5, None, 3, 2, 'f'), (6, 1, 4, None, 'g\nh'), (7, 4, None, 3, 'i')]
+    writeBatches(str(tmp_path / 'results.csv'), getBatches(records, columnNames, 2))
+    assert readFile(str(tmp_path / 'results.csv')) == getWholeCSV(records, columnNames)
+    assert not (tmp_path / 'results.csv.rewrite').exists()
+
+
+def test_writerWritesKnownNullColumnsAsFloats(tmp_path):
+    records:list = [(1, -1), (2, 2), (3, None)]
+    writeBatches(str(tmp_path / 'results.csv'), getBatches(records, ['UserId', 'ANS_Q1'], 2), ['ANS_Q1'])
+    assert readFile(str(tmp_path / 'results.csv')) == getWholeCSV(records, ['UserId', 'ANS_Q1'])
+
+
+def test_streamedViewMatchesViewWithoutNulls(fullDatabase, runRefresh, tmp_path):
+    runRefresh(fullDatabase, '--engine', 'view', resultsFileName='view.csv')
+    runRefresh(fullDatabase, '--engine', 'streamedview', '--chunksize', '50', resultsFileName='streamedview.csv')
+
+    #no survey leaves out a question, pd.read_sql types every answer column as int64
+    assert '.0' not in readFile(str(tmp_path / 'view.csv'))
+    assert readFile(str(tmp_path / 'streamedview.csv')) == readFile(str(tmp_path / 'view.csv'))
+
+
+def test_streamedViewMatchesViewWithNulls(sampleDatabase, runRefresh, tmp_path):
+    runRefresh(sampleDatabase, '--engine', 'view', resultsFileName='view.csv')
+    runRefresh(sampleDatabase, '--engine', 'streamedview', '--chunksize', '100', resultsFileName='streamedview.csv')
+
+    assert '.0' in readFile(str(tmp_path / 'view.csv'))
+    assert readFile(str(tmp_path / 'streamedview.csv')) == readFile(str(tmp_path / 'view.csv'))
+
+
+def test_exportQueryFindsNullsAcrossBatches(sampleDatabase, runRefresh, openConnector, tmp_path):
+    processedArguments:dict = runRefresh(sampleDatabase)
+    connector = openConnector(processedArguments)
+
+    #ordered by survey, the NULLs of a question outside of the last surveys only come after integers were written
+    resultsQuery:str = ' SELECT * FROM vw_AllSurveyData ORDER BY SurveyId DESC, UserId '
+    connector.ExportQuery_toCSV(resultsQuery, str(tmp_path / 'streamed.csv'), 100)
+    connector.ExecuteQuery_withRS(resultsQuery).to_csv(str(tmp_path / 'whole.csv'))
+
+    assert readFile(str(tmp_path / 'streamed.csv')) == readFile(str(tmp_path / 'whole.csv'))
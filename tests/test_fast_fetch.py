@@ -0,0 +1,30 @@
+import pandas as pd
+import pytest
+
+
+viewResultsQuery:str = 'SELECT * FROM vw_AllSurveyData ORDER BY SurveyId, UserId'
+
+
+@pytest.mark.parametrize('batchSize', [7, 50000])
+def test_fastFetchMatchesReadSQL(smallDatabase, runRefresh, openConnector, batchSize):
+    connector = openConnector(runRefresh(smallDatabase, '--engine', 'view'))
+
+    readSQLDF:pd.DataFrame = connector.ExecuteQuery_withRS(viewResultsQuery)
+    assert (readSQLDF.dtypes == 'float64').any() and (readSQLDF.dtypes == 'int64').any()
+    pd.testing.assert_frame_equal(connector.ExecuteQuery_withRSFast(viewResultsQuery, batchSize), readSQLDF)
+
+
+def test_columnsAreDecodedCompact(smallDatabase, runRefresh, openConnector):
+    connector = openConnector(runRefresh(smallDatabase, '--engine', 'view'))
+
+    readSQLDF:pd.DataFrame = connector.ExecuteQuery_withRS(viewResultsQuery)
+    resultColumns:dict = connector.ExecuteQuery_withRSColumns(viewResultsQuery, 7)
+
+    assert list(resultColumns) == list(readSQLDF.columns)
+    for columnName, (columnBuffer, validityMask) in resultColumns.items():
+        #the answer codes and the keys of the small database fit in 8 and 16 bits
+        assert columnBuffer.dtype == ('int16' if columnName == 'UserId' else 'int8')
+        assert (validityMask is None) == (readSQLDF[columnName].dtype == 'int64')
+        if validityMask is not None:
+            assert (validityMask == readSQLDF[columnName].notna().to_numpy()).all()
+            assert (columnBuffer[validityMask] == readSQLDF[columnName][validityMask]).all()
@@ -0,0 +1,55 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+import refresh_survey_answers as rsa
+from myTools import IncrementalExtraction as ie
+from myTools import SurveyPivotEngine as spe
+
+
+def readFile(filePath: str) -> str:
+    with open(filePath, 'r') as readFile:
+        return readFile.read()
+
+
+def changeAnswers(databaseFilePath: str) -> pd.DataFrame:
+    '''Updates the answers of one (UserId, SurveyId) pair, deletes those of another and answers a survey for a new pair,
+    the way change tracking would report them. Returns the changed pairs'''
+    conduit:sqlite3.Connection = sqlite3.connect(databaseFilePath)
+    try:
+        updatedPair:tuple = conduit.execute('SELECT MIN(UserId), 1 FROM Answer WHERE SurveyId = 1').fetchone()
+        deletedPair:tuple = conduit.execute('SELECT MAX(UserId), 2 FROM Answer WHERE SurveyId = 2').fetchone()
+        addedPair:tuple = conduit.execute('SELECT MIN(UserId), 3 FROM [User] as u ' \
+            + 'WHERE NOT EXISTS (SELECT * FROM Answer as a WHERE a.UserId = u.UserId AND a.SurveyId = 3)').fetchone()
+
+        conduit.execute('UPDATE Answer SET Answer_Value = Answer_Value + 1 WHERE UserId = ? AND SurveyId = ?', updatedPair)
+        conduit.execute('DELETE FROM Answer WHERE UserId = ? AND SurveyId = ?', deletedPair)
+        conduit.execute('INSERT INTO Answer (QuestionId, SurveyId, UserId, Answer_Value) ' \
+            + 'SELECT MIN(QuestionId), SurveyId, ?, 4 FROM SurveyStructure WHERE SurveyId = ?', addedPair)
+        conduit.commit()
+    finally:
+        conduit.close()
+    return pd.DataFrame([updatedPair, deletedPair, addedPair], columns=['UserId', 'SurveyId'])
+
+
+@pytest.mark.parametrize('engine', ['client', 'view'])
+def test_mergeGivesTheFullExport(smallDatabase, runRefresh, openConnector, monkeypatch, tmp_path, engine):
+    runRefresh(smallDatabase, '--engine', engine, resultsFileName='merged.csv')
+    changedSurveyUsersDF:pd.DataFrame = changeAnswers(smallDatabase)
+    processedArguments:dict = runRefresh(smallDatabase, '--engine', 'client', resultsFileName='full.csv')
+
+    connector = openConnector(processedArguments)
+    membershipDF:pd.DataFrame = rsa.getSurveyQuestionMembership(connector)
+    answersDF:pd.DataFrame = connector.ExecuteQuery_withRS(spe.strRawAnswersQuery)
+    changedKeys:pd.MultiIndex = pd.MultiIndex.from_frame(changedSurveyUsersDF)
+    changedAnswersDF:pd.DataFrame = answersDF[pd.MultiIndex.from_frame(answersDF[['UserId', 'SurveyId']]).isin(changedKeys)]
+
+    #small chunks, so that the re-pivoted rows are spliced between chunks of the previous file
+    monkeypatch.setattr(ie, '_mergeChunkSize', 7)
+    ie.mergeChangedResults(str(tmp_path / 'merged.csv'), changedSurveyUsersDF, spe.pivotAnswerChunk(changedAnswersDF, membershipDF), \
+                           spe.getNullAnswerColumnNames(connector, membershipDF))
+
+    #the view of SQLite is not in (SurveyId, UserId) order, the merge puts its rows in the order of the client export
+    assert readFile(str(tmp_path / 'merged.csv')) == readFile(str(tmp_path / 'full.csv'))
+    assert not (tmp_path / 'merged.csv.merge').exists()
@@ -0,0 +1,42 @@
+import pandas as pd
+import pytest
+
+from myTools import SurveyPivotEngine as spe
+
+from conftest import sampleResultsFilePath
+
+
+def readFile(filePath: str) -> str:
+    with open(filePath, 'r') as readFile:
+        return readFile.read()
+
+
+def test_pivotAnswerChunkTypesColumnsAsTheView():
+    membershipDF:pd.DataFrame = pd.DataFrame([[True, True], [True, False]], index=pd.Index([1, 2], name='SurveyId'), columns=[1, 2])
+    answersDF:pd.DataFrame = pd.DataFrame({'UserId': [1, 1, 2], 'SurveyId': [1, 1, 2], 'QuestionId': [1, 2, 1], 'Answer_Value': [3, 4, 5]})
+
+    pivotedDF:pd.DataFrame = spe.pivotAnswerChunk(answersDF, membershipDF)
+    assert pivotedDF['ANS_Q1'].dtype == 'int64'
+    assert pivotedDF['ANS_Q2'].dtype == 'float64'
+
+    #in a chunk of the first survey only, the column holds no NULL
+    assert spe.pivotAnswerChunk(answersDF[:2], membershipDF)['ANS_Q2'].dtype == 'int64'
+
+
+@pytest.mark.parametrize('engine', ['streamedview', 'client', 'parallelclient'])
+def test_enginesMatchViewWithoutNulls(fullDatabase, runRefresh, tmp_path, engine):
+    runRefresh(fullDatabase, '--engine', 'view', resultsFileName='view.csv')
+    runRefresh(fullDatabase, '--engine', engine, '--chunksize', '50', resultsFileName=engine + '.csv')
+
+    #no survey leaves out a question, every answer column is written as integers
+    assert '.0' not in readFile(str(tmp_path / 'view.csv'))
+    viewDF:pd.DataFrame = pd.read_csv(str(tmp_path / 'view.csv'), index_col=0).sort_values(['SurveyId', 'UserId'], ignore_index=True)
+    engineDF:pd.DataFrame = pd.read_csv(str(tmp_path / (engine + '.csv')), index_col=0).sort_values(['SurveyId', 'UserId'], ignore_index=True)
+    pd.testing.assert_frame_equal(engineDF, viewDF)
+    assert '.0' not in readFile(str(tmp_path / (engine + '.csv')))
+
+
+@pytest.mark.parametrize('engine', ['client', 'parallelclient'])
+def test_clientEnginesExportTheSample(sampleDatabase, runRefresh, tmp_path, engine):
+    runRefresh(sampleDatabase, '--engine', engine, '--chunksize', '50')
+    assert readFile(str(tmp_path / 'results.csv')) == readFile(sampleResultsFilePath)
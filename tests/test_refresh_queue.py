@@ -0,0 +1,40 @@
+import sqlite3
+
+import refresh_survey_answers as rsa
+from myTools import SyntheticSurveyData as ssd
+
+
+def executeStatements(databaseFilePath: str, *statements: str) -> list:
+    '''Runs the statements in one transaction and returns the rows of the last one'''
+    conduit:sqlite3.Connection = sqlite3.connect(databaseFilePath)
+    try:
+        for statement in statements:
+            rows:list = conduit.execute(statement).fetchall()
+        conduit.commit()
+    finally:
+        conduit.close()
+    return rows
+
+
+def test_eventCommittedDuringRefreshIsKept(smallDatabase, runRefresh, monkeypatch):
+    ssd.createRefreshQueue(smallDatabase)
+    runRefresh(smallDatabase, '--changedetection', 'queue', '--debounce', '0')
+
+    #two structure changes queue the events 1 and 2, the first one stands for an event whose transaction has not committed yet
+    executeStatements(smallDatabase, 'DELETE FROM SurveyStructure WHERE rowid = (SELECT MAX(rowid) FROM SurveyStructure)', \
+                      'DELETE FROM SurveyStructure WHERE rowid = (SELECT MAX(rowid) FROM SurveyStructure)')
+    assert executeStatements(smallDatabase, 'SELECT EventId FROM SurveyViewRefreshQueue ORDER BY EventId') == [(1,), (2,)]
+    executeStatements(smallDatabase, 'DELETE FROM SurveyViewRefreshQueue WHERE EventId = 1')
+
+    refreshSurveyView = rsa.refreshSurveyView
+
+    def refreshSurveyViewThenCommitEvent(connector, cliArguments, bulkStructureFetch):
+        isViewRefreshed:bool = refreshSurveyView(connector, cliArguments, bulkStructureFetch)
+        executeStatements(smallDatabase, 'INSERT INTO SurveyViewRefreshQueue (EventId, AffectedRows) VALUES (1, 1)')
+        return isViewRefreshed
+
+    monkeypatch.setattr(rsa, 'refreshSurveyView', refreshSurveyViewThenCommitEvent)
+    runRefresh(smallDatabase, '--changedetection', 'queue', '--debounce', '0')
+
+    #the event committed after the queue was read, with a lower EventId, triggers the next refresh
+    assert executeStatements(smallDatabase, 'SELECT EventId FROM SurveyViewRefreshQueue') == [(1,)]
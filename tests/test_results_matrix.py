@@ -0,0 +1,27 @@
+import pandas as pd
+
+from myTools.SurveyResultsMatrix import SurveyResultsMatrix
+
+
+def test_roundTripKeepsIntegerColumns():
+    resultsDF:pd.DataFrame = pd.DataFrame({'UserId': [1, 2, 3], 'SurveyId': [1, 1, 2], 'ANS_Q1': [3, -1, 5], 'ANS_Q2': [4.0, 2.0, None]})
+    surveyResults:SurveyResultsMatrix = SurveyResultsMatrix.fromDataFrame(resultsDF)
+
+    assert surveyResults.answerCodes.dtype == 'int8' and surveyResults.userIds.dtype == 'int32'
+    assert surveyResults.getNullAnswerColumnNames() == ['ANS_Q2']
+    pd.testing.assert_frame_equal(surveyResults.toDataFrame(), resultsDF)
+
+    #a chunk without NULL is typed as the whole results
+    assert surveyResults.toDataFrame(0, 2)['ANS_Q2'].dtype == 'float64'
+    assert surveyResults.toDataFrame(0, 2)['ANS_Q1'].dtype == 'int64'
+
+
+def test_compactFetchMatchesDataFrame(smallDatabase, runRefresh, openConnector):
+    connector = openConnector(runRefresh(smallDatabase, '--engine', 'view'))
+
+    viewResultsDF:pd.DataFrame = connector.ExecuteQuery_withRS('SELECT * FROM vw_AllSurveyData')
+    surveyResults:SurveyResultsMatrix = SurveyResultsMatrix.fromColumns(connector.ExecuteQuery_withRSColumns('SELECT * FROM vw_AllSurveyData', 7))
+
+    assert surveyResults.equals(SurveyResultsMatrix.fromDataFrame(viewResultsDF))
+    assert surveyResults.nbytes * 3 < viewResultsDF.memory_usage(index=False).sum()
+    pd.testing.assert_frame_equal(surveyResults.toDataFrame(), viewResultsDF)
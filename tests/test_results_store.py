@@ -0,0 +1,21 @@
+import pandas as pd
+
+from myTools.ResultsStore import ResultsStore
+
+
+def test_openReaderFollowsRebuild(tmp_path):
+    storeFilePath:str = str(tmp_path / 'surveys.store.db')
+
+    with ResultsStore(storeFilePath) as writer:
+        writer.ReplaceAll([pd.DataFrame({'UserId': [1, 2], 'SurveyId': [1, 1], 'ANS_Q1': [3, -1], 'ANS_Q2': [4, 5]})], ['ANS_Q1', 'ANS_Q2'], {})
+
+        with ResultsStore(storeFilePath, isReadOnly=True) as reader:
+            assert reader.GetRows(surveyIds=[1], columns=['ANS_Q2']) == [(1, 1, 4), (2, 1, 5)]
+
+            #a new list of questions rebuilds the Results table under the reader kept open
+            writer.ReplaceAll([pd.DataFrame({'UserId': [1, 3], 'SurveyId': [1, 2], 'ANS_Q1': [3, None], 'ANS_Q3': [-1, 6]})], ['ANS_Q1', 'ANS_Q3'], {})
+
+            assert reader.GetRows(surveyIds=[2], columns=['ANS_Q3']) == [(3, 2, 6)]
+            pd.testing.assert_frame_equal(reader.GetSlice(), \
+                pd.DataFrame({'UserId': [1, 3], 'SurveyId': [1, 2], 'ANS_Q1': [3, None], 'ANS_Q3': [-1.0, 6.0]}))
+            assert reader.AnswerColumnNames == ['ANS_Q1', 'ANS_Q3']
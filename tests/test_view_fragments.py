@@ -0,0 +1,59 @@
+import sqlite3
+
+import pandas as pd
+
+import refresh_survey_answers as rsa
+
+
+def addQuestionToSurvey(databaseFilePath: str, survey_ID: int) -> int:
+    '''Adds a new question to the Question table and to the structure of one survey, answered by none of its users. Returns its QuestionId'''
+    conduit:sqlite3.Connection = sqlite3.connect(databaseFilePath)
+    try:
+        question_ID:int = conduit.execute('SELECT MAX(QuestionId) + 1 FROM Question').fetchone()[0]
+        conduit.execute('INSERT INTO Question (QuestionId) VALUES (?)', (question_ID,))
+        conduit.execute('INSERT INTO SurveyStructure (SurveyId, QuestionId, OrdinalValue) ' \
+                        + 'SELECT ?, ?, COALESCE(MAX(OrdinalValue), 0) + 1 FROM SurveyStructure WHERE SurveyId = ?', (survey_ID, question_ID, survey_ID))
+        conduit.commit()
+    finally:
+        conduit.close()
+    return question_ID
+
+
+def test_getFragmentColumnIds():
+    questionsInSurveys:dict = {1: [(1, True), (2, False), (3, True)], 2: [(1, False), (2, True), (3, True)]}
+    assert rsa.getFragmentColumnIds(questionsInSurveys) == [1, 2, 3]
+    assert rsa.getFragmentColumnIds({}) == []
+
+
+def test_newQuestionRebindsTopLevelView(sampleDatabase, runRefresh, openConnector, monkeypatch):
+    processedArguments:dict = runRefresh(sampleDatabase, '--viewlayout', 'fragmented')
+
+    question_ID:int = addQuestionToSurvey(sampleDatabase, 1)
+
+    connector = openConnector(processedArguments)
+
+    #the top-level view keeps the same definition, it has to be altered again for its SELECT * to expose the new column
+    executedQueries:list = []
+    executeQuery_view = connector.ExecuteQuery_view
+    monkeypatch.setattr(connector, 'ExecuteQuery_view', lambda query: executedQueries.append(query) or executeQuery_view(query))
+
+    assert rsa.refreshSurveyView(connector, processedArguments, True)
+    assert any(query.startswith(' CREATE OR ALTER VIEW vw_AllSurveyData AS ') for query in executedQueries)
+
+    resultsDF:pd.DataFrame = connector.ExecuteQuery_withRS('SELECT * FROM vw_AllSurveyData')
+    assert 'ANS_Q' + str(question_ID) in resultsDF.columns
+    assert set(resultsDF.loc[resultsDF['SurveyId'] == 1, 'ANS_Q' + str(question_ID)]) == {-1}
+    assert resultsDF.loc[resultsDF['SurveyId'] != 1, 'ANS_Q' + str(question_ID)].isna().all()
+
+
+def test_unchangedColumnsKeepTopLevelView(sampleDatabase, runRefresh, openConnector, monkeypatch):
+    processedArguments:dict = runRefresh(sampleDatabase, '--viewlayout', 'fragmented')
+
+    connector = openConnector(processedArguments)
+
+    executedQueries:list = []
+    executeQuery_view = connector.ExecuteQuery_view
+    monkeypatch.setattr(connector, 'ExecuteQuery_view', lambda query: executedQueries.append(query) or executeQuery_view(query))
+
+    assert not rsa.refreshSurveyView(connector, processedArguments, True)
+    assert executedQueries == []